@@ -37,6 +37,7 @@ setup(
     entry_points={
         "console_scripts": [
             "termax=termax.cli.main:app",
+            "termax-client=termax.daemon.client:main",
         ]
     },
     include_package_data=True,
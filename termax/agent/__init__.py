@@ -1,7 +1,32 @@
-from ._qianfan import *
-from ._qianwen import *
-from ._mistral import *
-from ._claude import *
-from ._gemini import *
-from ._openai import *
-from ._ollama import *
+import importlib
+
+# backends are resolved on first access, so a CLI run only imports the SDK of the configured platform.
+_MODELS = {
+    'Model': '.types',
+    'AsyncModel': '.types',
+    'ThreadedAsyncModel': '.types',
+    'BlockingModel': '.types',
+    'usage_scope': '.types',
+    'HedgedModel': '._hedge',
+    'OpenAIModel': '._openai',
+    'OllamaModel': '._ollama',
+    'GeminiModel': '._gemini',
+    'ClaudeModel': '._claude',
+    'MistralModel': '._mistral',
+    'QianFanModel': '._qianfan',
+    'QianWenModel': '._qianwen',
+    'AsyncOpenAIModel': '._openai',
+    'AsyncOllamaModel': '._ollama',
+    'AsyncGeminiModel': '._gemini',
+    'AsyncClaudeModel': '._claude',
+    'AsyncMistralModel': '._mistral',
+    'AsyncQianFanModel': '._qianfan',
+}
+
+__all__ = list(_MODELS)
+
+
+def __getattr__(name):
+    if name in _MODELS:
+        return getattr(importlib.import_module(_MODELS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,9 @@
 import importlib.util
 
-from .types import Model
+from .types import Model, AsyncModel
 from termax.utils.const import *
-from termax.prompt import extract_shell_commands
+from termax.prompt import extract_shell_commands, CacheablePrompt
+from termax.utils.ratelimit import estimate_tokens
 
 
 class ClaudeModel(Model):
@@ -28,9 +29,43 @@ class ClaudeModel(Model):
 
         self.version = version
         self.model_type = CONFIG_SEC_CLAUDE
-        self.client = self.anthropic.Anthropic(api_key=api_key)
+        # the retries are left to Model._call(), behind the shared rate limiter and honoring Retry-After.
+        self.client = self.anthropic.Anthropic(api_key=api_key, max_retries=0)
         self.generation_config = generation_config
 
+    @staticmethod
+    def system_blocks(prompt):
+        """
+        Mark the stable prefix of the prompt as cacheable, the volatile suffix follows it uncached.
+        Claude only caches a prefix of at least 1024 tokens (2048 for Haiku), a shorter one is sent uncached.
+        Args:
+            prompt (str): The prompt, a CacheablePrompt carries its prefix and suffix.
+        """
+        if not isinstance(prompt, CacheablePrompt) or not prompt.prefix:
+            return prompt
+        blocks = [{"type": "text", "text": prompt.prefix, "cache_control": {"type": "ephemeral"}}]
+        if prompt.suffix:
+            blocks.append({"type": "text", "text": prompt.suffix})
+        return blocks
+
+    def record_message_usage(self, message, output_tokens=None):
+        """
+        Record the token usage of a message, with the tokens read from and written to the prompt cache.
+        Args:
+            message: The message returned by the API.
+            output_tokens (int): The output tokens, when they are not the ones of the message (a stream).
+        """
+        usage = getattr(message, 'usage', None)
+        if usage is None:
+            return
+        cached = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        written = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        self.record_usage(
+            input_tokens=usage.input_tokens + cached + written,
+            output_tokens=usage.output_tokens if output_tokens is None else output_tokens,
+            cached_tokens=cached, cache_write_tokens=written
+        )
+
     def to_command(self, prompt, text):
         """
         Generate a command based on the prompt and text.
@@ -38,9 +73,10 @@ class ClaudeModel(Model):
             prompt (str): The prompt.
             text (str): The text.
         """
-        message = self.client.messages.create(
+        message = self._call(
+            self.client.messages.create,
             model=self.version,
-            system=prompt,
+            system=self.system_blocks(prompt),
             max_tokens=self.generation_config['max_tokens'],
             temperature=self.generation_config['temperature'],
             top_k=self.generation_config['top_k'],
@@ -48,9 +84,48 @@ class ClaudeModel(Model):
             stop_sequences=self.generation_config['stop_sequences'],
             messages=[{"role": "user", "content": text}]
         )
+        self.record_message_usage(message)
         response = message.content[0].text
         return extract_shell_commands(response)
 
+    def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text, closing the generator closes the stream.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        # the raw event stream, the request is sent (and rate limited) before the first event is read.
+        stream = self._call(
+            self.client.messages.create,
+            model=self.version,
+            system=self.system_blocks(prompt),
+            max_tokens=self.generation_config['max_tokens'],
+            temperature=self.generation_config['temperature'],
+            top_k=self.generation_config['top_k'],
+            top_p=self.generation_config['top_p'],
+            stop_sequences=self.generation_config['stop_sequences'],
+            messages=[{"role": "user", "content": text}],
+            stream=True
+        )
+        start, text = None, []
+        try:
+            for event in stream:
+                # the input usage, with the cache reads, comes with the first event, the output usage with the last.
+                if event.type == 'message_start':
+                    start = event.message
+                elif event.type == 'message_delta':
+                    self.record_message_usage(start, event.usage.output_tokens)
+                    start = None
+                elif event.type == 'content_block_delta' and event.delta.type == 'text_delta':
+                    text.append(event.delta.text)
+                    yield event.delta.text
+        finally:
+            stream.close()
+            # closed before its end, the output tokens are estimated from the text received.
+            if start is not None:
+                self.record_message_usage(start, estimate_tokens("".join(text)))
+
     def to_description(self, prompt, command):
         """
         Generate a description based on the prompt and command.
@@ -58,7 +133,8 @@ class ClaudeModel(Model):
             prompt (str): The prompt.
             command (str): The command.
         """
-        message = self.client.messages.create(
+        message = self._call(
+            self.client.messages.create,
             model=self.version,
             max_tokens=self.generation_config['max_tokens'],
             temperature=self.generation_config['temperature'],
@@ -67,5 +143,112 @@ class ClaudeModel(Model):
             stop_sequences=self.generation_config['stop_sequences'],
             messages=[{"role": "user", "content": f"{prompt} {command}"}]
         )
+        self.record_message_usage(message)
         response = message.content[0].text
         return response
+
+
+class AsyncClaudeModel(AsyncModel):
+    def __init__(self, api_key, version, generation_config):
+        """
+        Initialize the Claude model on the async client.
+        Args:
+            api_key (str): The Claude API key.
+            version (str): The model version.
+            generation_config (dict): The generation configuration.
+        """
+        super().__init__()
+        dependency = "anthropic"
+        spec = importlib.util.find_spec(dependency)
+        if spec is not None:
+            self.anthropic = importlib.import_module(dependency)
+        else:
+            raise ImportError(
+                "It seems you didn't install anthropic. In order to enable the Anthropic client related features, "
+                "please make sure anthropic Python package has been installed. "
+                "More information, please refer to: https://www.anthropic.com/api"
+            )
+
+        self.version = version
+        self.model_type = CONFIG_SEC_CLAUDE
+        self.client = self.anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+        self.generation_config = generation_config
+
+    system_blocks = staticmethod(ClaudeModel.system_blocks)
+    record_message_usage = ClaudeModel.record_message_usage
+
+    async def to_command(self, prompt, text):
+        """
+        Generate a command based on the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        message = await self._call(
+            self.client.messages.create,
+            model=self.version,
+            system=self.system_blocks(prompt),
+            max_tokens=self.generation_config['max_tokens'],
+            temperature=self.generation_config['temperature'],
+            top_k=self.generation_config['top_k'],
+            top_p=self.generation_config['top_p'],
+            stop_sequences=self.generation_config['stop_sequences'],
+            messages=[{"role": "user", "content": text}]
+        )
+        self.record_message_usage(message)
+        return extract_shell_commands(message.content[0].text)
+
+    async def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text, closing the generator closes the stream.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        stream = await self._call(
+            self.client.messages.create,
+            model=self.version,
+            system=self.system_blocks(prompt),
+            max_tokens=self.generation_config['max_tokens'],
+            temperature=self.generation_config['temperature'],
+            top_k=self.generation_config['top_k'],
+            top_p=self.generation_config['top_p'],
+            stop_sequences=self.generation_config['stop_sequences'],
+            messages=[{"role": "user", "content": text}],
+            stream=True
+        )
+        start, text = None, []
+        try:
+            async for event in stream:
+                if event.type == 'message_start':
+                    start = event.message
+                elif event.type == 'message_delta':
+                    self.record_message_usage(start, event.usage.output_tokens)
+                    start = None
+                elif event.type == 'content_block_delta' and event.delta.type == 'text_delta':
+                    text.append(event.delta.text)
+                    yield event.delta.text
+        finally:
+            await stream.close()
+            if start is not None:
+                self.record_message_usage(start, estimate_tokens("".join(text)))
+
+    async def to_description(self, prompt, command):
+        """
+        Generate a description based on the prompt and command.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        message = await self._call(
+            self.client.messages.create,
+            model=self.version,
+            max_tokens=self.generation_config['max_tokens'],
+            temperature=self.generation_config['temperature'],
+            top_k=self.generation_config['top_k'],
+            top_p=self.generation_config['top_p'],
+            stop_sequences=self.generation_config['stop_sequences'],
+            messages=[{"role": "user", "content": f"{prompt} {command}"}]
+        )
+        self.record_message_usage(message)
+        return message.content[0].text
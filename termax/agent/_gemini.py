@@ -1,6 +1,6 @@
 import importlib.util
 
-from .types import Model
+from .types import Model, AsyncModel
 from termax.utils.const import *
 from termax.prompt import extract_shell_commands
 
@@ -39,6 +39,17 @@ class GeminiModel(Model):
             candidate_count=generation_config['candidate_count'],
             max_output_tokens=generation_config['max_output_tokens'])
 
+    def record_response_usage(self, response):
+        """
+        Record the token usage of a response, or of the last chunk of a stream.
+        Args:
+            response: The response returned by the SDK.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            self.record_usage(input_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count,
+                              cached_tokens=getattr(usage, 'cached_content_token_count', 0))
+
     def to_command(self, prompt, text):
         """
         Generate a command based on the prompt and text.
@@ -53,8 +64,29 @@ class GeminiModel(Model):
 
         model = self.genai.GenerativeModel(self.version)
         chat = model.start_chat(history=chat_history)
-        response = chat.send_message(text, generation_config=self.generation_config).text
-        return extract_shell_commands(response)
+        response = self._call(chat.send_message, text, generation_config=self.generation_config)
+        self.record_response_usage(response)
+        return extract_shell_commands(response.text)
+
+    def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        chat_history = [
+            self.glm.Content(parts=[self.glm.Part(text=prompt)], role="user"),
+            self.glm.Content(parts=[self.glm.Part(text="understand")], role="model")
+        ]
+
+        model = self.genai.GenerativeModel(self.version)
+        chat = model.start_chat(history=chat_history)
+        chunk = None
+        for chunk in self._call(chat.send_message, text, generation_config=self.generation_config, stream=True):
+            yield chunk.text
+        # the usage of the last chunk covers the whole response.
+        self.record_response_usage(chunk)
 
     def to_description(self, prompt, command):
         """
@@ -66,5 +98,77 @@ class GeminiModel(Model):
         """
         model = self.genai.GenerativeModel(self.version)
         chat = model.start_chat(history=[])
-        response = chat.send_message(f"{prompt} {command}", generation_config=self.generation_config).text
-        return response
+        response = self._call(
+            chat.send_message, f"{prompt} {command}", generation_config=self.generation_config
+        )
+        self.record_response_usage(response)
+        return response.text
+
+
+class AsyncGeminiModel(AsyncModel):
+    def __init__(self, api_key, version, generation_config):
+        """
+        Initialize the Gemini model on the async API of the SDK.
+        Args:
+            api_key (str): The Gemini API key.
+            version (str): The model version.
+            generation_config (dict): The generation configuration.
+        """
+        super().__init__()
+        # the configuration and the dependency checks are the same as the blocking model.
+        self.model = GeminiModel(api_key, version, generation_config)
+        self.genai, self.glm = self.model.genai, self.model.glm
+        self.version = version
+        self.model_type = CONFIG_SEC_GEMINI
+        self.generation_config = self.model.generation_config
+
+    record_response_usage = GeminiModel.record_response_usage
+
+    def _start_chat(self, prompt):
+        chat_history = [
+            self.glm.Content(parts=[self.glm.Part(text=prompt)], role="user"),
+            self.glm.Content(parts=[self.glm.Part(text="understand")], role="model")
+        ]
+        return self.genai.GenerativeModel(self.version).start_chat(history=chat_history)
+
+    async def to_command(self, prompt, text):
+        """
+        Generate a command based on the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        chat = self._start_chat(prompt)
+        response = await self._call(chat.send_message_async, text, generation_config=self.generation_config)
+        self.record_response_usage(response)
+        return extract_shell_commands(response.text)
+
+    async def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        chat = self._start_chat(prompt)
+        response = await self._call(
+            chat.send_message_async, text, generation_config=self.generation_config, stream=True
+        )
+        chunk = None
+        async for chunk in response:
+            yield chunk.text
+        self.record_response_usage(chunk)
+
+    async def to_description(self, prompt, command):
+        """
+        Generate a description based on the prompt and command.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        chat = self.genai.GenerativeModel(self.version).start_chat(history=[])
+        response = await self._call(
+            chat.send_message_async, f"{prompt} {command}", generation_config=self.generation_config
+        )
+        self.record_response_usage(response)
+        return response.text
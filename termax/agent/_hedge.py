@@ -0,0 +1,111 @@
+import time
+import asyncio
+from typing import List, Optional
+
+from .types import AsyncModel
+from termax.utils.const import *
+from termax.utils.latency import LatencyHistogram
+
+
+class HedgedModel(AsyncModel):
+    def __init__(self, models: List[AsyncModel], delay: Optional[float] = None,
+                 histogram: Optional[LatencyHistogram] = None):
+        """
+        Hedged requests across several providers.
+        The primary model is asked first; when it has not answered after the hedge delay, the next model is
+        asked as well, and so on. The first valid command wins and the other requests are cancelled.
+        Args:
+            models: the async models, the primary first.
+            delay: a fixed hedge delay in seconds, by default the p90 latency of the primary model,
+                HEDGE_DEFAULT_DELAY until enough samples have been collected.
+            histogram: the latency histograms, updated with every completed request.
+        """
+        super().__init__()
+        self.models = models
+        self.delay = delay
+        self.histogram = histogram or LatencyHistogram()
+        self.model_type = models[0].model_type
+        self.version = getattr(models[0], 'version', None)
+        # the model which answered the last request.
+        self.winner = None
+
+    @staticmethod
+    def model_key(model):
+        return f"{model.model_type}/{getattr(model, 'version', None)}"
+
+    def hedge_delay(self):
+        """
+        hedge_delay: the seconds to wait for the primary model before asking the next one.
+        """
+        if self.delay is not None:
+            return self.delay
+        p90 = self.histogram.quantile(self.model_key(self.models[0]), HEDGE_QUANTILE)
+        return p90 if p90 is not None else HEDGE_DEFAULT_DELAY
+
+    async def _timed(self, model, coroutine):
+        """
+        _timed: run a request and record its latency. Only the completed requests are recorded: the elapsed
+        time of a cancelled loser is not a latency, it is the latency of the winner.
+        """
+        start = time.perf_counter()
+        result = await coroutine
+        if result is not None:
+            self.histogram.record(self.model_key(model), time.perf_counter() - start)
+        return result
+
+    async def _race(self, call):
+        """
+        _race: ask the models in turn until one of them returns a valid command.
+        Args:
+            call: a function of a model returning the coroutine of the request.
+        """
+        delay = self.hedge_delay()
+        pending = {}
+        waiting = list(self.models)
+        # '' when a model answered without a usable command, None when all of them failed.
+        fallback = None
+        try:
+            while waiting or pending:
+                if waiting:
+                    model = waiting.pop(0)
+                    pending[asyncio.ensure_future(self._timed(model, call(model)))] = model
+
+                # the next model is asked after the delay, or as soon as a request fails.
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay if waiting else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    model = pending.pop(task)
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    if task.result():
+                        self.winner = model
+                        self.last_usage = model.last_usage
+                        self.last_queued = model.last_queued
+                        return task.result()
+                    if task.result() == '':
+                        fallback = ''
+            return fallback
+        finally:
+            # the losers are cancelled, their connections closed by the async clients.
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def warm_up(self):
+        # every provider is warmed up, any of them may be asked.
+        results = await asyncio.gather(*(model.warm_up() for model in self.models), return_exceptions=True)
+        return results[0] if not isinstance(results[0], BaseException) else None
+
+    async def to_command(self, prompt, text):
+        return await self._race(lambda model: model.to_command(prompt, text))
+
+    async def stream_command(self, prompt, text, on_token=None):
+        # only the primary model shows its partial output, the chunks of the providers would interleave.
+        return await self._race(
+            lambda model: model.stream_command(prompt, text, on_token if model is self.models[0] else None)
+        )
+
+    async def to_description(self, prompt, command):
+        return await self.models[0].to_description(prompt, command)
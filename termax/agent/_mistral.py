@@ -2,7 +2,7 @@ import importlib.util
 
 from termax.utils.const import *
 from termax.prompt import extract_shell_commands
-from .types import Model
+from .types import Model, AsyncModel
 
 
 class MistralModel(Model):
@@ -33,6 +33,16 @@ class MistralModel(Model):
         self.client = self.MistralClient(api_key=api_key)
         self.generation_config = generation_config
 
+    def record_response_usage(self, response):
+        """
+        Record the token usage of a response, or of the last chunk of a stream.
+        Args:
+            response: The response returned by the API.
+        """
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.record_usage(input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens)
+
     def to_command(self, prompt, text):
         """
         Generate a command based on the prompt and text.
@@ -40,7 +50,8 @@ class MistralModel(Model):
             prompt (str): The prompt.
             text (str): The text.
         """
-        chat_response = self.client.chat(
+        chat_response = self._call(
+            self.client.chat,
             model=self.version,
             messages=[
                 self.ChatMessage(role="system", content=prompt),
@@ -50,9 +61,34 @@ class MistralModel(Model):
             top_p=self.generation_config['top_p'],
             max_tokens=self.generation_config['max_tokens']
         )
+        self.record_response_usage(chat_response)
         response = chat_response.choices[0].message.content
         return extract_shell_commands(response)
 
+    def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        stream = self._call(
+            self.client.chat_stream,
+            model=self.version,
+            messages=[
+                self.ChatMessage(role="system", content=prompt),
+                self.ChatMessage(role="user", content=text)
+            ],
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_tokens=self.generation_config['max_tokens']
+        )
+        for chunk in stream:
+            # the usage comes with the last chunk.
+            self.record_response_usage(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     def to_description(self, prompt, command):
         """
         Generate a description based on the prompt and command.
@@ -60,11 +96,106 @@ class MistralModel(Model):
             prompt (str): The prompt.
             command (str): The command.
         """
-        chat_response = self.client.chat(
+        chat_response = self._call(
+            self.client.chat,
+            model=self.version,
+            messages=[self.ChatMessage(role="user", content=f"{prompt} {command}")],
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_tokens=self.generation_config['max_tokens']
+        )
+        self.record_response_usage(chat_response)
+        return chat_response.choices[0].message.content
+
+
+class AsyncMistralModel(AsyncModel):
+    def __init__(self, api_key, version, generation_config):
+        """
+        Initialize the Mistral model on the async client.
+        Args:
+            api_key (str): The Mistral API key.
+            version (str): The model version.
+            generation_config (dict): The generation configuration.
+        """
+        super().__init__()
+
+        dependency = "mistralai"
+        spec = importlib.util.find_spec(dependency)
+        if spec is not None:
+            self.MistralAsyncClient = importlib.import_module("mistralai.async_client").MistralAsyncClient
+            self.ChatMessage = importlib.import_module("mistralai.models.chat_completion").ChatMessage
+        else:
+            raise ImportError(
+                "It seems you didn't install mistralai. In order to enable the Mistral client related features, "
+                "please make sure the mistralai Python package has been installed. "
+                "More information, please refer to: https://docs.mistral.ai/api/"
+            )
+
+        self.version = version
+        self.model_type = CONFIG_SEC_MISTRAL
+        self.client = self.MistralAsyncClient(api_key=api_key)
+        self.generation_config = generation_config
+
+    record_response_usage = MistralModel.record_response_usage
+
+    async def to_command(self, prompt, text):
+        """
+        Generate a command based on the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        chat_response = await self._call(
+            self.client.chat,
+            model=self.version,
+            messages=[
+                self.ChatMessage(role="system", content=prompt),
+                self.ChatMessage(role="user", content=text)
+            ],
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_tokens=self.generation_config['max_tokens']
+        )
+        self.record_response_usage(chat_response)
+        return extract_shell_commands(chat_response.choices[0].message.content)
+
+    async def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        stream = await self._call(
+            self.client.chat_stream,
+            model=self.version,
+            messages=[
+                self.ChatMessage(role="system", content=prompt),
+                self.ChatMessage(role="user", content=text)
+            ],
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_tokens=self.generation_config['max_tokens']
+        )
+        async for chunk in stream:
+            self.record_response_usage(chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def to_description(self, prompt, command):
+        """
+        Generate a description based on the prompt and command.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        chat_response = await self._call(
+            self.client.chat,
             model=self.version,
             messages=[self.ChatMessage(role="user", content=f"{prompt} {command}")],
             temperature=self.generation_config['temperature'],
             top_p=self.generation_config['top_p'],
             max_tokens=self.generation_config['max_tokens']
         )
+        self.record_response_usage(chat_response)
         return chat_response.choices[0].message.content
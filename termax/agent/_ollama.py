@@ -1,16 +1,85 @@
+import os
+import sys
+import json
+import hashlib
+import threading
 import importlib.util
+from collections import OrderedDict
 
-from .types import Model
-from termax.prompt import extract_shell_commands, is_url
+from .types import Model, AsyncModel
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+from termax.pricing import SpendCapExceeded
+from termax.utils.ratelimit import RateLimitExceeded
+from termax.prompt import extract_shell_commands, is_url, CacheablePrompt
+
+
+class OllamaContextCache:
+    def __init__(self, cache_path: str = os.path.join(CONFIG_HOME, OLLAMA_CONTEXT_FILE),
+                 size: int = OLLAMA_CONTEXT_CACHE_SIZE):
+        """
+        OllamaContextCache: the contexts returned by the generate API for the static prompt prefixes.
+        A context holds the evaluated tokens of a prefix, passing it back skips their evaluation.
+        Args:
+            cache_path: the path of the cache file.
+            size: the maximum number of contexts, the least recently used ones are evicted.
+        """
+        self.cache_path = cache_path
+        self.size = size
+        self.contexts = OrderedDict()
+        # the candidates and the async model share the cache across threads.
+        self.lock = threading.Lock()
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                self.contexts.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(version: str, prefix: str):
+        return hashlib.sha256(f"{version}\x00{prefix}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        with self.lock:
+            context = self.contexts.get(key)
+            if context is not None:
+                self.contexts.move_to_end(key)
+            return context
+
+    def put(self, key: str, context):
+        with self.lock:
+            self.contexts[key] = list(context)
+            self.contexts.move_to_end(key)
+            while len(self.contexts) > self.size:
+                self.contexts.popitem(last=False)
+            try:
+                atomic_write_json(self.cache_path, self.contexts)
+            except OSError:
+                pass
+
+
+def _resident(process_response, version):
+    """
+    Whether a model appears in the response of /api/ps, `llama2` matches `llama2:latest`.
+    """
+    names = {version, version if ':' in version else f"{version}:latest"}
+    for model in process_response['models'] or []:
+        if model['model'] in names or model.get('name') in names:
+            return True
+    return False
 
 
 class OllamaModel(Model):
-    def __init__(self, host_url, version):
+    def __init__(self, host_url, version, keep_alive=OLLAMA_KEEP_ALIVE, reuse_context=False):
         """
         Initialize the Ollama model.
         Args:
             host_url (str): The Ollama Host url.
             version (str): The model version.
+            keep_alive (str): How long the model stays loaded after a request, e.g. 30m.
+            reuse_context (bool): Evaluate the static prompt prefix once and pass its context back through the
+                generate API, instead of sending the whole prompt to the chat API each time.
         """
         super().__init__()
 
@@ -28,11 +97,75 @@ class OllamaModel(Model):
             )
 
         self.version = version
+        self.model_type = CONFIG_SEC_OLLAMA
+        self.keep_alive = keep_alive
+        self.reuse_context = reuse_context
+        self.contexts = OllamaContextCache() if reuse_context else None
         if is_url(host_url):
             self.client = self.Client(host=host_url)
         else:
             self.client = self.Client()
 
+    def is_resident(self):
+        """
+        Check whether the model is loaded in memory, via /api/ps.
+        """
+        return _resident(self.client.ps(), self.version)
+
+    def record_response_usage(self, response):
+        """
+        Record the token usage of a response, the evaluated prompt tokens (a reused context is not evaluated
+        again) and the generated ones.
+        Args:
+            response: The response, or the last chunk of a stream.
+        """
+        self.record_usage(input_tokens=response.get('prompt_eval_count') or 0,
+                          output_tokens=response.get('eval_count') or 0)
+
+    def warm_up(self, background=False):
+        """
+        Load the model in memory if it is not resident yet, so the next request does not wait for the load.
+        Args:
+            background (bool): Load the model on a background thread and return at once.
+
+        Returns: whether the model was already resident, None for a background warm-up.
+        """
+        if background:
+            threading.Thread(target=self.warm_up, daemon=True, name='termax-warm-up').start()
+            return None
+        try:
+            if self.is_resident():
+                return True
+            # a request without a prompt only loads the model.
+            self.client.generate(model=self.version, keep_alive=self.keep_alive)
+        except Exception as e:
+            print(f"Ollama warm-up failed: {e}", file=sys.stderr)
+        return False
+
+    def prefix_context(self, prompt):
+        """
+        The generate arguments reusing the evaluated context of the static prompt prefix.
+        The prefix is evaluated once as the system prompt, without generating (`num_predict: 0`), and its context is
+        cached for the next requests.
+        Args:
+            prompt (str): The prompt, a CacheablePrompt carries its static prefix.
+
+        Returns: the context and the rest of the prompt, None if the context cannot be reused.
+        """
+        if not self.reuse_context or not isinstance(prompt, CacheablePrompt) or not prompt.prefix:
+            return None
+        key = self.contexts.key(self.version, prompt.prefix)
+        context = self.contexts.get(key)
+        if context is None:
+            response = self.client.generate(
+                model=self.version, system=prompt.prefix, options={'num_predict': 0}, keep_alive=self.keep_alive
+            )
+            if not response.get('context'):
+                return None
+            context = response['context']
+            self.contexts.put(key, context)
+        return context, prompt.suffix
+
     def to_command(self, prompt, text):
         """
         Generate a command based on the prompt and text.
@@ -41,6 +174,16 @@ class OllamaModel(Model):
             text (str): The text.
         """
         try:
+            reuse = self.prefix_context(prompt)
+            if reuse:
+                context, suffix = reuse
+                completion = self.client.generate(
+                    model=self.version, prompt=f"{suffix}\n\n{text}".strip(), context=context,
+                    keep_alive=self.keep_alive
+                )
+                self.record_response_usage(completion)
+                return extract_shell_commands(completion['response'])
+
             chat_history = [
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": text}
@@ -49,15 +192,73 @@ class OllamaModel(Model):
             completion = self.client.chat(
                 model=self.version,
                 messages=chat_history,
+                keep_alive=self.keep_alive
             )
 
+            self.record_response_usage(completion)
             response = completion['message']['content']
             return extract_shell_commands(response)
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller.
+            raise
         except self.ResponseError as e:
-            print(f"Ollama Error: {e.error}")
+            print(f"Ollama Error: {e.error}", file=sys.stderr)
         except Exception as e:
-            print("Ollama error occurred.")
-            print(f"Error message: {e}")
+            print("Ollama error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+
+    def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text, closing the generator closes the connection.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        reuse = self.prefix_context(prompt)
+        if reuse:
+            context, suffix = reuse
+            stream = self.client.generate(
+                model=self.version, prompt=f"{suffix}\n\n{text}".strip(), context=context,
+                keep_alive=self.keep_alive, stream=True
+            )
+            for chunk in stream:
+                if chunk.get('done'):
+                    self.record_response_usage(chunk)
+                yield chunk['response']
+            return
+
+        stream = self.client.chat(
+            model=self.version,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": text}
+            ],
+            keep_alive=self.keep_alive,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.get('done'):
+                self.record_response_usage(chunk)
+            yield chunk['message']['content']
+
+    def stream_command(self, prompt, text, on_token=None):
+        """
+        Generate a command from the streamed response.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            on_token (callable): Called with each chunk of the response.
+        """
+        try:
+            return super().stream_command(prompt, text, on_token)
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller.
+            raise
+        except self.ResponseError as e:
+            print(f"Ollama Error: {e.error}", file=sys.stderr)
+        except Exception as e:
+            print("Ollama error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
 
     def to_description(self, prompt, command):
         """
@@ -74,12 +275,206 @@ class OllamaModel(Model):
             completion = self.client.chat(
                 model=self.version,
                 messages=chat_history,
+                keep_alive=self.keep_alive
             )
 
             response = completion['message']['content']
             return response
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller.
+            raise
+        except self.ResponseError as e:
+            print(f"Ollama Error: {e.error}", file=sys.stderr)
+        except Exception as e:
+            print("Ollama error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+
+
+class AsyncOllamaModel(AsyncModel):
+    def __init__(self, host_url, version, keep_alive=OLLAMA_KEEP_ALIVE, reuse_context=False):
+        """
+        Initialize the Ollama model on the async client.
+        Args:
+            host_url (str): The Ollama Host url.
+            version (str): The model version.
+            keep_alive (str): How long the model stays loaded after a request, e.g. 30m.
+            reuse_context (bool): Reuse the evaluated context of the static prompt prefix, see OllamaModel.
+        """
+        super().__init__()
+
+        dependency = "ollama"
+        spec = importlib.util.find_spec(dependency)
+        if spec is not None:
+            self.AsyncClient = importlib.import_module(dependency).AsyncClient
+            self.ResponseError = importlib.import_module(dependency).ResponseError
+        else:
+            raise ImportError(
+                "It seems you didn't install ollama. In order to enable the Ollama client related features, "
+                "please make sure ollama Python package has been installed. "
+                "More information, please refer to: https://github.com/ollama/ollama-python"
+            )
+
+        self.version = version
+        self.model_type = CONFIG_SEC_OLLAMA
+        self.keep_alive = keep_alive
+        self.reuse_context = reuse_context
+        self.contexts = OllamaContextCache() if reuse_context else None
+        if is_url(host_url):
+            self.client = self.AsyncClient(host=host_url)
+        else:
+            self.client = self.AsyncClient()
+
+    async def is_resident(self):
+        """
+        Check whether the model is loaded in memory, via /api/ps.
+        """
+        return _resident(await self.client.ps(), self.version)
+
+    record_response_usage = OllamaModel.record_response_usage
+
+    async def warm_up(self):
+        """
+        Load the model in memory if it is not resident yet.
+
+        Returns: whether the model was already resident.
+        """
+        try:
+            if await self.is_resident():
+                return True
+            await self.client.generate(model=self.version, keep_alive=self.keep_alive)
+        except Exception as e:
+            print(f"Ollama warm-up failed: {e}", file=sys.stderr)
+        return False
+
+    async def prefix_context(self, prompt):
+        """
+        The context of the static prompt prefix and the rest of the prompt, see OllamaModel.prefix_context.
+        Args:
+            prompt (str): The prompt, a CacheablePrompt carries its static prefix.
+        """
+        if not self.reuse_context or not isinstance(prompt, CacheablePrompt) or not prompt.prefix:
+            return None
+        key = self.contexts.key(self.version, prompt.prefix)
+        context = self.contexts.get(key)
+        if context is None:
+            response = await self.client.generate(
+                model=self.version, system=prompt.prefix, options={'num_predict': 0}, keep_alive=self.keep_alive
+            )
+            if not response.get('context'):
+                return None
+            context = response['context']
+            self.contexts.put(key, context)
+        return context, prompt.suffix
+
+    async def to_command(self, prompt, text):
+        """
+        Generate a command based on the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        try:
+            reuse = await self.prefix_context(prompt)
+            if reuse:
+                context, suffix = reuse
+                completion = await self.client.generate(
+                    model=self.version, prompt=f"{suffix}\n\n{text}".strip(), context=context,
+                    keep_alive=self.keep_alive
+                )
+                self.record_response_usage(completion)
+                return extract_shell_commands(completion['response'])
+
+            completion = await self.client.chat(
+                model=self.version,
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": text}
+                ],
+                keep_alive=self.keep_alive
+            )
+            self.record_response_usage(completion)
+            return extract_shell_commands(completion['message']['content'])
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller.
+            raise
+        except self.ResponseError as e:
+            print(f"Ollama Error: {e.error}", file=sys.stderr)
+        except Exception as e:
+            print("Ollama error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+
+    async def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text, closing the generator closes the connection.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        reuse = await self.prefix_context(prompt)
+        if reuse:
+            context, suffix = reuse
+            stream = await self.client.generate(
+                model=self.version, prompt=f"{suffix}\n\n{text}".strip(), context=context,
+                keep_alive=self.keep_alive, stream=True
+            )
+            async for chunk in stream:
+                if chunk.get('done'):
+                    self.record_response_usage(chunk)
+                yield chunk['response']
+            return
+
+        stream = await self.client.chat(
+            model=self.version,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": text}
+            ],
+            keep_alive=self.keep_alive,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.get('done'):
+                self.record_response_usage(chunk)
+            yield chunk['message']['content']
+
+    async def stream_command(self, prompt, text, on_token=None):
+        """
+        Generate a command from the streamed response.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            on_token (callable): Called with each chunk of the response.
+        """
+        try:
+            return await super().stream_command(prompt, text, on_token)
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller.
+            raise
+        except self.ResponseError as e:
+            print(f"Ollama Error: {e.error}", file=sys.stderr)
+        except Exception as e:
+            print("Ollama error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+
+    async def to_description(self, prompt, command):
+        """
+        Generate a description based on the prompt and command.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        try:
+            completion = await self.client.chat(
+                model=self.version,
+                messages=[{"role": "user", "content": f"{prompt} {command}"}],
+                keep_alive=self.keep_alive
+            )
+            return completion['message']['content']
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller.
+            raise
         except self.ResponseError as e:
-            print(f"Ollama Error: {e.error}")
+            print(f"Ollama Error: {e.error}", file=sys.stderr)
         except Exception as e:
-            print("Ollama error occurred.")
-            print(f"Error message: {e}")
+            print("Ollama error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
@@ -1,9 +1,64 @@
-import json
+import sys
 import importlib.util
 
-from .types import Model
-from termax.prompt import extract_shell_commands, is_url
-from termax.function import get_all_function_schemas, get_all_functions
+from .types import Model, AsyncModel
+from termax.utils.const import *
+from termax.pricing import SpendCapExceeded
+from termax.utils.ratelimit import RateLimitExceeded
+from termax.prompt import extract_shell_commands, is_url, CommandStreamParser
+from termax.function import get_all_function_schemas, get_function_registry
+
+
+class CompletionStream:
+    def __init__(self, model, on_token=None):
+        """
+        The parsing of a streamed completion, shared by the sync and the async OpenAI models.
+        Args:
+            model: the model receiving the stream, the usage is recorded on it.
+            on_token (callable): Called with each chunk of the response.
+        """
+        self.model = model
+        self.on_token = on_token
+        self.parser = CommandStreamParser()
+        self.function_name, self.function_arguments = None, ""
+
+    def feed(self, chunk):
+        """
+        Parse a chunk of the stream.
+        Args:
+            chunk: A chunk of the completion.
+
+        Returns: the command once it is complete, None otherwise.
+        """
+        # the usage comes in a last chunk without choices, only when the stream is read to the end.
+        if getattr(chunk, 'usage', None):
+            self.model.record_completion_usage(chunk)
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta
+        if delta.function_call:
+            self.function_name = delta.function_call.name or self.function_name
+            self.function_arguments += delta.function_call.arguments or ""
+        elif delta.content:
+            if self.on_token:
+                self.on_token(delta.content)
+            return self.parser.feed(delta.content)
+        return None
+
+    @property
+    def text(self):
+        """
+        The text received, the usage of a stream closed early is estimated from it.
+        """
+        return self.parser.text + self.function_arguments
+
+    def finish(self):
+        """
+        The command of a stream read to its end, from its function call or its content.
+        """
+        if self.function_name and self.function_name in get_function_registry().names():
+            return get_function_registry().execute(self.function_name, self.function_arguments)
+        return self.parser.finish()
 
 
 class OpenAIModel(Model):
@@ -21,7 +76,7 @@ class OpenAIModel(Model):
         spec = importlib.util.find_spec(dependency)
         if spec is not None:
             self.OpenAI = importlib.import_module(dependency).OpenAI
-            self.RateLimitError = importlib.import_module(dependency).RateLimitError
+            self.BadRequestError = importlib.import_module(dependency).BadRequestError
         else:
             raise ImportError(
                 "It seems you didn't install openai. In order to enable the OpenAI client related features, "
@@ -30,11 +85,80 @@ class OpenAIModel(Model):
             )
 
         self.version = version
+        self.model_type = CONFIG_SEC_OPENAI
         self.temperature = temperature
+        # the usage of the streams is requested until an endpoint rejects `stream_options`, see stream_request().
+        self.stream_usage = True
+        # the retries are left to Model._call(), behind the shared rate limiter and honoring Retry-After.
         if is_url(base_url):
-            self.client = self.OpenAI(api_key=api_key, base_url=base_url)
+            self.client = self.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
         else:
-            self.client = self.OpenAI(api_key=api_key)
+            self.client = self.OpenAI(api_key=api_key, max_retries=0)
+
+    def record_completion_usage(self, completion):
+        """
+        Record the token usage of a completion. OpenAI (and the compatible endpoints supporting it) caches the
+        longest prompt prefix seen recently on its own, the cached tokens are reported in the usage details.
+        Args:
+            completion: The completion returned by the API.
+        """
+        usage = getattr(completion, 'usage', None)
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        self.record_usage(
+            input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens,
+            cached_tokens=getattr(details, 'cached_tokens', 0) or 0
+        )
+
+    def command_kwargs(self, prompt, text, **kwargs):
+        """
+        The arguments of a command completion, shared by the sync and the async models.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            kwargs: The other arguments of the request, e.g. n.
+        """
+        return dict(
+            model=self.version,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": text}
+            ],
+            temperature=self.temperature,
+            functions=get_all_function_schemas(),
+            **kwargs
+        )
+
+    def description_kwargs(self, prompt, command):
+        """
+        The arguments of a description completion, shared by the sync and the async models.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        return dict(
+            model=self.version,
+            messages=[{"role": "user", "content": f"{prompt} {command}"}],
+            temperature=self.temperature
+        )
+
+    def stream_request(self, prompt, text):
+        """
+        Send a streamed command completion. The usage is requested with `stream_options`, an endpoint rejecting
+        the parameter (older compatible servers) is asked again without it and the usage is estimated.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        kwargs = self.command_kwargs(prompt, text, stream=True)
+        if self.stream_usage:
+            try:
+                return self._call(self.client.chat.completions.create, stream_options={"include_usage": True},
+                                  **kwargs)
+            except self.BadRequestError:
+                self.stream_usage = False
+        return self._call(self.client.chat.completions.create, **kwargs)
 
     def to_command(self, prompt, text):
         """
@@ -44,32 +168,76 @@ class OpenAIModel(Model):
             text (str): The text.
         """
         try:
-            chat_history = [
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": text}
-            ]
+            completion = self._call(self.client.chat.completions.create, **self.command_kwargs(prompt, text))
+            self.record_completion_usage(completion)
+            return self.choice_command(completion.choices[0])
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller, e.g. the refusal of the spend cap.
+            raise
+        except Exception as e:
+            print("OpenAI error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
 
-            completion = self.client.chat.completions.create(
-                model=self.version,
-                messages=chat_history,
-                temperature=self.temperature,
-                functions=get_all_function_schemas()
-            )
+    def stream_command(self, prompt, text, on_token=None):
+        """
+        Generate a command from a streamed completion, the stream is closed as soon as the command is complete.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            on_token (callable): Called with each chunk of the response.
+        """
+        try:
+            stream = self.stream_request(prompt, text)
+            completion = CompletionStream(self, on_token)
+            records = self.usage_records
+            try:
+                for chunk in stream:
+                    command = completion.feed(chunk)
+                    if command is not None:
+                        return command
+            finally:
+                stream.close()
+                # the usage only comes with the end of the stream.
+                if self.usage_records == records:
+                    self.record_estimated_usage(prompt, text, completion.text)
+            return completion.finish()
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller, e.g. the refusal of the spend cap.
+            raise
+        except Exception as e:
+            print("OpenAI error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
 
-            function = completion.choices[0].message.function_call
-            if function:
-                for f in get_all_functions():
-                    if f.openai_schema["name"] == function.name:
-                        return f.execute(**json.loads(function.arguments))
-            else:
-                response = completion.choices[0].message.content
-                return extract_shell_commands(response)
-        except self.RateLimitError as e:
-            print("Rate limit exceeded. Please try again later.")
-            print(f"Error message: {e}")
+    def choice_command(self, choice):
+        """
+        The command of a completion choice, from its function call or its content.
+        Args:
+            choice: A choice of the completion.
+        """
+        function = choice.message.function_call
+        if function:
+            return get_function_registry().execute(function.name, function.arguments)
+        return extract_shell_commands(choice.message.content or "")
+
+    def generate_candidates(self, prompt, text, n):
+        """
+        Generate n candidate commands in a single request, with the native `n` parameter.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            n (int): The number of candidates.
+        """
+        try:
+            completion = self._call(self.client.chat.completions.create, **self.command_kwargs(prompt, text, n=n))
+            self.record_completion_usage(completion)
+        except (SpendCapExceeded, RateLimitExceeded):
+            raise
         except Exception as e:
-            print("OpenAI error occurred.")
-            print(f"Error message: {e}")
+            print("OpenAI error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+            return
+        for choice in completion.choices:
+            yield self.choice_command(choice)
 
     def to_description(self, prompt, command):
         """
@@ -78,15 +246,141 @@ class OpenAIModel(Model):
             prompt (str): The prompt.
             command (str): The command.
         """
-        completion = self.client.chat.completions.create(
-            model=self.version,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"{prompt} {command}",
-                }
-            ],
-            temperature=self.temperature
-        )
+        completion = self._call(self.client.chat.completions.create, **self.description_kwargs(prompt, command))
+        self.record_completion_usage(completion)
         response = completion.choices[0].message.content
         return response
+
+
+class AsyncOpenAIModel(AsyncModel):
+    def __init__(self, api_key, version, temperature, base_url):
+        """
+        Initialize the OpenAI model on the async client.
+        Args:
+            api_key (str): The OpenAI API key.
+            version (str): The model version.
+            temperature (float): The temperature value.
+        """
+        super().__init__()
+
+        dependency = "openai"
+        spec = importlib.util.find_spec(dependency)
+        if spec is not None:
+            self.AsyncOpenAI = importlib.import_module(dependency).AsyncOpenAI
+            self.BadRequestError = importlib.import_module(dependency).BadRequestError
+        else:
+            raise ImportError(
+                "It seems you didn't install openai. In order to enable the OpenAI client related features, "
+                "please make sure openai Python package has been installed. "
+                "More information, please refer to: https://openai.com/product"
+            )
+
+        self.version = version
+        self.model_type = CONFIG_SEC_OPENAI
+        self.temperature = temperature
+        self.stream_usage = True
+        # the retries are left to Model._call(), behind the shared rate limiter and honoring Retry-After.
+        if is_url(base_url):
+            self.client = self.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        else:
+            self.client = self.AsyncOpenAI(api_key=api_key, max_retries=0)
+
+    record_completion_usage = OpenAIModel.record_completion_usage
+    command_kwargs = OpenAIModel.command_kwargs
+    description_kwargs = OpenAIModel.description_kwargs
+    choice_command = OpenAIModel.choice_command
+
+    async def stream_request(self, prompt, text):
+        """
+        Send a streamed command completion, see OpenAIModel.stream_request.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        kwargs = self.command_kwargs(prompt, text, stream=True)
+        if self.stream_usage:
+            try:
+                return await self._call(self.client.chat.completions.create,
+                                        stream_options={"include_usage": True}, **kwargs)
+            except self.BadRequestError:
+                self.stream_usage = False
+        return await self._call(self.client.chat.completions.create, **kwargs)
+
+    async def to_command(self, prompt, text):
+        """
+        Generate a command based on the prompt and text.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        try:
+            completion = await self._call(self.client.chat.completions.create, **self.command_kwargs(prompt, text))
+            self.record_completion_usage(completion)
+            return self.choice_command(completion.choices[0])
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller, e.g. the refusal of the spend cap.
+            raise
+        except Exception as e:
+            print("OpenAI error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+
+    async def stream_command(self, prompt, text, on_token=None):
+        """
+        Generate a command from a streamed completion, the stream is closed as soon as the command is complete.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            on_token (callable): Called with each chunk of the response.
+        """
+        try:
+            stream = await self.stream_request(prompt, text)
+            completion = CompletionStream(self, on_token)
+            records = self.usage_records
+            try:
+                async for chunk in stream:
+                    command = completion.feed(chunk)
+                    if command is not None:
+                        return command
+            finally:
+                await stream.close()
+                if self.usage_records == records:
+                    self.record_estimated_usage(prompt, text, completion.text)
+            return completion.finish()
+        except (SpendCapExceeded, RateLimitExceeded):
+            # reported by the caller, e.g. the refusal of the spend cap.
+            raise
+        except Exception as e:
+            print("OpenAI error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+
+    async def generate_candidates(self, prompt, text, n):
+        """
+        Generate n candidate commands in a single request, with the native `n` parameter.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+            n (int): The number of candidates.
+        """
+        try:
+            completion = await self._call(self.client.chat.completions.create,
+                                          **self.command_kwargs(prompt, text, n=n))
+            self.record_completion_usage(completion)
+        except (SpendCapExceeded, RateLimitExceeded):
+            raise
+        except Exception as e:
+            print("OpenAI error occurred.", file=sys.stderr)
+            print(f"Error message: {e}", file=sys.stderr)
+            return
+        for choice in completion.choices:
+            yield self.choice_command(choice)
+
+    async def to_description(self, prompt, command):
+        """
+        Generate a description based on the prompt and command.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        completion = await self._call(self.client.chat.completions.create, **self.description_kwargs(prompt, command))
+        self.record_completion_usage(completion)
+        return completion.choices[0].message.content
@@ -1,6 +1,6 @@
 import importlib.util
 
-from .types import Model
+from .types import Model, AsyncModel
 from termax.utils.const import *
 from termax.prompt import extract_shell_commands
 
@@ -33,6 +33,16 @@ class QianFanModel(Model):
         self.version = version
         self.generation_config = generation_config
 
+    def record_response_usage(self, message):
+        """
+        Record the token usage of a response, or of the last chunk of a stream.
+        Args:
+            message: The response returned by the SDK.
+        """
+        usage = message['body'].get('usage')
+        if usage:
+            self.record_usage(input_tokens=usage.get('prompt_tokens'), output_tokens=usage.get('completion_tokens'))
+
     def to_command(self, prompt, text):
         """
         Generate a command based on the prompt and request.
@@ -40,7 +50,8 @@ class QianFanModel(Model):
             prompt (str): The prompt.
             text (str): The request text.
         """
-        message = self.client.do(
+        message = self._call(
+            self.client.do,
             model=self.version,
             messages=[{"role": "user", "content": text}],
             system=prompt,
@@ -48,9 +59,33 @@ class QianFanModel(Model):
             top_p=self.generation_config['top_p'],
             max_output_tokens=self.generation_config['max_output_tokens']
         )
+        self.record_response_usage(message)
         response = message['body']['result']
         return extract_shell_commands(response)
 
+    def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and request.
+        Args:
+            prompt (str): The prompt.
+            text (str): The request text.
+        """
+        responses = self._call(
+            self.client.do,
+            model=self.version,
+            messages=[{"role": "user", "content": text}],
+            system=prompt,
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_output_tokens=self.generation_config['max_output_tokens'],
+            stream=True
+        )
+        for message in responses:
+            # the usage of the last chunk covers the whole response.
+            if message['body'].get('is_end'):
+                self.record_response_usage(message)
+            yield message['body']['result']
+
     def to_description(self, prompt, command):
         """
         Generate a description based on the prompt and command.
@@ -58,12 +93,94 @@ class QianFanModel(Model):
             prompt (str): The prompt.
             command (str): The command.
         """
-        message = self.client.do(
+        message = self._call(
+            self.client.do,
             model=self.version,
             messages=[{"role": "user", "content": f"{prompt} {command}"}],
             temperature=self.generation_config['temperature'],
             top_p=self.generation_config['top_p'],
             max_output_tokens=self.generation_config['max_output_tokens']
         )
+        self.record_response_usage(message)
         response = message['body']['result']
         return response
+
+
+class AsyncQianFanModel(AsyncModel):
+    def __init__(self, api_key, secret_key, version, generation_config):
+        """
+        Initialize the QianFan model on the async API of the SDK.
+        Args:
+            api_key (str): The QianFan API key.
+            secret_key (str): The QianFan secret key.
+            version (str): The model version.
+            generation_config (dict): The generation configuration.
+        """
+        super().__init__()
+        # the ChatCompletion client of the SDK serves both the blocking and the async calls.
+        self.model = QianFanModel(api_key, secret_key, version, generation_config)
+        self.client = self.model.client
+        self.model_type = CONFIG_SEC_QIANFAN
+        self.version = version
+        self.generation_config = generation_config
+
+    record_response_usage = QianFanModel.record_response_usage
+
+    async def to_command(self, prompt, text):
+        """
+        Generate a command based on the prompt and request.
+        Args:
+            prompt (str): The prompt.
+            text (str): The request text.
+        """
+        message = await self._call(
+            self.client.ado,
+            model=self.version,
+            messages=[{"role": "user", "content": text}],
+            system=prompt,
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_output_tokens=self.generation_config['max_output_tokens']
+        )
+        self.record_response_usage(message)
+        return extract_shell_commands(message['body']['result'])
+
+    async def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and request.
+        Args:
+            prompt (str): The prompt.
+            text (str): The request text.
+        """
+        responses = await self._call(
+            self.client.ado,
+            model=self.version,
+            messages=[{"role": "user", "content": text}],
+            system=prompt,
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_output_tokens=self.generation_config['max_output_tokens'],
+            stream=True
+        )
+        async for message in responses:
+            if message['body'].get('is_end'):
+                self.record_response_usage(message)
+            yield message['body']['result']
+
+    async def to_description(self, prompt, command):
+        """
+        Generate a description based on the prompt and command.
+        Args:
+            prompt (str): The prompt.
+            command (str): The command.
+        """
+        message = await self._call(
+            self.client.ado,
+            model=self.version,
+            messages=[{"role": "user", "content": f"{prompt} {command}"}],
+            temperature=self.generation_config['temperature'],
+            top_p=self.generation_config['top_p'],
+            max_output_tokens=self.generation_config['max_output_tokens']
+        )
+        self.record_response_usage(message)
+        return message['body']['result']
@@ -34,6 +34,16 @@ class QianWenModel(Model):
         self.dashscope.api_key = api_key
         self.generation_config = generation_config
 
+    def record_response_usage(self, message):
+        """
+        Record the token usage of a response, or of the last chunk of a stream.
+        Args:
+            message: The response returned by the SDK.
+        """
+        usage = message['usage']
+        if usage:
+            self.record_usage(input_tokens=usage.get('input_tokens'), output_tokens=usage.get('output_tokens'))
+
     def to_command(self, prompt, text):
         """
         Generate a command based on the prompt and text.
@@ -46,7 +56,8 @@ class QianWenModel(Model):
             {'role': 'user', 'content': text}
         ]
 
-        message = self.dashscope.Generation.call(
+        message = self._call(
+            self.dashscope.Generation.call,
             model=self.version,
             messages=chat_history,
             max_tokens=self.generation_config['max_tokens'],
@@ -55,9 +66,39 @@ class QianWenModel(Model):
             top_p=self.generation_config['top_p'],
             stop=self.generation_config['stop'],
         )
+        self.record_response_usage(message)
         response = message['output'].text
         return extract_shell_commands(response)
 
+    def stream_tokens(self, prompt, text):
+        """
+        Stream the response to the prompt and text, each response carries the new text only.
+        Args:
+            prompt (str): The prompt.
+            text (str): The text.
+        """
+        responses = self._call(
+            self.dashscope.Generation.call,
+            model=self.version,
+            messages=[
+                {'role': 'system', 'content': prompt},
+                {'role': 'user', 'content': text}
+            ],
+            max_tokens=self.generation_config['max_tokens'],
+            temperature=self.generation_config['temperature'],
+            top_k=self.generation_config['top_k'],
+            top_p=self.generation_config['top_p'],
+            stop=self.generation_config['stop'],
+            stream=True,
+            incremental_output=True
+        )
+        for message in responses:
+            # the usage of the last chunk covers the whole response.
+            if message['output'] and message['output'].get('finish_reason') == 'stop':
+                self.record_response_usage(message)
+            if message['output'] and message['output'].text:
+                yield message['output'].text
+
     def to_description(self, prompt, command):
         """
         Generate a description based on the prompt and command.
@@ -65,7 +106,8 @@ class QianWenModel(Model):
             prompt (str): The prompt.
             command (str): The command.
         """
-        message = self.dashscope.Generation.call(
+        message = self._call(
+            self.dashscope.Generation.call,
             model=self.version,
             messages=[{'role': 'user', 'content': f"{prompt} {command}"}],
             max_tokens=self.generation_config['max_tokens'],
@@ -74,5 +116,6 @@ class QianWenModel(Model):
             top_p=self.generation_config['top_p'],
             stop=self.generation_config['stop'],
         )
+        self.record_response_usage(message)
         response = message['output'].text
         return response
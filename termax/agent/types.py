@@ -1,10 +1,61 @@
+import copy
+import time
+import queue
+import asyncio
+import inspect
+import threading
+import functools
+import contextlib
+import contextvars
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from termax.utils.const import *
+
+# the thread pool shared by the ThreadedAsyncModel instances, see get_model_executor().
+_executor = None
+# the usage counted by the innermost usage_scope() of the current context.
+_usage_scope = contextvars.ContextVar('termax_usage_scope', default=None)
+
+
+@contextlib.contextmanager
+def usage_scope():
+    """
+    usage_scope: count the token usage and the queued time of the requests sent within the block.
+    The counts follow the context, so the concurrent tasks sharing a model each see their own requests,
+    including the ones run on the worker threads of a ThreadedAsyncModel.
+
+    Returns: the counts, updated as the requests complete.
+    """
+    usage = {'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cache_write_tokens': 0,
+             'queued': 0.0}
+    token = _usage_scope.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage_scope.reset(token)
+
+
+def _count_queued(seconds: float):
+    scope = _usage_scope.get()
+    if scope is not None:
+        scope['queued'] += seconds
 
 
 class Model(ABC):
 
     def __init__(self):
         self.model_type = None
+        # the token usage of the last request, see record_usage().
+        self.last_usage = {}
+        # the shared rate limiter of the provider, and the seconds the last request spent queued, see _call().
+        self.rate_limiter = None
+        self.last_queued = 0.0
+        # the daily spend cap, and the model the last request was sent to (a downgrade changes it), see _call().
+        self.spend_cap = None
+        self.last_model = None
+        # the number of recorded usages, a stream without any reported usage gets an estimated one.
+        self.usage_records = 0
 
     @abstractmethod
     def to_command(self, prompt, text):
@@ -13,3 +64,466 @@ class Model(ABC):
     @abstractmethod
     def to_description(self, prompt, command):
         pass
+
+    def warm_up(self, background=False):
+        """
+        warm_up: prepare the model for the next request, e.g. load a local model in memory.
+        The backends without anything to prepare do nothing.
+        Args:
+            background: return at once and prepare the model in the background.
+        """
+        return None
+
+    def stream_tokens(self, prompt, text):
+        """
+        stream_tokens: the response to the command prompt as an iterator of text chunks.
+        Closing the iterator cancels the request, the backends without streaming return None.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+        """
+        return None
+
+    def stream_command(self, prompt, text, on_token=None):
+        """
+        stream_command: generate a command from a streamed response, returned as soon as it is complete.
+        The rest of the response is cancelled, it is not read (nor paid for) once the command is known.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            on_token: called with each chunk of the response, e.g. to display the partial output.
+
+        Returns: the command, None if the model failed.
+        """
+        from termax.prompt import CommandStreamParser
+
+        stream = self.stream_tokens(prompt, text)
+        if stream is None:
+            command = self.to_command(prompt, text)
+            if on_token and command:
+                on_token(command)
+            return command
+
+        parser = CommandStreamParser()
+        records = self.usage_records
+        try:
+            for token in stream:
+                if on_token:
+                    on_token(token)
+                command = parser.feed(token)
+                if command is not None:
+                    return command
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+            if self.usage_records == records:
+                self.record_estimated_usage(prompt, text, parser.text)
+        return parser.finish()
+
+    def fork(self):
+        """
+        fork: a shallow copy of the model for a concurrent request, it shares the client, the rate limiter and the
+        spend cap but keeps its own state of the last request (last_usage, last_queued, last_model).
+        """
+        model = copy.copy(self)
+        model.last_usage, model.last_queued, model.last_model, model.usage_records = {}, 0.0, None, 0
+        return model
+
+    def generate_candidates(self, prompt, text, n: int):
+        """
+        generate_candidates: request n commands concurrently, yielded in the order they complete.
+        Each request runs on a fork() of the model, on a daemon thread: the SDKs cannot cancel a request in flight,
+        closing the iterator abandons the pending ones and they do not keep the process alive.
+        The spend cap refusal and the rate limit give-up are raised, a candidate failing otherwise is None.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            n: the number of candidates.
+        """
+        from termax.pricing import SpendCapExceeded
+        from termax.utils.ratelimit import RateLimitExceeded
+
+        results = queue.Queue()
+
+        def run(model):
+            try:
+                results.put((model, model.to_command(prompt, text), None))
+            except Exception as e:
+                results.put((model, None, e))
+
+        for _ in range(n):
+            # the context of the caller (e.g. its usage_scope()) follows each request.
+            threading.Thread(target=contextvars.copy_context().run, args=(run, self.fork()), daemon=True,
+                             name='termax-candidate').start()
+        self.last_queued = 0.0
+        for _ in range(n):
+            model, command, error = results.get()
+            self.last_usage = model.last_usage or self.last_usage
+            self.last_model = model.last_model or self.last_model
+            self.last_queued = max(self.last_queued, model.last_queued)
+            self.usage_records += model.usage_records
+            if isinstance(error, (SpendCapExceeded, RateLimitExceeded)):
+                raise error
+            yield command
+
+    def best_command(self, prompt, text, n: int, score=None):
+        """
+        best_command: the first candidate passing the local checks, or the best scored one.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            n: the number of candidates.
+            score: the scoring function, default is termax.utils.candidates.score_command().
+
+        Returns: a tuple of the command ('' if no usable command, None if the model failed) and the scores.
+        """
+        from termax.utils.candidates import select_candidate, score_command
+        return select_candidate(self.generate_candidates(prompt, text, n), score or score_command)
+
+    def _call(self, func, *args, **kwargs):
+        """
+        _call: send a request to the provider, through the rate limiter.
+        A rate limited request (429) blocks the provider for every process for its Retry-After, or an exponential
+        backoff with jitter, then it is retried up to RATE_LIMIT_RETRIES times before RateLimitExceeded is raised.
+        The time spent waiting is kept in `last_queued`. Once the daily spend cap is reached, the request is refused
+        (SpendCapExceeded) or sent to the fallback model.
+        Args:
+            func: the function of the SDK sending the request.
+            args: the arguments of the function.
+            kwargs: the keyword arguments of the function.
+        """
+        from termax.utils.ratelimit import RateLimitExceeded, retry_after, backoff_delay, estimate_tokens
+
+        self.last_queued = 0.0
+        if self.spend_cap:
+            # over the cap, the request is refused (SpendCapExceeded) or downgraded to the fallback model.
+            fallback = self.spend_cap.check(kwargs.get('model'))
+            if fallback:
+                kwargs['model'] = fallback
+        self.last_model = kwargs.get('model')
+        tokens = estimate_tokens(args, kwargs)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if self.rate_limiter:
+                queued = self.rate_limiter.acquire(tokens)
+                self.last_queued += queued
+                _count_queued(queued)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                after = retry_after(e)
+                if after is None:
+                    raise
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise RateLimitExceeded(f"The rate limit is still exceeded after {RATE_LIMIT_RETRIES} retries, "
+                                            f"please try again later. Error message: {e}") from e
+                delay = backoff_delay(attempt, after)
+                if self.rate_limiter:
+                    self.rate_limiter.block(delay)
+                else:
+                    time.sleep(delay)
+                    self.last_queued += delay
+                    _count_queued(delay)
+
+    def record_usage(self, input_tokens: int, output_tokens: int = 0, cached_tokens: int = 0,
+                     cache_write_tokens: int = 0, estimated: bool = False):
+        """
+        record_usage: keep the token usage of the last request, count the provider prompt cache hits and
+        append the request to the usage ledger.
+        Args:
+            input_tokens: the input tokens of the request, cached ones included.
+            output_tokens: the output tokens of the request.
+            cached_tokens: the input tokens read from the provider prompt cache.
+            cache_write_tokens: the input tokens written to the provider prompt cache.
+            estimated: the provider did not report the usage, it was estimated from the text.
+        """
+        from termax.utils.prompt_cache import record_prompt_cache
+        from termax.pricing import record_request
+
+        self.usage_records += 1
+        self.last_usage = {
+            'input_tokens': input_tokens or 0,
+            'output_tokens': output_tokens or 0,
+            'cached_tokens': cached_tokens or 0,
+            'cache_write_tokens': cache_write_tokens or 0,
+        }
+        model_key = f"{self.model_type}/{self.last_model or getattr(self, 'version', None)}"
+        if not estimated:
+            record_prompt_cache(
+                model_key, self.last_usage['input_tokens'], self.last_usage['cached_tokens'],
+                self.last_usage['cache_write_tokens']
+            )
+        record_request(model_key, self.last_usage, estimated=estimated)
+        scope = _usage_scope.get()
+        if scope is not None:
+            scope['requests'] += 1
+            for key, value in self.last_usage.items():
+                scope[key] += value
+
+    def record_estimated_usage(self, prompt, text, output: str):
+        """
+        record_estimated_usage: record the heuristic usage of a request the provider reported no usage for,
+        e.g. a stream closed as soon as the command was complete.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            output: the response received.
+        """
+        from termax.utils.ratelimit import estimate_tokens
+        self.record_usage(estimate_tokens(prompt, text), estimate_tokens(output), estimated=True)
+
+
+class AsyncModel(ABC):
+
+    def __init__(self):
+        self.model_type = None
+        # the token usage of the last request, see record_usage().
+        self.last_usage = {}
+        # the shared rate limiter of the provider, and the seconds the last request spent queued, see _call().
+        self.rate_limiter = None
+        self.last_queued = 0.0
+        # the daily spend cap, and the model the last request was sent to (a downgrade changes it), see _call().
+        self.spend_cap = None
+        self.last_model = None
+        # the number of recorded usages, a stream without any reported usage gets an estimated one.
+        self.usage_records = 0
+
+    @abstractmethod
+    async def to_command(self, prompt, text):
+        pass
+
+    @abstractmethod
+    async def to_description(self, prompt, command):
+        pass
+
+    async def warm_up(self):
+        """
+        warm_up: prepare the model for the next request, e.g. load a local model in memory.
+        The backends without anything to prepare do nothing.
+        """
+        return None
+
+    def stream_tokens(self, prompt, text):
+        """
+        stream_tokens: the response to the command prompt as an async iterator of text chunks.
+        Closing the iterator cancels the request, the backends without streaming return None.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+        """
+        return None
+
+    async def stream_command(self, prompt, text, on_token=None):
+        """
+        stream_command: generate a command from a streamed response, returned as soon as it is complete.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            on_token: called with each chunk of the response, e.g. to display the partial output.
+
+        Returns: the command, None if the model failed.
+        """
+        from termax.prompt import CommandStreamParser
+
+        stream = self.stream_tokens(prompt, text)
+        if stream is None:
+            command = await self.to_command(prompt, text)
+            if on_token and command:
+                on_token(command)
+            return command
+
+        parser = CommandStreamParser()
+        records = self.usage_records
+        try:
+            async for token in stream:
+                if on_token:
+                    on_token(token)
+                command = parser.feed(token)
+                if command is not None:
+                    return command
+        finally:
+            aclose = getattr(stream, 'aclose', None)
+            if aclose:
+                await aclose()
+            if self.usage_records == records:
+                self.record_estimated_usage(prompt, text, parser.text)
+        return parser.finish()
+
+    async def generate_candidates(self, prompt, text, n: int):
+        """
+        generate_candidates: request n commands concurrently, yielded in the order they complete.
+        Closing the iterator cancels the pending requests.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            n: the number of candidates.
+        """
+        tasks = [asyncio.ensure_future(self.to_command(prompt, text)) for _ in range(n)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    yield await task
+                except Exception:
+                    yield None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def best_command(self, prompt, text, n: int, score=None):
+        """
+        best_command: the first candidate passing the local checks, or the best scored one.
+        Args:
+            prompt: the prompt.
+            text: the natural language text.
+            n: the number of candidates.
+            score: the scoring function, default is termax.utils.candidates.score_command().
+
+        Returns: a tuple of the command ('' if no usable command, None if the model failed) and the scores.
+        """
+        from termax.utils.candidates import aselect_candidate, score_command
+        return await aselect_candidate(self.generate_candidates(prompt, text, n), score or score_command)
+
+    async def _call(self, func, *args, **kwargs):
+        """
+        _call: send a request to the provider through the rate limiter, see Model._call().
+        Args:
+            func: the function of the SDK sending the request, awaited if it returns an awaitable.
+            args: the arguments of the function.
+            kwargs: the keyword arguments of the function.
+        """
+        from termax.utils.ratelimit import RateLimitExceeded, retry_after, backoff_delay, estimate_tokens
+
+        self.last_queued = 0.0
+        if self.spend_cap:
+            # over the cap, the request is refused (SpendCapExceeded) or downgraded to the fallback model.
+            fallback = self.spend_cap.check(kwargs.get('model'))
+            if fallback:
+                kwargs['model'] = fallback
+        self.last_model = kwargs.get('model')
+        tokens = estimate_tokens(args, kwargs)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if self.rate_limiter:
+                queued = await self.rate_limiter.aacquire(tokens)
+                self.last_queued += queued
+                _count_queued(queued)
+            try:
+                result = func(*args, **kwargs)
+                return await result if inspect.isawaitable(result) else result
+            except Exception as e:
+                after = retry_after(e)
+                if after is None:
+                    raise
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise RateLimitExceeded(f"The rate limit is still exceeded after {RATE_LIMIT_RETRIES} retries, "
+                                            f"please try again later. Error message: {e}") from e
+                delay = backoff_delay(attempt, after)
+                if self.rate_limiter:
+                    self.rate_limiter.block(delay)
+                else:
+                    await asyncio.sleep(delay)
+                    self.last_queued += delay
+                    _count_queued(delay)
+
+    record_usage = Model.record_usage
+    record_estimated_usage = Model.record_estimated_usage
+
+
+def get_model_executor():
+    """
+    get_model_executor: the thread pool running the blocking backends for the async models.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ASYNC_MODEL_WORKERS, thread_name_prefix='termax-model')
+    return _executor
+
+
+class ThreadedAsyncModel(AsyncModel):
+    def __init__(self, model: Model, executor=None):
+        """
+        ThreadedAsyncModel: the async interface of a blocking model, run on a bounded thread pool.
+        It is used for the backends without an async client, the context variables of the caller are
+        propagated to the worker threads.
+        Args:
+            model: the blocking model.
+            executor: the executor, default is the pool shared by the process, see get_model_executor().
+        """
+        super().__init__()
+        self.model = model
+        self.model_type = model.model_type
+        self.version = getattr(model, 'version', None)
+        self.executor = executor
+
+    async def _run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        # the calls run concurrently (e.g. the candidates), each on its own fork of the blocking model.
+        model = self.model.fork()
+        try:
+            return await loop.run_in_executor(
+                self.executor or get_model_executor(), functools.partial(context.run, getattr(model, method), *args)
+            )
+        finally:
+            self.last_usage = model.last_usage
+            self.last_queued = model.last_queued
+            self.last_model = model.last_model
+
+    async def warm_up(self):
+        return await self._run('warm_up')
+
+    async def to_command(self, prompt, text):
+        return await self._run('to_command', prompt, text)
+
+    async def to_description(self, prompt, command):
+        return await self._run('to_description', prompt, command)
+
+    async def stream_command(self, prompt, text, on_token=None):
+        # the chunks arrive on a worker thread, the callback runs on the event loop.
+        loop = asyncio.get_running_loop()
+        callback = (lambda token: loop.call_soon_threadsafe(on_token, token)) if on_token else None
+        return await self._run('stream_command', prompt, text, callback)
+
+
+class BlockingModel(Model):
+    def __init__(self, model: AsyncModel):
+        """
+        BlockingModel: the blocking interface of an async model, for the synchronous callers (CLI, daemon).
+        The model runs on a private event loop, kept for the lifetime of the instance so the connections of the
+        async clients are reused between the calls.
+        Args:
+            model: the async model.
+        """
+        super().__init__()
+        self.model = model
+        self.model_type = model.model_type
+        self.version = getattr(model, 'version', None)
+        self.loop = asyncio.new_event_loop()
+        # the loop runs one call at a time, a request waits for a background warm-up to finish.
+        self.lock = threading.Lock()
+
+    def _run(self, coroutine):
+        with self.lock:
+            try:
+                return self.loop.run_until_complete(coroutine)
+            finally:
+                self.last_usage = self.model.last_usage
+                self.last_queued = self.model.last_queued
+
+    def warm_up(self, background=False):
+        if background:
+            threading.Thread(target=self.warm_up, daemon=True, name='termax-warm-up').start()
+            return None
+        return self._run(self.model.warm_up())
+
+    def to_command(self, prompt, text):
+        return self._run(self.model.to_command(prompt, text))
+
+    def to_description(self, prompt, command):
+        return self._run(self.model.to_description(prompt, command))
+
+    def stream_command(self, prompt, text, on_token=None):
+        return self._run(self.model.stream_command(prompt, text, on_token))
+
+    def best_command(self, prompt, text, n: int, score=None):
+        return self._run(self.model.best_command(prompt, text, n, score))
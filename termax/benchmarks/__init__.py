@@ -0,0 +1,3 @@
+from .runner import *
+from .fixtures import *
+from . import suite
@@ -0,0 +1,185 @@
+import os
+import random
+import hashlib
+from typing import List
+
+# the fixtures only depend on their size and this seed, the runs of different machines see the same data.
+FIXTURE_SEED = 42
+# the mtime of the fixture directories, old enough for the caches keyed by mtime to trust it.
+FIXTURE_MTIME = 1700000000
+
+_WORDS = [
+    'list', 'files', 'find', 'large', 'logs', 'disk', 'usage', 'show', 'process', 'memory', 'kill', 'port',
+    'docker', 'container', 'image', 'git', 'branch', 'commit', 'python', 'package', 'install', 'network',
+    'download', 'archive', 'compress', 'extract', 'search', 'text', 'replace', 'directory', 'copy', 'remote',
+    'server', 'user', 'permission', 'change', 'owner', 'count', 'lines', 'sort', 'unique', 'recent', 'modified',
+]
+_COMMANDS = [
+    'ls -la', 'du -sh *', 'find . -name "*.log" -size +10M', 'ps aux | grep python', 'kill -9 1234',
+    'lsof -i :8080', 'docker ps -a', 'docker images', 'git branch -a', 'git log --oneline -n 10',
+    'pip install requests', 'curl -O https://example.com/file.tar.gz', 'tar -xzf archive.tar.gz',
+    'grep -rn "TODO" .', "sed -i 's/foo/bar/g' file.txt", 'cp -r src dst', 'chmod +x script.sh',
+    'chown user:group file', 'wc -l *.py', 'sort data.txt | uniq -c', 'ls -t | head',
+]
+
+
+def _ready(marker: str):
+    """
+    _ready: whether a fixture was fully built by a previous run, its marker is written last.
+    """
+    return os.path.exists(marker)
+
+
+def _mark(marker: str):
+    with open(marker, 'w') as f:
+        f.write('ok')
+
+
+def sentence(rng: random.Random, words: int = 6):
+    """
+    sentence: a natural language request made of random words.
+    """
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def make_path(root: str, executables: int, directories: int = 20):
+    """
+    make_path: a search path of `directories` directories holding `executables` executables in total.
+    Args:
+        root: the directory of the fixture.
+        executables: the total number of executables.
+        directories: the number of directories on the path.
+
+    Returns: the search path, joined with os.pathsep.
+    """
+    base = os.path.join(root, f'path-{executables}')
+    paths = [os.path.join(base, f'bin{i}') for i in range(directories)]
+    marker = os.path.join(base, '.ready')
+    if not _ready(marker):
+        for i, directory in enumerate(paths):
+            os.makedirs(directory, exist_ok=True)
+            for j in range(i, executables, directories):
+                path = os.path.join(directory, f'cmd-{j:06d}')
+                with open(path, 'w') as f:
+                    f.write('#!/bin/sh\n')
+                os.chmod(path, 0o755)
+            os.utime(directory, (FIXTURE_MTIME, FIXTURE_MTIME))
+        _mark(marker)
+    return os.pathsep.join(paths)
+
+
+def make_directory(root: str, entries: int):
+    """
+    make_directory: a directory of `entries` entries, mostly files of various extensions, a few directories
+    and hidden files.
+    Args:
+        root: the directory of the fixture.
+        entries: the number of entries.
+
+    Returns: the path of the directory.
+    """
+    directory = os.path.join(root, f'dir-{entries}')
+    marker = os.path.join(root, f'.dir-{entries}.ready')
+    if not _ready(marker):
+        rng = random.Random(FIXTURE_SEED)
+        os.makedirs(directory, exist_ok=True)
+        extensions = ['.py', '.txt', '.log', '.json', '.csv', '.md', '']
+        for i in range(entries):
+            if i % 50 == 0:
+                os.makedirs(os.path.join(directory, f'subdir_{i:06d}'), exist_ok=True)
+                continue
+            name = f"{'.' if i % 37 == 0 else ''}file_{i:06d}{rng.choice(extensions)}"
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(b'x' * rng.randint(0, 512))
+        os.utime(directory, (FIXTURE_MTIME, FIXTURE_MTIME))
+        _mark(marker)
+    return directory
+
+
+def make_history(root: str, lines: int, shell: str = 'zsh'):
+    """
+    make_history: a shell history file of `lines` commands, in the extended zsh format (with timestamps)
+    or the plain bash format.
+    Args:
+        root: the directory of the fixture, used as $HOME.
+        lines: the number of commands.
+        shell: `zsh` or `bash`.
+
+    Returns: the home directory holding the history file.
+    """
+    home = os.path.join(root, f'home-{shell}-{lines}')
+    marker = os.path.join(home, '.ready')
+    if not _ready(marker):
+        rng = random.Random(FIXTURE_SEED)
+        os.makedirs(home, exist_ok=True)
+        timestamp = 1700000000
+        with open(os.path.join(home, '.zsh_history' if shell == 'zsh' else '.bash_history'), 'w') as f:
+            for _ in range(lines):
+                timestamp += rng.randint(1, 120)
+                command = rng.choice(_COMMANDS)
+                f.write(f": {timestamp}:0;{command}\n" if shell == 'zsh' else f"{command}\n")
+        _mark(marker)
+    return home
+
+
+def make_records(count: int):
+    """
+    make_records: `count` requests and their commands, in the format of Memory.add_query().
+    """
+    rng = random.Random(FIXTURE_SEED)
+    return [
+        {'query': f"{sentence(rng)} {i}", 'response': rng.choice(_COMMANDS), 'executed': True}
+        for i in range(count)
+    ]
+
+
+def make_markdown(size: int):
+    """
+    make_markdown: a model response of about `size` bytes, prose and code blocks without a `Command:` line,
+    so extract_shell_commands() goes through the markdown code extraction.
+    """
+    rng = random.Random(FIXTURE_SEED)
+    parts, length = [], 0
+    while length < size:
+        if rng.random() < 0.3:
+            part = "```bash\n" + "\n".join(rng.choice(_COMMANDS) for _ in range(rng.randint(1, 5))) + "\n```\n"
+        else:
+            part = sentence(rng, rng.randint(10, 40)) + ".\n\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def make_stderr(size: int):
+    """
+    make_stderr: about `size` bytes of compiler-like errors, the recognized error is on the last line,
+    the worst case of CommandAnalyzer.analyze().
+    """
+    rng = random.Random(FIXTURE_SEED)
+    lines, length = [], 0
+    while length < size:
+        line = f"src/module_{rng.randint(0, 999)}.c:{rng.randint(1, 5000)}: warning: {sentence(rng, 8)}"
+        lines.append(line)
+        length += len(line) + 1
+    lines.append("make: *** No space left on device")
+    return "\n".join(lines)
+
+
+class HashEmbeddingFunction:
+    """
+    HashEmbeddingFunction: a deterministic bag-of-words embedding, no model to download and no network,
+    the memory benchmarks measure the storage and the search, not the embedding model.
+    """
+
+    def __init__(self, dimensions: int = 64):
+        self.dimensions = dimensions
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        embeddings = []
+        for text in input:
+            vector = [0.0] * self.dimensions
+            for word in text.lower().split():
+                vector[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dimensions] += 1.0
+            norm = sum(v * v for v in vector) ** 0.5 or 1.0
+            embeddings.append([v / norm for v in vector])
+        return embeddings
@@ -0,0 +1,171 @@
+import gc
+import os
+import json
+import time
+import shutil
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import termax
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+# name -> Benchmark, see register_benchmark().
+BENCHMARKS = {}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: Callable
+    sizes: Tuple[int, ...]
+    quick_sizes: Tuple[int, ...]
+    repeat: Optional[int] = None
+
+
+def register_benchmark(name: str, sizes: Tuple[int, ...], quick_sizes: Optional[Tuple[int, ...]] = None,
+                       repeat: Optional[int] = None):
+    """
+    register_benchmark: register a function as a benchmark.
+    The function is called with the working directory and a size, it builds its fixtures and returns the
+    timed callable, or a tuple of (setup, run) when each run needs a fresh state.
+    Args:
+        name: the name of the benchmark.
+        sizes: the sizes of the full run, e.g. the number of records.
+        quick_sizes: the sizes of a quick run, default is the smallest size.
+        repeat: caps the number of runs of a slow benchmark.
+    """
+
+    def decorator(func):
+        BENCHMARKS[name] = Benchmark(name, func, tuple(sizes), tuple(quick_sizes or sizes[:1]), repeat)
+        return func
+
+    return decorator
+
+
+def time_case(case, repeat: int):
+    """
+    time_case: time the runs of a benchmark case.
+    Args:
+        case: the callable returned by the benchmark, or a tuple of (setup, run).
+        repeat: the number of runs.
+
+    Returns: the wall time (ms) of each run.
+    """
+    setup, run = case if isinstance(case, tuple) else (None, case)
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run_benchmarks(names: Optional[List[str]] = None, quick: bool = False, repeat: int = BENCH_REPEAT,
+                   workdir: Optional[str] = None, on_result=None):
+    """
+    run_benchmarks: run the registered benchmarks at each of their sizes.
+    Args:
+        names: the benchmarks to run, default is all of them.
+        quick: run the quick sizes only.
+        repeat: the number of runs of each case.
+        workdir: the directory of the fixtures, reused across runs when given, a temporary one otherwise.
+        on_result: called with the key and the result of each case as soon as it is measured.
+
+    Returns: the results, with the environment they were measured in.
+    """
+    unknown = [name for name in names or [] if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+
+    temporary = workdir is None
+    workdir = tempfile.mkdtemp(prefix='termax-bench-') if temporary else workdir
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+    try:
+        for name in names or list(BENCHMARKS):
+            benchmark = BENCHMARKS[name]
+            runs = min(repeat, benchmark.repeat) if benchmark.repeat else repeat
+            for size in benchmark.quick_sizes if quick else benchmark.sizes:
+                key = f"{name}[{size}]"
+                result = {'benchmark': name, 'size': size}
+                try:
+                    timings = time_case(benchmark.func(workdir, size), runs)
+                    result.update(
+                        runs=len(timings), min_ms=round(min(timings), 3), median_ms=round(statistics.median(timings), 3),
+                        mean_ms=round(statistics.mean(timings), 3)
+                    )
+                except Exception as e:
+                    result['error'] = f"{type(e).__name__}: {e}"
+                results[key] = result
+                if on_result:
+                    on_result(key, result)
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'termax': termax.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'quick': quick,
+        'repeat': repeat,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    }
+
+
+def compare_results(results: dict, baseline: dict, threshold: float = BENCH_REGRESSION_THRESHOLD):
+    """
+    compare_results: compare the median of each case with the baseline.
+    Args:
+        results: the results of run_benchmarks().
+        baseline: the results of a previous run.
+        threshold: the relative change above which a case is reported as a regression (or an improvement).
+
+    Returns: a dictionary of case to its baseline median, the ratio to it and a status: `regression`,
+        `improvement`, `ok`, `new` (not in the baseline) or `error`.
+    """
+    comparison = {}
+    previous = baseline.get('results', {})
+    for key, result in results.get('results', {}).items():
+        base = previous.get(key, {}).get('median_ms')
+        if 'error' in result:
+            comparison[key] = {'baseline_ms': base, 'ratio': None, 'status': 'error'}
+            continue
+        if not base:
+            comparison[key] = {'baseline_ms': None, 'ratio': None, 'status': 'new'}
+            continue
+        ratio = result['median_ms'] / base
+        status = 'regression' if ratio > 1 + threshold else 'improvement' if ratio < 1 - threshold else 'ok'
+        comparison[key] = {'baseline_ms': base, 'ratio': round(ratio, 3), 'status': status}
+    return comparison
+
+
+def load_results(path: str = os.path.join(CONFIG_HOME, BENCH_BASELINE_FILE)):
+    """
+    load_results: load saved results, None if there are none.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_results(results: dict, path: str = os.path.join(CONFIG_HOME, BENCH_BASELINE_FILE)):
+    """
+    save_results: write the results atomically, e.g. as the baseline of the next runs.
+    """
+    atomic_write_json(path, results, indent=2)
+
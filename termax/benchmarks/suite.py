@@ -0,0 +1,192 @@
+import os
+import random
+import shutil
+
+from termax.utils.const import *
+from .runner import register_benchmark
+from .fixtures import *
+
+
+@register_benchmark('path_index_cold', sizes=(10000,), quick_sizes=(1000,))
+def bench_path_index_cold(workdir: str, size: int):
+    """
+    bench_path_index_cold: list the executables of a synthetic $PATH without an index (the first run).
+    """
+    from termax.utils.path_index import PathIndex
+
+    path = make_path(workdir, size)
+    index_path = os.path.join(workdir, f'path_index_cold_{size}.json')
+
+    def setup():
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+    def run():
+        index = PathIndex(index_path=index_path, path=path)
+        index.refresh()
+        index.commands()
+
+    return setup, run
+
+
+@register_benchmark('path_index_warm', sizes=(10000,), quick_sizes=(1000,))
+def bench_path_index_warm(workdir: str, size: int):
+    """
+    bench_path_index_warm: list the executables of a synthetic $PATH from an up-to-date index.
+    """
+    from termax.utils.path_index import PathIndex
+
+    path = make_path(workdir, size)
+    index_path = os.path.join(workdir, f'path_index_warm_{size}.json')
+    PathIndex(index_path=index_path, path=path).refresh()
+
+    def run():
+        index = PathIndex(index_path=index_path, path=path)
+        index.refresh()
+        index.commands()
+
+    return run
+
+
+@register_benchmark('file_metadata', sizes=(1000, 100000), quick_sizes=(1000,))
+def bench_file_metadata(workdir: str, size: int):
+    """
+    bench_file_metadata: list (and summarize) a directory of `size` entries.
+    """
+    from termax.utils.metadata import get_file_metadata
+
+    directory = make_directory(workdir, size)
+    return lambda: get_file_metadata(directory, incremental=False)
+
+
+@register_benchmark('file_metadata_cached', sizes=(1000, 100000), quick_sizes=(1000,))
+def bench_file_metadata_cached(workdir: str, size: int):
+    """
+    bench_file_metadata_cached: the listing of an unchanged directory of `size` entries, from the listing cache.
+    """
+    from termax.utils.listing import get_listing
+
+    directory = make_directory(workdir, size)
+    cache_path = os.path.join(workdir, f'listing_cache_{size}.json')
+    get_listing(directory, cache_path=cache_path)
+    return lambda: get_listing(directory, cache_path=cache_path)
+
+
+def _open_memory(data_path: str):
+    from termax.prompt import Memory
+    return Memory(data_path=data_path, embedding_function=HashEmbeddingFunction())
+
+
+def _filled_memory(workdir: str, size: int):
+    """
+    _filled_memory: a memory holding `size` records, kept in the working directory for the next benchmarks.
+    """
+    data_path = os.path.join(workdir, f'memory-{size}')
+    marker = os.path.join(workdir, f'.memory-{size}.ready')
+    if not os.path.exists(marker):
+        shutil.rmtree(data_path, ignore_errors=True)
+        _open_memory(data_path).add_query(make_records(size), idx=[str(i) for i in range(size)])
+        with open(marker, 'w') as f:
+            f.write('ok')
+    return _open_memory(data_path)
+
+
+@register_benchmark('memory_add', sizes=(1000, 10000, 100000), quick_sizes=(1000,), repeat=1)
+def bench_memory_add(workdir: str, size: int):
+    """
+    bench_memory_add: add `size` records to an empty memory.
+    """
+    records = make_records(size)
+    data_path = os.path.join(workdir, f'memory-add-{size}')
+    state = {}
+
+    def setup():
+        shutil.rmtree(data_path, ignore_errors=True)
+        state['memory'] = _open_memory(data_path)
+
+    def run():
+        state['memory'].add_query(records)
+
+    return setup, run
+
+
+@register_benchmark('memory_query', sizes=(1000, 10000, 100000), quick_sizes=(1000,))
+def bench_memory_query(workdir: str, size: int):
+    """
+    bench_memory_query: the 5 nearest records of a request, in a memory of `size` records.
+    """
+    memory = _filled_memory(workdir, size)
+    rng = random.Random(FIXTURE_SEED)
+    return lambda: memory.query([sentence(rng)])
+
+
+@register_benchmark('gen_commands', sizes=(1000,))
+def bench_gen_commands(workdir: str, size: int):
+    """
+    bench_gen_commands: build the prompt of a request end to end (memory samples, metadata, assembly),
+    with a memory of `size` records, in a directory of 1000 entries.
+    """
+    from termax.prompt import Prompt
+
+    prompt = Prompt(_filled_memory(workdir, size))
+    directory = make_directory(workdir, 1000)
+    rng = random.Random(FIXTURE_SEED)
+
+    def run():
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            prompt.gen_commands(sentence(rng))
+        finally:
+            os.chdir(cwd)
+
+    return run
+
+
+@register_benchmark('extract_shell_commands', sizes=(1 << 20, 10 << 20), quick_sizes=(100 << 10,))
+def bench_extract_shell_commands(workdir: str, size: int):
+    """
+    bench_extract_shell_commands: extract the command of a markdown response of `size` bytes.
+    """
+    from termax.prompt import extract_shell_commands
+
+    markdown = make_markdown(size)
+    return lambda: extract_shell_commands(markdown)
+
+
+@register_benchmark('command_analyzer', sizes=(1 << 20, 10 << 20), quick_sizes=(1 << 20,))
+def bench_command_analyzer(workdir: str, size: int):
+    """
+    bench_command_analyzer: analyze a failed command with `size` bytes of stderr.
+    """
+    from termax.core.analyzer import CommandAnalyzer
+
+    analyzer = CommandAnalyzer()
+    stderr = make_stderr(size)
+    return lambda: analyzer.analyze('make all', '', stderr, 2)
+
+
+@register_benchmark('command_history', sizes=(500000,), quick_sizes=(50000,))
+def bench_command_history(workdir: str, size: int):
+    """
+    bench_command_history: read a zsh history of `size` commands.
+    """
+    from termax.utils.metadata import get_command_history
+
+    home = make_history(workdir, size)
+
+    def run():
+        environ = {name: os.environ.get(name) for name in ('HOME', 'SHELL')}
+        os.environ.update(HOME=home, SHELL='/bin/zsh')
+        try:
+            history = get_command_history()
+        finally:
+            for name, value in environ.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        if not isinstance(history, dict):
+            raise RuntimeError(history)
+
+    return run
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from typing import List, Optional
+
+from termax.utils.const import *
+
+# the keys holding the request in a JSONL line.
+_TEXT_KEYS = ('text', 'input', 'request', 'query')
+
+
+def read_requests(stream) -> List[dict]:
+    """
+    read_requests: read the requests of a batch, one per line.
+    A line is either the natural language text or a JSON object with the text under `text` (or `input`,
+    `request`, `query`) and an optional `id` copied to its result. The blank lines are skipped.
+    Args:
+        stream: the input, e.g. a file or stdin.
+
+    Returns: a list of dictionaries with the index, the text and the id of each request.
+    """
+    requests = []
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON.")
+            text = next((record[key] for key in _TEXT_KEYS if record.get(key)), None)
+            if not isinstance(text, str):
+                raise ValueError(f"Line {number} has no request text, expected one of: {', '.join(_TEXT_KEYS)}.")
+            request_id = record.get('id')
+        else:
+            text = line
+        requests.append({'index': len(requests), 'text': text, 'id': request_id})
+    return requests
+
+
+class BatchWriter:
+    def __init__(self, output, ordered: bool = False):
+        """
+        BatchWriter: write the results of a batch as JSONL, flushed as they complete.
+        Args:
+            output: the output stream.
+            ordered: write the results in the order of the requests, a result waits for the earlier ones.
+        """
+        self.output = output
+        self.ordered = ordered
+        self.pending = {}
+        self.next_index = 0
+
+    def _write(self, result: dict):
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    def write(self, result: dict):
+        if not self.ordered:
+            self._write(result)
+            return
+        self.pending[result['index']] = result
+        while self.next_index in self.pending:
+            self._write(self.pending.pop(self.next_index))
+            self.next_index += 1
+
+
+async def run_batch(requests: List[dict], output, concurrency: int = BATCH_CONCURRENCY, ordered: bool = False,
+                    no_cache: bool = False, model=None, platform: Optional[str] = None, prompt=None,
+                    config_dict: Optional[dict] = None):
+    """
+    run_batch: translate the requests of a batch, with at most `concurrency` requests in flight.
+    The model client, the prompt and the memory are shared by all the requests, the memory is queried and the
+    metadata collected once for the whole batch.
+    Args:
+        requests: the requests, see read_requests().
+        output: the output stream of the JSONL results.
+        concurrency: the maximum number of requests translated at the same time.
+        ordered: write the results in the order of the requests instead of the completion order.
+        no_cache: bypass the response cache and the semantic cache.
+        model: the async model, loaded from the configuration by default.
+        platform: the platform of the model.
+        prompt: the prompt instance, loaded with the memory by default.
+        config_dict: the configuration.
+
+    Returns: a dictionary with the number of requests, of cache hits and of failures.
+    """
+    from termax.agent import usage_scope
+    from termax.utils import Config
+    from termax.utils.response_cache import get_response_cache
+    from termax.cli.utils import load_async_model, load_memory, load_prompt, agenerate_command, response_key
+
+    config_dict = config_dict or Config().read()
+    general = config_dict.get(CONFIG_SEC_GENERAL, {})
+    if model is None:
+        model, platform = load_async_model()
+    prompt = prompt or load_prompt(load_memory())
+    # the memory and the metadata are collected once, the prompts are then built without blocking the event loop.
+    prompt.prefetch_memory([request['text'] for request in requests])
+    prompt.prefetch_metadata()
+
+    cache = None if no_cache else get_response_cache()
+    semantic = not no_cache and general.get('semantic_cache') == "True"
+    threshold = float(general.get('semantic_threshold', SEMANTIC_CACHE_THRESHOLD))
+    candidates = int(general.get('candidates', 1))
+    cwd = os.getcwd()
+
+    writer = BatchWriter(output, ordered)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    summary = {'requests': len(requests), 'cache_hits': 0, 'failures': 0}
+
+    async def translate(request):
+        async with semaphore:
+            start = time.perf_counter()
+            result = {'index': request['index'], 'input': request['text']}
+            if request['id'] is not None:
+                result['id'] = request['id']
+
+            cache_key = response_key(request['text'], config_dict, cwd)
+            command = cache.get(cache_key) if cache else None
+            if command is None and semantic:
+                match = prompt.match_memory(request['text'], threshold)
+                command = match['command'] if match else None
+            cache_hit = command is not None
+
+            with usage_scope() as usage:
+                if not cache_hit:
+                    try:
+                        command = await agenerate_command(model, prompt, request['text'], platform,
+                                                          candidates=candidates)
+                    except Exception as e:
+                        result['error'] = str(e)
+                        command = None
+
+            # the commands of a batch are not executed, they are not cached, see ResponseCache.put().
+            if not command:
+                result.setdefault('error', "Unable to generate the command.")
+                summary['failures'] += 1
+            summary['cache_hits'] += cache_hit
+
+            result.update({
+                'command': command or None,
+                'latency': round(time.perf_counter() - start, 3),
+                'tokens': {'input': usage['input_tokens'], 'output': usage['output_tokens'],
+                           'cached': usage['cached_tokens']},
+                'queued': round(usage['queued'], 3),
+                'cache_hit': cache_hit,
+            })
+            writer.write(result)
+
+    await asyncio.gather(*(translate(request) for request in requests))
+    return summary
+
+
+def batch(source: str = '-', output_path: Optional[str] = None, concurrency: int = BATCH_CONCURRENCY,
+          ordered: bool = False, no_cache: bool = False):
+    """
+    batch: translate the requests of a file (or stdin) and write the results as JSONL.
+    The messages of the backends are sent to stderr, so the output only holds the results.
+    Args:
+        source: the path of the requests, `-` for stdin.
+        output_path: the path of the results, stdout by default.
+        concurrency: the maximum number of requests translated at the same time.
+        ordered: write the results in the order of the requests.
+        no_cache: bypass the response cache and the semantic cache.
+
+    Returns: the summary of the batch, see run_batch().
+    """
+    from contextlib import redirect_stdout
+
+    if source == '-':
+        requests = read_requests(sys.stdin)
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            requests = read_requests(f)
+
+    output = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    try:
+        with redirect_stdout(sys.stderr):
+            return asyncio.run(run_batch(requests, output, concurrency, ordered, no_cache))
+    finally:
+        if output_path:
+            output.close()
@@ -1,14 +1,14 @@
 import click
-from rich.console import Console
 
 import termax
 from .utils import *
 from termax.utils.const import *
-from termax.prompt import Prompt, Memory
-from termax.plugin import install_plugin, uninstall_plugin
 from termax.utils import Config, CONFIG_PATH, qa_confirm, qa_action, qa_prompt, qa_revise
+from termax.utils.profiler import start_profiler, finish_profiler
+
+# NOTE: keep the module level imports light, the shell plugins start this CLI on every keystroke.
+# rich, the plugins, the memory (chromadb) and the LLM SDKs are loaded inside the commands using them.
 
-memory = Memory()
 # avoid the tokenizers parallelism issue
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
 
@@ -51,20 +51,30 @@ class DefaultCommandGroup(click.Group):
 
 @click.group(cls=DefaultCommandGroup)
 @click.version_option(version=termax.__version__)
-def cli():
+@click.pass_context
+def cli(ctx):
     """
     Termax: A CLI tool to generate and execute commands from natural language.
     """
-    pass
+    from termax.pricing import set_usage_command
+
+    # the requests of this run are accounted to the subcommand in the usage ledger.
+    subcommand = ctx.invoked_subcommand
+    set_usage_command('generate' if subcommand == cli.default_command else subcommand)
 
 
 @cli.command()
-def guess():
+@click.option('--profile', is_flag=True, help="Show the time spent in each stage, see `termax profile report`.")
+def guess(profile: bool = False):
     """
     Guess the next command based on the information provided.
     """
+    from rich.console import Console
+
+    if start_profiler('guess', profile):
+        click.get_current_context().call_on_close(finish_profiler)
+
     console = Console()
-    prompt = Prompt(memory)
     configuration = Config()
 
     config_dict = configuration.read()
@@ -80,6 +90,7 @@ def guess():
         config_dict = configuration.read()
 
     model, platform = load_model()
+    prompt = load_prompt()
     # generate the commands from the model, and execute if auto_execute is True
     intent = qa_prompt()
     if intent is None:
@@ -88,6 +99,10 @@ def guess():
     with console.status(f"[cyan]Guessing..."):
         primary, description = intent['primary'], intent['description']
         guess_prompt = prompt.gen_suggestions(primary, platform)
+        for name, report in prompt.collector_report.items():
+            if report['status'] != 'ok':
+                console.log(f"{name} metadata unavailable ({report['elapsed_ms']}ms): {report['error']}",
+                            style="yellow")
         command = model.to_command(prompt=guess_prompt, text=description)
 
     click.echo(f"\nSuggestion:\n")
@@ -120,19 +135,36 @@ def guess():
         command_success = True
     finally:
         if choice == 2 and command_success:
-            save_command(command, description, config_dict, memory)
+            save_command(command, description, config_dict, load_memory())
 
 
 @cli.command(default_command=True)
 @click.argument('text', nargs=-1)
 @click.option('--print_cmd', '-p', is_flag=True, help="Print the generated command only.")
-def generate(text, print_cmd=False):
+@click.option('--verbose', '-v', is_flag=True, help="Show the size of the prompt and the sections left out.")
+@click.option('--no-cache', is_flag=True, help="Ask the model even if the command is in the response cache.")
+@click.option('--profile', is_flag=True, help="Show the time spent in each stage, see `termax profile report`.")
+def generate(text, print_cmd=False, verbose=False, no_cache=False, profile=False):
     """
     This function will call and generate the commands from LLM
     Args:
         text: the text to be converted into a command.
         print_cmd: if True, only print the generated command.
+        verbose: if True, show the prompt budget report.
+        no_cache: if True, bypass the response cache.
+        profile: if True, show the time spent in each stage (also enabled by TERMAX_PROFILE).
     """
+    from termax.utils.response_cache import get_response_cache
+    from termax.utils.ratelimit import RateLimitExceeded
+    from termax.pricing import SpendCapExceeded
+
+    # the table goes to stderr once the command is done, the output of -p is unchanged.
+    if start_profiler('generate', profile):
+        click.get_current_context().call_on_close(finish_profiler)
+
+    from rich.console import Console
+    from rich.markup import escape
+
     console = Console()
     text = " ".join(text)
     configuration = Config()
@@ -142,7 +174,6 @@ def generate(text, print_cmd=False):
         click.echo("Config file not found. Running config setup...")
         build_config()
 
-    prompt = Prompt(memory)
     config_dict = configuration.read()
     if not configuration.config.has_section(CONFIG_SEC_GENERAL):
         click.echo(f"General section not found. Running config setup...")
@@ -155,30 +186,68 @@ def generate(text, print_cmd=False):
         build_config()
         config_dict = configuration.read()
 
-    # load the LLM model
-    model, platform = load_model()
-    # generate the commands from the model, and execute if auto_execute is True
-    with console.status(f"[cyan]Generating..."):
-        # loop until the generated command is not ''.
-        for i in range(3):
-            command = model.to_command(prompt.gen_commands(text, platform), text)
-            if command == None:
+    # the response cache is checked first, a hit neither loads the model (and its SDK) nor the memory.
+    cache = None if no_cache else get_response_cache()
+    cache_key = response_key(text, config_dict)
+    command = cache.get(cache_key) if cache else None
+    model = prompt = None
+    answered_from = "the response cache" if command is not None else None
+
+    # the semantic cache: the command of a near-duplicate request, executed successfully before.
+    if command is None and not no_cache and config_dict['general'].get('semantic_cache') == "True":
+        prompt = load_prompt(load_memory())
+        threshold = float(config_dict['general'].get('semantic_threshold', SEMANTIC_CACHE_THRESHOLD))
+        match = prompt.match_memory(text, threshold)
+        if match:
+            command = match['command']
+            answered_from = f"the memory ({match['confidence']:.0%} match of \"{match['query']}\")"
+
+    while True:
+        if command is None:
+            # load the LLM model
+            if model is None:
+                model, platform = load_model()
+                prompt = prompt or load_prompt(load_memory())
+            # generate the commands from the model, and execute if auto_execute is True
+            with console.status(f"[cyan]Generating...") as status:
+                partial = []
+
+                def show_partial(token):
+                    partial.append(token)
+                    status.update(f"[cyan]Generating...[/cyan] {escape(partial_output(''.join(partial)))}")
+
+                try:
+                    command = generate_command(model, prompt, text, platform, on_token=show_partial,
+                                               candidates=int(config_dict['general'].get('candidates', 1)))
+                except (SpendCapExceeded, RateLimitExceeded) as e:
+                    # on stderr, the output of -p goes to the shell buffer.
+                    Console(stderr=True).log(str(e), style="red")
+                    return
+            if verbose and prompt.report:
+                report = prompt.report
+                console.log(f"Prompt: {report['tokens']}/{report['budget']} tokens ({report['tokenizer']}), "
+                            f"dropped: {', '.join(report['dropped']) or '-'}, "
+                            f"truncated: {', '.join(report['truncated']) or '-'}", style="cyan")
+                if model.last_usage:
+                    console.log(f"Prompt cache: {model.last_usage['cached_tokens']}/"
+                                f"{model.last_usage['input_tokens']} input tokens cached", style="cyan")
+                if model.last_queued:
+                    console.log(f"Queued: {model.last_queued:.2f}s behind the rate limit", style="cyan")
+            if command is None:
                 return
-            elif command != '':
-                if not command.startswith('t ') and not command.startswith('termax '):
-                    break
-                else:
-                    text = text + ", do not use command t or termax."
-            if i == 2:
+            elif command == '':
                 console.log("Unable to generate the command, please try again.")
                 return
+        elif answered_from and (verbose or not print_cmd):
+            console.log(f"Answered from {answered_from}.", style="cyan")
+
+        if print_cmd:
+            print(command)
+            # TODO: improve the RAG compatibility using the shell plugin.
+            # the command generate using the shell plugin will not be saved in the memory.
+            # save_command(command, text, config_dict, memory)
+            return
 
-    if print_cmd:
-        print(command)
-        # TODO: improve the RAG compatibility using the shell plugin.
-        # the command generate using the shell plugin will not be saved in the memory.
-        # save_command(command, text, config_dict, memory)
-    else:
         if config_dict['general']['show_command'] == "True":
             console.log(command, style="purple")
 
@@ -188,19 +257,36 @@ def generate(text, print_cmd=False):
             if config_dict['general']['auto_execute'] == "True":
                 command_success = execute_command(command)
             else:
-                choice = qa_confirm()
+                choice = qa_confirm(regenerate=answered_from is not None)
                 if choice == 0:
                     command_success = execute_command(command)
                 elif choice == 2:
                     with console.status(f"[cyan]Generating..."):
+                        if model is None:
+                            model, _ = load_model()
+                            prompt = prompt or load_prompt()
                         description = model.to_description(prompt.explain_commands(), command)
                     console.log(f"{description}")
+                elif choice == 3:
+                    # ask the LLM again, ignoring the cached answer.
+                    if cache:
+                        cache.invalidate(cache_key)
+                    command, answered_from = None, None
+                    continue
+                elif choice == 1 and cache:
+                    cache.invalidate(cache_key)
         except KeyboardInterrupt:
             command_success = True
         finally:
             if config_dict['general']['auto_execute'] == "True" or choice == 0:
+                # only a command executed successfully is cached, a failed one is not replayed.
                 if command_success:
-                    save_command(command, text, config_dict, memory)
+                    save_command(command, text, config_dict, load_memory())
+                    if cache and answered_from is None:
+                        cache.put(cache_key, text, command, f"{platform}/{model.version}")
+                elif cache:
+                    cache.invalidate(cache_key)
+        return
 
 
 @cli.command()
@@ -220,6 +306,7 @@ def install(name: str):
     Args:
         name: the name of the plugin, should be in the PLUGIN_LIST.
     """
+    from termax.plugin import install_plugin
     install_plugin(name)
 
 
@@ -231,16 +318,62 @@ def uninstall(name: str):
     Args:
         name: the name of the plugin, should be in the PLUGIN_LIST.
     """
+    from termax.plugin import uninstall_plugin
     uninstall_plugin(name)
 
 
+@cli.command()
+@click.option('--refresh', '-r', is_flag=True, help="Probe all the fields again, ignoring their TTL.")
+@click.option('--collectors', '-c', is_flag=True, help="Run the metadata sources and show their timings.")
+def metadata(refresh: bool = False, collectors: bool = False):
+    """
+    Show the cached system metadata used by the prompts.
+    """
+    from termax.utils.snapshot import get_system_snapshot
+    from termax.utils.collector import COLLECTORS, run_collectors
+
+    if collectors:
+        for name, result in run_collectors(list(COLLECTORS)).items():
+            click.echo(f"{name:<20}{result['status']:<10}{result['elapsed_ms']:>10}ms  {result['error'] or ''}")
+        return
+
+    snapshot = get_system_snapshot()
+    if refresh:
+        snapshot.refresh()
+
+    for field in snapshot:
+        cached = field in snapshot.fields
+        value = snapshot.fields[field]['value'] if cached else '-'
+        if not cached:
+            state = 'not probed'
+        elif snapshot.is_fresh(field):
+            state = 'fresh'
+        else:
+            state = 'expired'
+        click.echo(f"{field:<20}{str(value):<40}{state}")
+
+
+@cli.command()
+@click.option('--idle-timeout', type=int, default=DAEMON_IDLE_TIMEOUT, show_default=True,
+              help="Exit after this many seconds without a request.")
+def serve(idle_timeout: int):
+    """
+    Run the Termax daemon for the shell plugins.
+    """
+    from termax.daemon.server import TermaxDaemon
+    TermaxDaemon(idle_timeout=idle_timeout).serve()
+
+
 @cli.command()
 @click.option('--clear', '-c', is_flag=True, help="Clear the memory.")
 def rag(clear: bool = False):
     """
     Show all the historical commands in the RAG.
     """
+    from rich.console import Console
+
     console = Console()
+    memory = load_memory()
     commands = memory.get()
 
     if clear:
@@ -261,3 +394,202 @@ def rag(clear: bool = False):
                 """)
     else:
         console.log("No commands found in the memory.")
+
+
+@cli.command()
+@click.option('--clear', '-c', is_flag=True, help="Clear the response cache.")
+def cache(clear: bool = False):
+    """
+    Show the response cache and the provider prompt cache statistics.
+    """
+    from rich.console import Console
+    from rich.table import Table
+    from termax.utils.response_cache import get_response_cache
+    from termax.utils.prompt_cache import read_prompt_cache_stats
+
+    console = Console()
+    response_cache = get_response_cache()
+    if clear:
+        response_cache.clear()
+        console.log("Response cache cleared successfully.")
+        return
+
+    stats = response_cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+    console.log(f"Cached commands: {stats['entries']}, hits: {stats['hits']}, misses: {stats['misses']}, "
+                f"hit rate: {hit_rate}")
+
+    prompt_stats = read_prompt_cache_stats()
+    if not prompt_stats:
+        return
+    table = Table(title="Provider prompt cache")
+    table.add_column("model")
+    for column in ("requests", "hits", "hit rate", "tokens in", "cached", "written"):
+        table.add_column(column, justify="right")
+    for model_key, entry in sorted(prompt_stats.items()):
+        table.add_row(model_key, str(entry['requests']), str(entry['hits']),
+                      f"{entry['hits'] / entry['requests']:.0%}" if entry['requests'] else "-",
+                      str(entry['input_tokens']), str(entry['cached_tokens']), str(entry['cache_write_tokens']))
+    console.print(table)
+
+
+@cli.command()
+@click.argument('source', default='-')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help="Write the results to a file, default is stdout.")
+@click.option('--concurrency', '-j', type=int, default=BATCH_CONCURRENCY, show_default=True,
+              help="The maximum number of requests translated at the same time.")
+@click.option('--ordered', is_flag=True, help="Write the results in the order of the requests.")
+@click.option('--no-cache', is_flag=True, help="Ask the model even if the command is cached.")
+def batch(source: str, output: str = None, concurrency: int = BATCH_CONCURRENCY, ordered: bool = False,
+          no_cache: bool = False):
+    """
+    Translate many requests, one per line of SOURCE (a file or - for stdin), as plain text or JSONL.
+    The results are written as JSONL: input, command, latency, tokens and cache hit.
+    """
+    from termax.cli.batch import batch as run
+
+    if not os.path.exists(CONFIG_PATH):
+        raise click.ClickException("Termax is not configured yet, please run `termax config`.")
+    try:
+        summary = run(source, output, concurrency, ordered, no_cache)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Translated {summary['requests']} requests: {summary['cache_hits']} from the cache, "
+               f"{summary['failures']} failed.", err=True)
+
+
+@cli.group()
+def profile():
+    """
+    Inspect the stage timings recorded with --profile or TERMAX_PROFILE.
+    """
+    pass
+
+
+@profile.command()
+@click.option('--command', '-c', 'command_name', type=click.Choice(['generate', 'guess', 'daemon']),
+              help="Only the runs of this command.")
+@click.option('--last', '-n', type=int, help="Only the last N runs.")
+def report(command_name: str = None, last: int = None):
+    """
+    Show the p50/p95/p99 of each stage over the recorded runs.
+    """
+    from rich.console import Console
+    from rich.table import Table
+    from termax.utils.profiler import read_history, aggregate
+
+    console = Console()
+    records = read_history(command=command_name, last=last)
+    if not records:
+        console.log("No profiled runs yet, run a command with --profile or set TERMAX_PROFILE.")
+        return
+
+    table = Table(title=f"Stage latency over {len(records)} runs (ms)")
+    table.add_column("stage")
+    table.add_column("runs", justify="right")
+    for column in ("p50", "p95", "p99"):
+        table.add_column(column, justify="right")
+    for name, stats in aggregate(records).items():
+        table.add_row(name, str(stats['runs']), *(f"{stats[column]:.1f}" for column in ("p50", "p95", "p99")))
+    console.print(table)
+
+
+@cli.command()
+@click.option('--by', type=click.Choice(['day', 'model', 'command']), default='day', show_default=True,
+              help="Group the requests by day, model or subcommand.")
+@click.option('--days', '-d', type=int, default=USAGE_SPEND_DAYS, show_default=True,
+              help="Only the requests of the last N days.")
+def usage(by: str = 'day', days: int = USAGE_SPEND_DAYS):
+    """
+    Show the tokens and the cost of the requests sent to the models.
+    """
+    from rich.console import Console
+    from rich.table import Table
+    from termax.pricing import read_ledger, summarize_usage
+
+    console = Console()
+    entries = read_ledger(days=days)
+    if not entries:
+        console.log(f"No requests in the last {days} days.")
+        return
+
+    table = Table(title=f"Usage over the last {days} days")
+    table.add_column(by)
+    for column in ("requests", "tokens in", "tokens out", "cached", "cost", "saved"):
+        table.add_column(column, justify="right")
+    unpriced = estimated = False
+    for name, group in summarize_usage(entries, by=by).items():
+        unpriced = unpriced or group['unpriced']
+        estimated = estimated or group['estimated'] > 0
+        table.add_row(name, str(group['requests']), str(group['input_tokens']), str(group['output_tokens']),
+                      str(group['cached_tokens']), f"${group['cost']:.4f}{'*' if group['unpriced'] else ''}",
+                      f"${group['saved']:.4f}")
+    console.print(table)
+    if unpriced:
+        console.log("* some models have no price, set them in ~/.termax/prices.json.", style="yellow")
+    if estimated:
+        console.log("The usage of the streams closed early is estimated.", style="cyan")
+
+
+@cli.command()
+@click.argument('names', nargs=-1)
+@click.option('--quick', is_flag=True, help="Run the smallest sizes only.")
+@click.option('--repeat', '-r', type=int, default=BENCH_REPEAT, show_default=True, help="The number of runs of each case.")
+@click.option('--baseline', '-b', type=click.Path(dir_okay=False), help="Compare with these results, "
+              "default is the saved baseline.")
+@click.option('--save-baseline', is_flag=True, help="Save the results as the baseline of the next runs.")
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help="Write the results to a file.")
+@click.option('--workdir', type=click.Path(file_okay=False), help="Keep the fixtures in this directory, "
+              "they are reused by the next runs.")
+@click.option('--json', 'as_json', is_flag=True, help="Print the results as JSON.")
+def bench(names, quick: bool = False, repeat: int = BENCH_REPEAT, baseline: str = None, save_baseline: bool = False,
+          output: str = None, workdir: str = None, as_json: bool = False):
+    """
+    Benchmark the hot paths on synthetic fixtures, and compare with a baseline.
+    """
+    import json
+    from termax.benchmarks import run_benchmarks, compare_results, load_results, save_results
+
+    def progress(key, result):
+        if not as_json:
+            click.echo(f"{key}: {result.get('error') or str(result['median_ms']) + ' ms'}", err=True)
+
+    try:
+        results = run_benchmarks(list(names) or None, quick=quick, repeat=repeat, workdir=workdir, on_result=progress)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    previous = load_results(baseline) if baseline else load_results()
+    if previous:
+        results['comparison'] = compare_results(results, previous)
+    if output:
+        save_results(results, output)
+    if save_baseline:
+        save_results(results)
+
+    comparison = results.get('comparison', {})
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        from rich.console import Console
+        from rich.table import Table
+
+        table = Table(title=f"Benchmarks ({'quick, ' if quick else ''}{repeat} runs)")
+        table.add_column("case")
+        for column in ("median", "min", "baseline", "change"):
+            table.add_column(column, justify="right")
+        styles = {'regression': 'red', 'improvement': 'green', 'error': 'red'}
+        for key, result in results['results'].items():
+            compared = comparison.get(key, {})
+            change = f"{compared['ratio'] - 1:+.0%}" if compared.get('ratio') is not None else compared.get('status', '-')
+            if 'error' in result:
+                table.add_row(key, result['error'], "", "", "error", style="red")
+                continue
+            table.add_row(key, f"{result['median_ms']:.2f} ms", f"{result['min_ms']:.2f} ms",
+                          f"{compared['baseline_ms']:.2f} ms" if compared.get('baseline_ms') else "-", change,
+                          style=styles.get(compared.get('status')))
+        Console().print(table)
+
+    if any(c['status'] == 'regression' for c in comparison.values()):
+        click.get_current_context().exit(1)
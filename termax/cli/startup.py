@@ -0,0 +1,113 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+import statistics
+
+from termax.utils.const import STARTUP_BUDGET, STARTUP_DEFAULT_BUDGET, STARTUP_HEAVY_MODULES
+
+# the probe runs `<subcommand> --help`: click resolves the command and parses its options without running it,
+# so the wall time is the cold start the shell plugins pay before any real work begins.
+_PROBE = """\
+import sys, json
+from termax.cli.cli import cli
+try:
+    cli(sys.argv[2:], standalone_mode=False)
+finally:
+    heavy = json.loads(sys.argv[1])
+    sys.stderr.write(json.dumps(sorted(m for m in heavy if m in sys.modules)))
+"""
+
+
+def _wall_time(args, runs):
+    """
+    _wall_time: the median wall time (ms) and the last result of running a command in a fresh process.
+    """
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def measure_interpreter(runs: int = 5):
+    """
+    measure_interpreter: measure the start of a bare interpreter, the baseline the budgets are counted from.
+    Args:
+        runs: the number of runs, the median is reported.
+    """
+    return round(_wall_time([sys.executable, '-c', 'pass'], runs)[0], 1)
+
+
+def measure_startup(subcommand: str, runs: int = 5, baseline: float = 0.0):
+    """
+    measure_startup: measure the cold start of a subcommand in fresh interpreters.
+    Args:
+        subcommand: the name of the subcommand, `generate` stands for the default command.
+        runs: the number of runs, the median is reported.
+        baseline: the start of a bare interpreter (ms), subtracted from the measurement.
+
+    Returns: a dictionary with the median startup (ms) and the heavy modules imported during the startup.
+    """
+    from termax.cli.cli import cli
+    name = cli.default_command if subcommand == 'generate' else subcommand
+
+    median, result = _wall_time(
+        [sys.executable, '-c', _PROBE, json.dumps(STARTUP_HEAVY_MODULES), name, '--help'], runs
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe of {subcommand} failed: {result.stderr}")
+
+    return {
+        'subcommand': subcommand,
+        'median_ms': round(median - baseline, 1),
+        'budget_ms': STARTUP_BUDGET.get(subcommand, STARTUP_DEFAULT_BUDGET),
+        'heavy_modules': json.loads(result.stderr.strip().splitlines()[-1])
+    }
+
+
+def subcommands():
+    """
+    subcommands: the names of the subcommands registered on the CLI, `generate` for the default command.
+    """
+    from termax.cli.cli import cli
+    return ['generate' if name == cli.default_command else name for name in cli.commands]
+
+
+def check_startup(runs: int = 5):
+    """
+    check_startup: measure every subcommand against its budget.
+    Args:
+        runs: the number of runs per subcommand.
+
+    Returns: a list of measurements, and whether all subcommands are within their budget.
+    """
+    baseline = measure_interpreter(runs)
+    results = [measure_startup(subcommand, runs, baseline) for subcommand in subcommands()]
+    within = all(r['median_ms'] <= r['budget_ms'] and not r['heavy_modules'] for r in results)
+    return results, within
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time of the Termax subcommands.")
+    parser.add_argument('--runs', type=int, default=5, help="number of runs per subcommand.")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON.")
+    args = parser.parse_args()
+
+    results, within = check_startup(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'subcommand':<12}{'median':>10}{'budget':>10}  heavy imports")
+        for r in results:
+            status = 'ok' if r['median_ms'] <= r['budget_ms'] else 'OVER'
+            print(f"{r['subcommand']:<12}{r['median_ms']:>8}ms{r['budget_ms']:>8}ms  "
+                  f"{', '.join(r['heavy_modules']) or '-'}  {status}")
+    sys.exit(0 if within else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,16 @@
 import os
 import platform
 import subprocess
-import pyperclip
 
-from termax.prompt import Memory
-from termax.agent import OpenAIModel, OllamaModel, GeminiModel, ClaudeModel, QianFanModel, MistralModel, QianWenModel
 from termax.utils import Config, qa_general, qa_platform
 from termax.utils.const import *
+from termax.utils.profiler import profiled, stage, first_token
+
+# NOTE: termax.prompt (the memory and the metadata) and the response cache are imported by the functions using
+# them, every subcommand imports this module.
+
+# the memory shared by the commands of a single CLI run, see load_memory().
+_memory = None
 
 
 def build_config(general: bool = False):
@@ -27,25 +31,38 @@ def build_config(general: bool = False):
             configuration.write_platform(platform_config, platform=platform_config['platform'])
 
 
-def load_model():
+# the blocking and the async model of each platform, the async one is None when the SDK has no async client.
+_MODEL_CLASSES = {
+    CONFIG_SEC_OPENAI: ('OpenAIModel', 'AsyncOpenAIModel'),
+    CONFIG_SEC_OLLAMA: ('OllamaModel', 'AsyncOllamaModel'),
+    CONFIG_SEC_GEMINI: ('GeminiModel', 'AsyncGeminiModel'),
+    CONFIG_SEC_CLAUDE: ('ClaudeModel', 'AsyncClaudeModel'),
+    CONFIG_SEC_QIANFAN: ('QianFanModel', 'AsyncQianFanModel'),
+    CONFIG_SEC_MISTRAL: ('MistralModel', 'AsyncMistralModel'),
+    CONFIG_SEC_QIANWEN: ('QianWenModel', None),
+}
+
+
+def model_arguments(plat: str, config_dict: dict):
     """
-    load_model: load the model based on the configuration.
+    model_arguments: the arguments of the model of a platform, from the configuration.
+    Args:
+        plat: the platform.
+        config_dict: the configuration.
     """
-    configuration = Config()
-    config_dict = configuration.read()
-    plat = config_dict['general']['platform']
-
     if plat == CONFIG_SEC_OPENAI:
-        model = OpenAIModel(
+        return dict(
             api_key=config_dict['openai'][CONFIG_SEC_API_KEY], version=config_dict['openai']['model'],
             temperature=float(config_dict['openai']['temperature']), base_url=config_dict['openai']['base_url']
         )
     elif plat == CONFIG_SEC_OLLAMA:
-        model = OllamaModel(
+        return dict(
             host_url=config_dict['ollama']['host_url'], version=config_dict['ollama']['model'],
+            keep_alive=config_dict['ollama'].get('keep_alive', OLLAMA_KEEP_ALIVE),
+            reuse_context=config_dict['ollama'].get('reuse_context') == "True"
         )
     elif plat == CONFIG_SEC_GEMINI:
-        model = GeminiModel(
+        return dict(
             api_key=config_dict['gemini'][CONFIG_SEC_API_KEY], version=config_dict['gemini']['model'],
             generation_config={
                 'stop_sequences': config_dict['gemini']['stop_sequences']
@@ -58,7 +75,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_CLAUDE:
-        model = ClaudeModel(
+        return dict(
             api_key=config_dict['claude'][CONFIG_SEC_API_KEY], version=config_dict['claude']['model'],
             generation_config={
                 'stop_sequences': config_dict['claude']['stop_sequences']
@@ -70,7 +87,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_QIANFAN:
-        model = QianFanModel(
+        return dict(
             api_key=config_dict['qianfan'][CONFIG_SEC_API_KEY], secret_key=config_dict['qianfan']['secret_key'],
             version=config_dict['qianfan']['model'],
             generation_config={
@@ -80,7 +97,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_MISTRAL:
-        model = MistralModel(
+        return dict(
             api_key=config_dict['mistral'][CONFIG_SEC_API_KEY], version=config_dict['mistral']['model'],
             generation_config={
                 'temperature': config_dict['mistral']['temperature'],
@@ -89,7 +106,7 @@ def load_model():
             }
         )
     elif plat == CONFIG_SEC_QIANWEN:
-        model = QianWenModel(
+        return dict(
             api_key=config_dict['qianwen'][CONFIG_SEC_API_KEY], version=config_dict['qianwen']['model'],
             generation_config={
                 'temperature': config_dict['qianwen']['temperature'],
@@ -100,12 +117,213 @@ def load_model():
                 'max_tokens': config_dict['qianwen']['max_tokens']
             }
         )
-    else:
+    raise ValueError(f"Platform {plat} not supported.")
+
+
+@profiled('model_load')
+def build_model(plat: str, config_dict: dict, asynchronous: bool = False):
+    """
+    build_model: build the model of a platform, only its backend (and SDK) is imported.
+    Args:
+        plat: the platform.
+        config_dict: the configuration.
+        asynchronous: build an AsyncModel, on the async client of the SDK if it has one,
+            on a thread pool running the blocking model otherwise.
+    """
+    import termax.agent
+    from termax.pricing import get_spend_cap
+    from termax.utils.ratelimit import get_rate_limiter
+
+    if plat not in _MODEL_CLASSES:
         raise ValueError(f"Platform {plat} not supported.")
+    blocking, native = _MODEL_CLASSES[plat]
+    arguments = model_arguments(plat, config_dict)
+    if asynchronous and native:
+        model = getattr(termax.agent, native)(**arguments)
+    else:
+        model = getattr(termax.agent, blocking)(**arguments)
+    # the requests of every process using the provider go through the same limiter.
+    model.rate_limiter = get_rate_limiter(plat, config_dict)
+    # the daily spend cap is checked before each request, see termax.pricing.SpendCap.
+    model.spend_cap = get_spend_cap(plat, config_dict)
+    if asynchronous and not native:
+        return termax.agent.ThreadedAsyncModel(model)
+    return model
+
+
+def load_model():
+    """
+    load_model: load the model based on the configuration.
+    Only the backend of the configured platform (and its SDK) is imported.
+    """
+    config_dict = Config().read()
+    plat = config_dict['general']['platform']
+    hedge = hedge_platforms(config_dict)
+    if hedge:
+        from termax.agent import BlockingModel
+        return BlockingModel(build_hedged_model(plat, hedge, config_dict)), plat
+    return build_model(plat, config_dict), plat
+
+
+def hedge_platforms(config_dict: dict):
+    """
+    hedge_platforms: the configured platforms to hedge the primary one with, `hedge` in the general section
+    is a comma separated list of platforms.
+    Args:
+        config_dict: the configuration.
+    """
+    plat = config_dict['general']['platform']
+    platforms = [p.strip().lower() for p in config_dict['general'].get('hedge', '').split(',')]
+    return [p for p in platforms if p and p != plat and p in config_dict]
+
+
+def build_hedged_model(plat: str, hedge: list, config_dict: dict):
+    """
+    build_hedged_model: the primary model hedged with the models of other platforms.
+    Args:
+        plat: the primary platform.
+        hedge: the platforms asked after the hedge delay, in order.
+        config_dict: the configuration, `hedge_delay` in the general section fixes the delay (seconds).
+    """
+    from termax.agent import HedgedModel
+
+    delay = config_dict['general'].get('hedge_delay')
+    return HedgedModel(
+        [build_model(p, config_dict, asynchronous=True) for p in [plat] + hedge],
+        delay=float(delay) if delay else None
+    )
+
+
+def load_async_model():
+    """
+    load_async_model: load the async model based on the configuration, for the asyncio callers.
+    """
+    config_dict = Config().read()
+    plat = config_dict['general']['platform']
+    hedge = hedge_platforms(config_dict)
+    if hedge:
+        return build_hedged_model(plat, hedge, config_dict), plat
+    return build_model(plat, config_dict, asynchronous=True), plat
+
+
+def load_memory():
+    """
+    load_memory: open the RAG memory on first use and share it for the rest of the run.
+    """
+    from termax.prompt import Memory
+
+    global _memory
+    if _memory is None:
+        _memory = Memory()
+    return _memory
+
+
+def load_prompt(memory=None):
+    """
+    load_prompt: build the prompt with the token budget and the tokenizer of the configured model.
+    Args:
+        memory: the memory instance, None for the prompts without RAG.
+    """
+    from termax.prompt import Prompt, get_prompt_budget, get_tokenizer
+
+    config_dict = Config().read()
+    plat = config_dict['general']['platform']
+    model_version = config_dict.get(plat, {}).get('model')
+    return Prompt(
+        memory, budget=get_prompt_budget(model_version, config_dict), tokenizer=get_tokenizer(plat, model_version)
+    )
 
-    return model, plat
 
+def response_key(text: str, config_dict: dict, cwd: str = None):
+    """
+    response_key: the key of a request in the response cache, for the configured model.
+    Args:
+        text: the natural language text.
+        config_dict: the configuration.
+        cwd: the working directory of the request, defaults to the current directory.
+    """
+    from termax.utils.response_cache import response_cache_key, context_fingerprint
+
+    plat = config_dict['general']['platform']
+    return response_cache_key(text, plat, config_dict.get(plat, {}).get('model'), context_fingerprint(cwd))
+
+
+def generate_command(model, prompt, text: str, platform: str, retries: int = 3, on_token=None,
+                     candidates: int = 1):
+    """
+    generate_command: generate the command from the LLM, retry if it is empty or calls termax itself.
+    The response is streamed and cut off as soon as the command is complete.
+    Args:
+        model: the LLM model.
+        prompt: the prompt instance.
+        text: the natural language text.
+        platform: the platform of the model.
+        retries: the maximum number of calls to the model.
+        on_token: called with each chunk of the response, e.g. to display the partial output.
+        candidates: above 1, request this many commands concurrently instead of retrying,
+            the first one passing the local checks is used, see termax.utils.candidates.score_command().
+
+    Returns: the command, '' if no usable command has been generated, None if the model failed.
+    """
+    if candidates > 1:
+        command_prompt = prompt.gen_commands(text, platform)
+        with stage('llm'):
+            command, _ = model.best_command(command_prompt, text, candidates)
+        return command
 
+    for _ in range(retries):
+        command_prompt = prompt.gen_commands(text, platform)
+        with stage('llm'):
+            command = model.stream_command(command_prompt, text, first_token('llm_ttfb', on_token))
+        if command is None:
+            return None
+        elif command != '':
+            if not command.startswith('t ') and not command.startswith('termax '):
+                return command
+            text = text + ", do not use command t or termax."
+    return ''
+
+
+async def agenerate_command(model, prompt, text: str, platform: str, retries: int = 3, candidates: int = 1):
+    """
+    agenerate_command: generate the command from an async model, see generate_command().
+    Args:
+        model: the async LLM model.
+        prompt: the prompt instance.
+        text: the natural language text.
+        platform: the platform of the model.
+        retries: the maximum number of calls to the model.
+        candidates: above 1, request this many commands concurrently instead of retrying.
+
+    Returns: the command, '' if no usable command has been generated, None if the model failed.
+    """
+    if candidates > 1:
+        command, _ = await model.best_command(prompt.gen_commands(text, platform), text, candidates)
+        return command
+
+    for _ in range(retries):
+        command = await model.stream_command(prompt.gen_commands(text, platform), text)
+        if command is None:
+            return None
+        elif command != '':
+            if not command.startswith('t ') and not command.startswith('termax '):
+                return command
+            text = text + ", do not use command t or termax."
+    return ''
+
+
+def partial_output(text: str, width: int = 60):
+    """
+    partial_output: the tail of a partial response on a single line, for a live display.
+    Args:
+        text: the response so far.
+        width: the maximum number of characters.
+    """
+    line = " ".join(text.split())
+    return line if len(line) <= width else "..." + line[-(width - 3):]
+
+
+@profiled('execution')
 def execute_command(command: str) -> bool:
     """
     Execute a command and return whether it was successful.
@@ -136,7 +354,7 @@ def execute_command(command: str) -> bool:
         return False
 
 
-def save_command(command: str, text: str, config_dict: dict, memory: Memory):
+def save_command(command: str, text: str, config_dict: dict, memory):
     """
     save_command: save the command into database.
     Args:
@@ -145,17 +363,18 @@ def save_command(command: str, text: str, config_dict: dict, memory: Memory):
         config_dict: config dictionary
         memory: vector database in memory
     """
-    # add the query to the memory, eviction with the default max size of 2000.
-    if config_dict.get(CONFIG_SEC_GENERAL).get('storage_size') is None:
-        storage_size = 2000
-    else:
-        storage_size = int(config_dict[CONFIG_SEC_GENERAL]['storage_size'])
-
-    if memory.count() > storage_size:
-        memory.delete()
+    storage_size = int(config_dict.get(CONFIG_SEC_GENERAL).get('storage_size') or MEMORY_STORAGE_SIZE)
 
     if command != '':
-        memory.add_query(queries=[{"query": text, "response": command}])
+        # only the commands executed successfully are saved, they can be reused by the semantic cache.
+        memory.add_query(queries=[{"query": text, "response": command, "executed": True}])
+
+    # past the high-water mark, the least valuable records are evicted in one batch down to the low-water mark,
+    # instead of dropping the whole history. The eviction writes the pending uses of the records, see Memory.touch().
+    if memory.count() > storage_size:
+        memory.evict(int(storage_size * MEMORY_LOW_WATER))
+    else:
+        memory.flush_touches()
 
 
 def filter_and_format_history(command_history, filter_condition, max_count):
@@ -172,6 +391,8 @@ def copy_command(command: str):
     Args:
         command: the command to copy.
     """
+    import pyperclip
+
     try:
         pyperclip.copy(command)
         return True
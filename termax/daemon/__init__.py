@@ -0,0 +1 @@
+from .client import *
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import socket
+import argparse
+import subprocess
+from pathlib import Path
+
+# NOTE: the client is what the shell plugins start on every keystroke, it must only import the standard library.
+# The paths are duplicated from termax.utils on purpose, importing that package pulls in the metadata helpers.
+DAEMON_HOME = os.path.join(str(Path.home()), ".termax")
+DAEMON_SOCKET_PATH = os.environ.get("TERMAX_SOCKET", os.path.join(DAEMON_HOME, "termax.sock"))
+DAEMON_LOG_PATH = os.path.join(DAEMON_HOME, "daemon.log")
+DAEMON_CONNECT_TIMEOUT = 0.2
+DAEMON_REQUEST_TIMEOUT = 120
+
+
+class DaemonUnavailable(Exception):
+    """
+    DaemonUnavailable: raised when there is no daemon listening on the socket.
+    """
+
+
+def send_request(request: dict, socket_path: str = DAEMON_SOCKET_PATH, timeout: float = DAEMON_REQUEST_TIMEOUT,
+                 on_partial=None):
+    """
+    send_request: send a request to the daemon and wait for its response.
+    Args:
+        request: the request, see termax.daemon.server.TermaxDaemon.handle for the supported actions.
+        socket_path: the path of the daemon socket.
+        timeout: the maximum time to wait for the response.
+        on_partial: called with the partial output sent before the response of a streamed request.
+
+    Returns: the response of the daemon.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(DAEMON_CONNECT_TIMEOUT)
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError, socket.timeout) as e:
+            raise DaemonUnavailable(str(e))
+
+        # one JSON document per line in both directions.
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            while True:
+                line = reader.readline()
+                if not line:
+                    raise DaemonUnavailable("the daemon closed the connection")
+                response = json.loads(line)
+                if 'partial' not in response:
+                    return response
+                if on_partial:
+                    on_partial(response['partial'])
+    finally:
+        sock.close()
+
+
+def start_daemon():
+    """
+    start_daemon: start the daemon in the background, detached from the current shell.
+    """
+    Path(DAEMON_HOME).mkdir(parents=True, exist_ok=True)
+    with open(DAEMON_LOG_PATH, 'a') as log:
+        subprocess.Popen(
+            [sys.executable, '-m', 'termax.daemon.server'],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True, close_fds=True
+        )
+
+
+def run_in_process(text: str, explain: bool = False, no_cache: bool = False):
+    """
+    run_in_process: the fallback when the daemon is not available, run the CLI in this process.
+    Args:
+        text: the natural language text, or the command to explain.
+        explain: explain the command instead of generating one.
+        no_cache: bypass the response cache.
+    """
+    from termax.cli.cli import cli
+    if explain:
+        from termax.cli.utils import load_model
+        from termax.prompt import Prompt
+        model, _ = load_model()
+        print(model.to_description(Prompt(None).explain_commands(), text))
+        return
+    cli([cli.default_command, '-p'] + (['--no-cache'] if no_cache else []) + ['--', text])
+
+
+def warm_up(no_daemon: bool = False):
+    """
+    warm_up: get the daemon and the model ready before the first request.
+    The daemon loads the model when it starts, so starting it is enough; when the daemon is disabled the model is
+    warmed up in this process, which only helps the backends keeping the model loaded on their side (Ollama).
+    Args:
+        no_daemon: do not start the daemon if it is not running.
+    """
+    try:
+        send_request({'action': 'warm_up', 'cwd': os.getcwd()})
+    except DaemonUnavailable:
+        if not no_daemon and not os.environ.get('TERMAX_NO_DAEMON'):
+            start_daemon()
+            return
+        from termax.cli.utils import load_model
+        model, _ = load_model()
+        model.warm_up()
+
+
+def partial_writer(path: str, width: int = 60):
+    """
+    partial_writer: write the tail of the partial output to a file, on a single line.
+    The shell plugins show the file next to their spinner while the command is generated.
+    Args:
+        path: the path of the file.
+        width: the maximum number of characters.
+    """
+    received = []
+
+    def on_partial(token):
+        received.append(token)
+        line = " ".join("".join(received).split())
+        line = line if len(line) <= width else "..." + line[-(width - 3):]
+        try:
+            with open(path, 'w') as f:
+                f.write(line)
+        except OSError:
+            pass
+
+    return on_partial
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='termax-client', description="Ask the termax daemon for a command.")
+    parser.add_argument('text', nargs='*', help="the natural language text, or the command to explain.")
+    parser.add_argument('--explain', '-e', action='store_true', help="explain the command instead.")
+    parser.add_argument('--no-daemon', action='store_true', help="do not start the daemon if it is not running.")
+    parser.add_argument('--partial', metavar='FILE', help="keep the partial output in this file while generating.")
+    parser.add_argument('--no-cache', action='store_true', help="ask the model even if the command is cached.")
+    parser.add_argument('--warm-up', action='store_true', help="start the daemon and load the model, then exit.")
+    args = parser.parse_args()
+
+    if args.warm_up:
+        warm_up(no_daemon=args.no_daemon)
+        return
+    if not args.text:
+        parser.error("the text is required")
+
+    text = " ".join(args.text)
+    request = {
+        'action': 'explain' if args.explain else 'generate',
+        'text': text,
+        'cwd': os.getcwd(),
+        'stream': bool(args.partial),
+        'no_cache': args.no_cache,
+    }
+    try:
+        response = send_request(request, on_partial=partial_writer(args.partial) if args.partial else None)
+    except DaemonUnavailable:
+        # socket-activation-style: bring the daemon up for the next request, and answer this one in process.
+        if not args.no_daemon and not os.environ.get('TERMAX_NO_DAEMON'):
+            start_daemon()
+        run_in_process(text, explain=args.explain, no_cache=args.no_cache)
+        return
+
+    if response.get('error'):
+        sys.stderr.write(f"termax: {response['error']}\n")
+        sys.exit(1)
+    print(response['result'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import signal
+import argparse
+import socketserver
+
+from termax.utils.const import *
+from termax.utils import Config, CONFIG_PATH
+from termax.utils.response_cache import get_response_cache
+from termax.utils.profiler import start_profiler, finish_profiler
+from termax.pricing import set_usage_command
+from termax.cli.utils import load_model, load_memory, load_prompt, generate_command, response_key
+from .client import DAEMON_SOCKET_PATH, DaemonUnavailable, send_request
+
+
+class TermaxDaemon:
+    def __init__(self, socket_path: str = DAEMON_SOCKET_PATH, idle_timeout: int = DAEMON_IDLE_TIMEOUT):
+        """
+        Resident Termax: keeps the model client, the memory and the metadata warm for the shell plugins.
+        Args:
+            socket_path: the path of the Unix socket to listen on.
+            idle_timeout: the daemon exits after this many seconds without a request.
+        """
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.running = False
+
+        self.config_mtime = None
+        self.config_dict = None
+        self.model = None
+        self.platform = None
+        self.prompt = None
+
+    def warm_up(self):
+        """
+        warm_up: load the model and the prompt, reload them when the configuration file has changed.
+        """
+        if not os.path.exists(CONFIG_PATH):
+            raise RuntimeError("Termax is not configured yet, please run `termax config`.")
+
+        mtime = os.path.getmtime(CONFIG_PATH)
+        if mtime != self.config_mtime:
+            self.config_dict = Config().read()
+            self.model, self.platform = load_model()
+            self.prompt = load_prompt(load_memory())
+            self.config_mtime = mtime
+
+    def handle(self, request: dict, emit=None):
+        """
+        handle: answer a single request.
+        Args:
+            request: the request, with the keys:
+                action: one of `generate`, `explain`, `warm_up`, `ping` and `shutdown`.
+                text: the natural language text to generate from, or the command to explain.
+                cwd: the working directory of the caller.
+                stream: send the partial output of `generate` before the response.
+                no_cache: bypass the response cache and the semantic cache.
+            emit: called with the partial frames, `{"partial": text}`, of a streamed request.
+
+        Returns: the response, with either a `result` or an `error`, and the seconds a generated command spent
+            queued behind the rate limit.
+        """
+        action = request.get('action')
+        if action == 'ping':
+            return {'result': os.getpid()}
+        elif action == 'shutdown':
+            self.running = False
+            return {'result': 'shutting down'}
+
+        self.warm_up()
+        if action == 'warm_up':
+            # e.g. load the local model in memory, the shell plugins ask for it when they are loaded.
+            return {'result': self.model.warm_up()}
+
+        # the requests are served one at a time, so following the caller's directory is safe.
+        cwd = request.get('cwd')
+        if cwd and os.path.isdir(cwd):
+            os.chdir(cwd)
+            self.prompt.path_metadata['current_directory'] = cwd
+
+        if action == 'generate':
+            cache = None if request.get('no_cache') else get_response_cache()
+            cache_key = response_key(request['text'], self.config_dict, cwd)
+            command = cache.get(cache_key) if cache else None
+            if command is not None:
+                return {'result': command}
+
+            general = self.config_dict.get(CONFIG_SEC_GENERAL, {})
+            if not request.get('no_cache') and general.get('semantic_cache') == "True":
+                threshold = float(general.get('semantic_threshold', SEMANTIC_CACHE_THRESHOLD))
+                match = self.prompt.match_memory(request['text'], threshold)
+                if match:
+                    return {'result': match['command']}
+
+            on_token = (lambda token: emit({'partial': token})) if emit and request.get('stream') else None
+            command = generate_command(self.model, self.prompt, request['text'], self.platform, on_token=on_token,
+                                       candidates=int(general.get('candidates', 1)))
+            if not command:
+                return {'error': "Unable to generate the command, please try again."}
+            # the command goes to the shell buffer unconfirmed, it is not cached, see ResponseCache.put().
+            return {'result': command, 'queued': self.model.last_queued}
+        elif action == 'explain':
+            return {'result': self.model.to_description(self.prompt.explain_commands(), request['text'])}
+        return {'error': f"Unknown action: {action}"}
+
+    def serve(self):
+        """
+        serve: listen on the socket until the daemon has been idle for `idle_timeout` seconds.
+        """
+        if os.path.exists(self.socket_path):
+            try:
+                send_request({'action': 'ping'}, self.socket_path, timeout=1)
+                print(f"Termax daemon is already running on {self.socket_path}.")
+                return
+            except DaemonUnavailable:
+                # a stale socket left by a daemon that did not exit cleanly.
+                os.unlink(self.socket_path)
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    return
+
+                def emit(frame):
+                    self.wfile.write(json.dumps(frame).encode('utf-8') + b'\n')
+                    self.wfile.flush()
+
+                request = json.loads(line)
+                # with TERMAX_PROFILE set in its environment, the daemon records the stages of each request.
+                profiling = request.get('action') in ('generate', 'explain') and start_profiler('daemon')
+                try:
+                    response = daemon.handle(request, emit)
+                except Exception as e:
+                    response = {'error': str(e)}
+                finally:
+                    if profiling:
+                        finish_profiler(show=False)
+                self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+        # the socket is only accessible by the current user.
+        umask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(self.socket_path, Handler)
+        except OSError as e:
+            # another daemon won the race to bind the socket.
+            print(f"Unable to listen on {self.socket_path}: {e}")
+            return
+        finally:
+            os.umask(umask)
+
+        # the requests of the plugins are accounted to the daemon in the usage ledger.
+        set_usage_command('daemon')
+        server.timeout = self.idle_timeout
+        server.handle_timeout = self.stop
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        try:
+            try:
+                self.warm_up()
+                self.model.warm_up(background=True)
+            except Exception as e:
+                print(f"Failed to warm up the daemon: {e}")
+
+            self.running = True
+            while self.running:
+                server.handle_request()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def stop(self):
+        """
+        stop: stop serving after the current request.
+        """
+        self.running = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Termax daemon.")
+    parser.add_argument('--idle-timeout', type=int, default=DAEMON_IDLE_TIMEOUT,
+                        help="exit after this many seconds without a request.")
+    args = parser.parse_args()
+    TermaxDaemon(idle_timeout=args.idle_timeout).serve()
+
+
+if __name__ == '__main__':
+    main()
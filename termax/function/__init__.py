@@ -1 +1,16 @@
+import importlib
+
 from .base import *
+
+# the function classes import instructor and pydantic, they are resolved on first access.
+_FUNCTIONS = {
+    'MacFunction': '.openai',
+    'ShellFunction': '.openai',
+    'WinFunction': '.openai',
+}
+
+
+def __getattr__(name):
+    if name in _FUNCTIONS:
+        return getattr(importlib.import_module(_FUNCTIONS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,174 @@
-from .openai import MacFunction, ShellFunction, WinFunction
-
+import os
 import sys
+import json
+import importlib
+from typing import Dict, List, Optional
+
+import termax
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+# the built-in functions, `module:class` and the platforms they are offered on (None for all of them).
+BUILTIN_FUNCTIONS = [
+    ('termax.function.openai.macos:MacFunction', ('linux', 'darwin')),
+    ('termax.function.openai.win:WinFunction', ('win32',)),
+    ('termax.function.openai.shell:ShellFunction', None),
+]
+
+
+def _entry_points(group: str):
+    """
+    _entry_points: the entry points of a group, across the importlib.metadata APIs of Python 3.8 to 3.12.
+    """
+    from importlib import metadata
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+    return list(entry_points.get(group, []))
+
+
+def discover_functions(platform: str = sys.platform):
+    """
+    discover_functions: the functions offered to the models, the built-in ones of the platform followed by the
+    ones other packages register in the `termax.functions` entry point group, e.g.
+        entry_points={"termax.functions": ["get_weather = my_package.functions:WeatherFunction"]}
+    Args:
+        platform: the platform, as in sys.platform.
+
+    Returns: a list of (`module:class`, version) tuples, the version of the package providing the function.
+    """
+    functions = [(target, termax.__version__) for target, platforms in BUILTIN_FUNCTIONS
+                 if platforms is None or platform.startswith(platforms)]
+    for entry_point in _entry_points(FUNCTION_ENTRY_POINT_GROUP):
+        dist = getattr(entry_point, 'dist', None)
+        functions.append((entry_point.value, getattr(dist, 'version', '') or ''))
+    return functions
+
+
+def _load_class(target: str):
+    module, _, name = target.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+class FunctionRegistry:
+    def __init__(self, cache_path: str = os.path.join(CONFIG_HOME, FUNCTION_SCHEMA_CACHE_FILE),
+                 platform: str = sys.platform):
+        """
+        FunctionRegistry: the functions the models can call, by name.
+        The JSON schemas are computed once and cached on disk, keyed by the versions of the packages providing
+        the functions, so the function classes (and instructor/pydantic) are only imported to run a call.
+        Args:
+            cache_path: the path of the schema cache.
+            platform: the platform, as in sys.platform.
+        """
+        self.cache_path = cache_path
+        self.functions = discover_functions(platform)
+        self.key = [f"{target}=={version}" for target, version in self.functions]
+
+        self._schemas: Optional[List[dict]] = None
+        self._targets: Dict[str, str] = {}
+        self._classes: Dict[str, type] = {}
+
+    def load(self):
+        """
+        load: load the schemas from the cache, or build them when the functions changed.
+        """
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get('key') == self.key:
+                self._schemas = [entry['schema'] for entry in cache['functions']]
+                self._targets = {entry['schema']['name']: entry['target'] for entry in cache['functions']}
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self.build()
+
+    def build(self):
+        """
+        build: import the functions and compute their schemas, a function failing to import is left out
+        (and the cache is not written, so it is retried by the next process).
+        """
+        entries, complete = [], True
+        for target, _ in self.functions:
+            try:
+                cls = _load_class(target)
+                schema = cls.openai_schema
+            except Exception as e:
+                print(f"Unable to load the function {target}: {e}")
+                complete = False
+                continue
+            self._classes[schema['name']] = cls
+            entries.append({'target': target, 'schema': schema})
+
+        self._schemas = [entry['schema'] for entry in entries]
+        self._targets = {entry['schema']['name']: entry['target'] for entry in entries}
+        if complete:
+            try:
+                atomic_write_json(self.cache_path, {'key': self.key, 'functions': entries})
+            except OSError:
+                pass
+
+    def schemas(self):
+        """
+        schemas: the schemas of the functions, in the format of the `functions` parameter of OpenAI.
+        """
+        if self._schemas is None:
+            self.load()
+        return self._schemas
+
+    def names(self):
+        """
+        names: the names of the functions.
+        """
+        return [schema['name'] for schema in self.schemas()]
+
+    def get(self, name: str):
+        """
+        get: the class of a function, imported on first use.
+        Args:
+            name: the name of the function, as in its schema.
+
+        Returns: the class, None for an unknown function.
+        """
+        if name not in self._classes:
+            self.schemas()
+            if name not in self._targets:
+                return None
+            self._classes[name] = _load_class(self._targets[name])
+        return self._classes[name]
+
+    def execute(self, name: str, arguments):
+        """
+        execute: validate the arguments of a function call and run it.
+        Args:
+            name: the name of the function.
+            arguments: the arguments, as the JSON string sent by the model or a dictionary.
+
+        Returns: the result of the function, None for an unknown function.
+        """
+        cls = self.get(name)
+        if cls is None:
+            return None
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments or '{}')
+        validated = cls.model_validate(arguments)
+        return cls.execute(**validated.model_dump())
+
+
+# the registry shared by the models of the process, see get_function_registry().
+_registry = None
+
+
+def get_function_registry():
+    """
+    get_function_registry: the function registry shared by the current process.
+    """
+    global _registry
+    if _registry is None:
+        _registry = FunctionRegistry()
+    return _registry
 
 
 def get_all_function_schemas():
@@ -8,9 +176,7 @@ def get_all_function_schemas():
     Get all function schemas.
     :return: a list of function schemas.
     """
-    if sys.platform.startswith('linux') or sys.platform == 'darwin':
-        return [MacFunction.openai_schema, ShellFunction.openai_schema]
-    return [WinFunction.openai_schema, ShellFunction.openai_schema]
+    return get_function_registry().schemas()
 
 
 def get_all_functions():
@@ -18,6 +184,5 @@ def get_all_functions():
     Get all functions.
     :return: a list of functions.
     """
-    if sys.platform.startswith('linux') or sys.platform == 'darwin':
-        return [MacFunction, ShellFunction]  # TODO: load all modules dynamically
-    return [WinFunction, ShellFunction]
+    registry = get_function_registry()
+    return [registry.get(name) for name in registry.names()]
@@ -4,12 +4,14 @@ _termax_bash() {
     if [[ -n "$READLINE_LINE" ]]; then
         set +m
         local _termax_prev_line="$READLINE_LINE"
-        { spin 5 & } 2>/dev/null
+        local _termax_partial=$(mktemp)
+        { spin "$_termax_partial" & } 2>/dev/null
         SPIN_PID=$!
 
-        READLINE_LINE=$(t termax -p "$_termax_prev_line")
+        READLINE_LINE=$(termax-client --partial "$_termax_partial" "$_termax_prev_line")
         kill "$SPIN_PID"
-        printf "\r%s" "                 "
+        rm -f "$_termax_partial"
+        printf "\r\033[K"
         echo " "
         READLINE_POINT=${#READLINE_LINE}
     fi
@@ -19,10 +21,12 @@ spin() {
     local i=0
 
     while true; do
-        printf "\r%s" "${marks[i++ % ${#marks[@]}]}"
+        printf "\r\033[K%s %s" "${marks[i++ % ${#marks[@]}]}" "$(cat "$1" 2>/dev/null)"
         sleep 0.3
     done
 }
 bind -x '"\\C-k": _termax_bash'
+# Start the daemon and load the model in the background, the first request does not wait for them
+(termax-client --warm-up >/dev/null 2>&1 &)
 # ====== Termax Bash Plugin End ======
 """
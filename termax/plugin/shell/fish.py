@@ -3,14 +3,15 @@ fish_function = """
 function termax_fish
     set -l _buffer (commandline)
     if test -n "$_buffer"
-        t termax -p "$_buffer" > /tmp/termax_output.txt &
+        set -l _partial (mktemp)
+        termax-client --partial $_partial "$_buffer" > /tmp/termax_output.txt &
         set -l job_id $last_pid
         while kill -0 $job_id 2>/dev/null
-            commandline -a "."
-            sleep 1
+            commandline -r -- "Generating... "(cat $_partial 2>/dev/null)
+            sleep 0.3
         end
         set -l BUFFER (cat /tmp/termax_output.txt)
-        rm /tmp/termax_output.txt
+        rm /tmp/termax_output.txt $_partial
         commandline $BUFFER
         # commandline -f end-of-line
     end
@@ -21,5 +22,7 @@ end
 fish_plugin = """
 # ====== Termax Fish Plugin ======
 bind \ck 'termax_fish'
+# Start the daemon and load the model in the background, the first request does not wait for them
+termax-client --warm-up >/dev/null 2>&1 &; disown
 # ====== Termax Fish Plugin End ======
 """
@@ -3,16 +3,18 @@ zsh_plugin = """
 _termax_zsh() {
     if [[ -n "$BUFFER" ]]; then
         local _termax_prev_cmd=$BUFFER
-        local pid spinner i tmpfile
+        local pid spinner i tmpfile partial
         BUFFER=""
         zle reset-prompt
 
         # Create a temporary file for output
         tmpfile=$(mktemp)
+        # The partial output, shown next to the spinner while generating
+        partial=$(mktemp)
 
         # Start termax in the background and redirect its output to the temporary file
         set +m
-        t termax -p "$_termax_prev_cmd" > "$tmpfile" &
+        termax-client --partial "$partial" "$_termax_prev_cmd" > "$tmpfile" &
         pid=$!
 
         # Spinner
@@ -20,7 +22,7 @@ _termax_zsh() {
         i=0
         # Display spinner until the process has finished
         while kill -0 $pid 2>/dev/null; do
-            BUFFER="${spinner[i++ % ${#spinner[@]}]}"
+            BUFFER="${spinner[i++ % ${#spinner[@]}]} $(<"$partial")"
             zle reset-prompt
             zle end-of-line
             sleep 0.3
@@ -31,12 +33,14 @@ _termax_zsh() {
 
         # Read the result from the temporary file and clean up
         BUFFER=$(<"$tmpfile")
-        rm "$tmpfile"
+        rm "$tmpfile" "$partial"
 
         zle end-of-line
     fi
 }
 zle -N _termax_zsh
 bindkey '^k' _termax_zsh
+# Start the daemon and load the model in the background, the first request does not wait for them
+(termax-client --warm-up >/dev/null 2>&1 &!)
 # ===== Termax ZSH Plugin End =====
 """
@@ -0,0 +1,2 @@
+from .prices import *
+from .ledger import *
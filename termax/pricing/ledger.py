@@ -0,0 +1,202 @@
+import os
+import json
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+from .prices import request_cost
+
+# the subcommand the requests of this process are accounted to, see set_usage_command().
+_command = None
+
+
+class SpendCapExceeded(Exception):
+    """
+    SpendCapExceeded: raised instead of sending a request once the daily spend cap is reached.
+    """
+
+
+def set_usage_command(command: Optional[str]):
+    """
+    set_usage_command: the subcommand of the following requests, e.g. generate, guess, batch or daemon.
+    """
+    global _command
+    _command = command
+
+
+def read_spend(spend_path: str = os.path.join(CONFIG_HOME, USAGE_SPEND_FILE)):
+    """
+    read_spend: the spend (USD) of the last days, keyed by ISO date.
+    """
+    try:
+        with open(spend_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def spent_today(spend_path: str = os.path.join(CONFIG_HOME, USAGE_SPEND_FILE)):
+    """
+    spent_today: the spend (USD) of the current day.
+    """
+    return read_spend(spend_path).get(date.today().isoformat(), 0.0)
+
+
+def record_request(model_key: str, usage: dict, command: Optional[str] = None, estimated: bool = False,
+                   ledger_path: str = os.path.join(CONFIG_HOME, USAGE_LEDGER_FILE),
+                   spend_path: str = os.path.join(CONFIG_HOME, USAGE_SPEND_FILE)):
+    """
+    record_request: append a request to the usage ledger and add its cost to the spend of the day.
+    A ledger line is a short JSON object, written with a single append so concurrent processes do not
+    interleave. The daily spend is best effort, like the prompt cache counters.
+    Args:
+        model_key: the model, `platform/model`.
+        usage: the token usage, see Model.record_usage().
+        command: the subcommand, default is the one set by set_usage_command().
+        estimated: the provider did not report the usage (e.g. a stream closed early), it was estimated.
+        ledger_path: the path of the ledger.
+        spend_path: the path of the daily spend.
+
+    Returns: the ledger entry.
+    """
+    cost, saved = request_cost(model_key, usage['input_tokens'], usage['output_tokens'], usage['cached_tokens'],
+                               usage['cache_write_tokens'])
+    entry = {
+        'ts': int(time.time()), 'cmd': command or _command, 'model': model_key,
+        'in': usage['input_tokens'], 'out': usage['output_tokens'],
+        'cached': usage['cached_tokens'], 'write': usage['cache_write_tokens'],
+        'cost': round(cost, 8) if cost is not None else None,
+        'saved': round(saved, 8) if saved is not None else None,
+    }
+    if estimated:
+        entry['est'] = 1
+
+    try:
+        os.makedirs(os.path.dirname(ledger_path), exist_ok=True)
+        with open(ledger_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+
+        if cost:
+            spend = read_spend(spend_path)
+            today = date.today().isoformat()
+            spend[today] = spend.get(today, 0.0) + cost
+            # only the last days are kept, the ledger holds the history.
+            spend = dict(sorted(spend.items())[-USAGE_SPEND_DAYS:])
+            atomic_write_json(spend_path, spend)
+    except OSError:
+        pass
+    return entry
+
+
+def read_ledger(ledger_path: str = os.path.join(CONFIG_HOME, USAGE_LEDGER_FILE), days: Optional[int] = None):
+    """
+    read_ledger: the entries of the usage ledger.
+    Args:
+        ledger_path: the path of the ledger.
+        days: only the entries of the last days, today included.
+    """
+    since = 0
+    if days:
+        # from the start of the first day.
+        first_day = date.today() - timedelta(days=days - 1)
+        since = datetime.combine(first_day, datetime.min.time()).timestamp()
+    entries = []
+    try:
+        with open(ledger_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('ts', 0) >= since:
+                    entries.append(entry)
+    except OSError:
+        pass
+    return entries
+
+
+def summarize_usage(entries, by: str = 'day'):
+    """
+    summarize_usage: the totals of the ledger entries, grouped by day, model or subcommand.
+    Args:
+        entries: the ledger entries, see read_ledger().
+        by: one of `day`, `model` and `command`.
+
+    Returns: a dictionary of group to its requests, tokens in/out, cached tokens, cost and savings (USD),
+        and whether the cost misses unknown models.
+    """
+    groups = {}
+    for entry in entries:
+        if by == 'day':
+            key = date.fromtimestamp(entry['ts']).isoformat()
+        elif by == 'model':
+            key = entry['model']
+        else:
+            key = entry.get('cmd') or '-'
+        group = groups.setdefault(key, {
+            'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0, 'cost': 0.0, 'saved': 0.0,
+            'unpriced': False, 'estimated': 0
+        })
+        group['requests'] += 1
+        group['input_tokens'] += entry.get('in', 0)
+        group['output_tokens'] += entry.get('out', 0)
+        group['cached_tokens'] += entry.get('cached', 0)
+        group['estimated'] += entry.get('est', 0)
+        if entry.get('cost') is None:
+            group['unpriced'] = True
+        else:
+            group['cost'] += entry['cost']
+            group['saved'] += entry.get('saved') or 0.0
+    return dict(sorted(groups.items()))
+
+
+class SpendCap:
+    def __init__(self, limit: float, action: str = 'refuse', fallback_model: Optional[str] = None):
+        """
+        SpendCap: the daily spend cap of the paid requests.
+        Args:
+            limit: the cap in USD per day.
+            action: `refuse` to refuse the requests once the cap is reached, `downgrade` to send them to the
+                fallback model of the same provider instead.
+            fallback_model: the cheaper model of the downgraded requests.
+        """
+        self.limit = limit
+        self.action = action
+        self.fallback_model = fallback_model
+
+    def check(self, version: Optional[str] = None):
+        """
+        check: whether a request can be sent.
+        Args:
+            version: the model of the request, None when the backend cannot switch models.
+
+        Returns: None to send the request as is, the fallback model to downgrade it to.
+        """
+        spent = spent_today()
+        if spent < self.limit:
+            return None
+        if self.action == 'downgrade' and self.fallback_model and version is not None:
+            return self.fallback_model
+        raise SpendCapExceeded(f"The daily spend cap of ${self.limit:.2f} is reached (${spent:.2f} spent today).")
+
+
+def get_spend_cap(plat: str, config_dict: dict):
+    """
+    get_spend_cap: the spend cap of a platform, from `daily_spend_cap` and `spend_cap_action` in the general
+    section and `budget_model` in the platform section.
+    Args:
+        plat: the platform.
+        config_dict: the configuration.
+
+    Returns: the cap, None if no cap is set.
+    """
+    general = config_dict.get(CONFIG_SEC_GENERAL, {})
+    limit = general.get('daily_spend_cap')
+    if not limit or limit == 'None':
+        return None
+    action = general.get('spend_cap_action', 'refuse')
+    return SpendCap(float(limit), action if action in SPEND_CAP_ACTIONS else 'refuse',
+                    config_dict.get(plat, {}).get('budget_model'))
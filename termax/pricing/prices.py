@@ -0,0 +1,92 @@
+import os
+import json
+from typing import Optional
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+
+# USD per million tokens: input, output, cached input (read from the provider prompt cache), cache write.
+# The models are matched by the longest prefix of `platform/model`, the local models are free.
+PRICES = {
+    'openai/gpt-4o-mini': (0.15, 0.6, 0.075, 0.15),
+    'openai/gpt-4o': (2.5, 10.0, 1.25, 2.5),
+    'openai/gpt-4-turbo': (10.0, 30.0, 10.0, 10.0),
+    'openai/gpt-4': (30.0, 60.0, 30.0, 30.0),
+    'openai/gpt-3.5-turbo': (0.5, 1.5, 0.5, 0.5),
+    'openai/o1-mini': (3.0, 12.0, 1.5, 3.0),
+    'openai/o1': (15.0, 60.0, 7.5, 15.0),
+    'claude/claude-3-5-sonnet': (3.0, 15.0, 0.3, 3.75),
+    'claude/claude-3-5-haiku': (0.8, 4.0, 0.08, 1.0),
+    'claude/claude-3-opus': (15.0, 75.0, 1.5, 18.75),
+    'claude/claude-3-sonnet': (3.0, 15.0, 0.3, 3.75),
+    'claude/claude-3-haiku': (0.25, 1.25, 0.03, 0.3),
+    'gemini/gemini-1.5-pro': (1.25, 5.0, 0.3125, 1.25),
+    'gemini/gemini-1.5-flash': (0.075, 0.3, 0.01875, 0.075),
+    'gemini/gemini-pro': (0.5, 1.5, 0.5, 0.5),
+    'mistral/mistral-large': (2.0, 6.0, 2.0, 2.0),
+    'mistral/mistral-medium': (2.7, 8.1, 2.7, 2.7),
+    'mistral/mistral-small': (0.2, 0.6, 0.2, 0.2),
+    'mistral/open-mixtral-8x22b': (2.0, 6.0, 2.0, 2.0),
+    'mistral/open-mixtral-8x7b': (0.7, 0.7, 0.7, 0.7),
+    'mistral/open-mistral-7b': (0.25, 0.25, 0.25, 0.25),
+    'mistral/mistral-tiny': (0.25, 0.25, 0.25, 0.25),
+    'ollama/': (0.0, 0.0, 0.0, 0.0),
+}
+
+# the price tables with the user overrides, see get_prices().
+_prices = None
+
+
+def get_prices(prices_path: str = os.path.join(CONFIG_HOME, USAGE_PRICES_FILE)):
+    """
+    get_prices: the price tables, with the overrides of the prices file (e.g. negotiated or newer prices).
+    Args:
+        prices_path: the path of the overrides, a JSON object of `platform/model` to the four prices.
+    """
+    global _prices
+    if _prices is None:
+        _prices = dict(PRICES)
+        try:
+            with open(prices_path, 'r', encoding='utf-8') as f:
+                _prices.update({key: tuple(value) for key, value in json.load(f).items()})
+        except (OSError, ValueError, TypeError):
+            pass
+    return _prices
+
+
+def get_price(model_key: str) -> Optional[tuple]:
+    """
+    get_price: the prices of a model.
+    Args:
+        model_key: the model, `platform/model`.
+
+    Returns: the input, output, cached input and cache write prices (USD per million tokens),
+        None for an unknown model.
+    """
+    prices = get_prices()
+    matches = [prefix for prefix in prices if model_key.startswith(prefix)]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def request_cost(model_key: str, input_tokens: int, output_tokens: int = 0, cached_tokens: int = 0,
+                 cache_write_tokens: int = 0):
+    """
+    request_cost: the cost of a request, and what the provider prompt cache saved.
+    Args:
+        model_key: the model, `platform/model`.
+        input_tokens: the input tokens, cached and written ones included.
+        output_tokens: the output tokens.
+        cached_tokens: the input tokens read from the provider prompt cache.
+        cache_write_tokens: the input tokens written to the provider prompt cache.
+
+    Returns: a tuple of the cost and the savings in USD, (None, None) for an unknown model.
+    """
+    price = get_price(model_key)
+    if price is None:
+        return None, None
+    input_price, output_price, cached_price, write_price = price
+    uncached = max(0, input_tokens - cached_tokens - cache_write_tokens)
+    cost = (uncached * input_price + cached_tokens * cached_price + cache_write_tokens * write_price
+            + output_tokens * output_price) / 1e6
+    saved = cached_tokens * (input_price - cached_price) / 1e6
+    return cost, saved
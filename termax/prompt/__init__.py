@@ -1,3 +1,4 @@
 from .prompt import *
 from .utils import *
 from .memory import *
+from .assembler import *
@@ -0,0 +1,178 @@
+import importlib.util
+from dataclasses import dataclass
+from typing import List, Optional
+
+from termax.utils.const import *
+
+
+class HeuristicTokenizer:
+    """
+    HeuristicTokenizer: estimates about 4 characters per token, no dependency required.
+    """
+    name = 'heuristic'
+
+    def count(self, text: str) -> int:
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return text[:max(0, max_tokens) * 4]
+
+
+class TiktokenTokenizer:
+    """
+    TiktokenTokenizer: exact token counts for the OpenAI models, requires the tiktoken package.
+    """
+    name = 'tiktoken'
+
+    def __init__(self, model_version: Optional[str] = None):
+        tiktoken = importlib.import_module('tiktoken')
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_version or '')
+        except KeyError:
+            self.encoding = tiktoken.get_encoding('cl100k_base')
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return self.encoding.decode(self.encoding.encode(text)[:max(0, max_tokens)])
+
+
+def get_tokenizer(platform: Optional[str] = None, model_version: Optional[str] = None):
+    """
+    get_tokenizer: the tokenizer used to estimate the prompt size.
+    tiktoken is used for OpenAI when installed, the other models use the heuristic.
+    Args:
+        platform: the platform of the model.
+        model_version: the model version, e.g. gpt-3.5-turbo.
+    """
+    if platform == CONFIG_SEC_OPENAI and importlib.util.find_spec('tiktoken') is not None:
+        return TiktokenTokenizer(model_version)
+    return HeuristicTokenizer()
+
+
+def get_prompt_budget(model_version: Optional[str] = None, config_dict: Optional[dict] = None):
+    """
+    get_prompt_budget: the token budget of the system prompt for a model.
+    Args:
+        model_version: the model version, matched by prefix against PROMPT_BUDGETS.
+        config_dict: the configuration, `prompt_budget` in the general section overrides the defaults.
+    """
+    general = (config_dict or {}).get(CONFIG_SEC_GENERAL, {})
+    if general.get('prompt_budget'):
+        return int(general['prompt_budget'])
+
+    # the longest matching prefix wins, e.g. gpt-4o over gpt-4.
+    matches = [prefix for prefix in PROMPT_BUDGETS if model_version and model_version.startswith(prefix)]
+    if matches:
+        return PROMPT_BUDGETS[max(matches, key=len)]
+    return DEFAULT_PROMPT_BUDGET
+
+
+class CacheablePrompt(str):
+    """
+    CacheablePrompt: a prompt split into a stable prefix and a volatile suffix.
+    The backends with prompt caching mark the prefix as cacheable, the others use it as a plain string.
+    """
+    def __new__(cls, prefix: str, suffix: str = "", separator: str = "\n\n"):
+        prompt = super().__new__(cls, separator.join(part for part in (prefix, suffix) if part))
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        return prompt
+
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    priority: int
+    truncatable: bool = False
+    volatile: bool = False
+    tokens: int = 0
+
+
+class PromptAssembler:
+    def __init__(self, budget: int = DEFAULT_PROMPT_BUDGET, tokenizer=None):
+        """
+        PromptAssembler: pack prompt sections into a token budget.
+        Sections are considered from the highest priority down (ties in insertion order): a section is kept if
+        it fits, truncated if it is truncatable, dropped otherwise. The kept stable sections come first and the
+        volatile ones last, each in insertion order, so the prefix of the prompt is the same across invocations
+        and can be cached by the providers.
+        Args:
+            budget: the token budget of the prompt.
+            tokenizer: the tokenizer estimating the size of the sections, default is the heuristic.
+        """
+        self.budget = budget
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+        self.sections: List[PromptSection] = []
+        self.report = {}
+
+    def add(self, name: str, text: str, priority: int, truncatable: bool = False, volatile: bool = False):
+        """
+        add: add a section to the prompt.
+        Args:
+            name: the name of the section, used in the report.
+            text: the text of the section.
+            priority: the higher the priority, the later the section is dropped.
+            truncatable: whether the section can be cut to fit the remaining budget.
+            volatile: whether the section changes between invocations (time, files, RAG samples).
+        """
+        self.sections.append(
+            PromptSection(name=name, text=text, priority=priority, truncatable=truncatable, volatile=volatile,
+                          tokens=self.tokenizer.count(text))
+        )
+
+    def truncate(self, text: str, max_tokens: int):
+        """
+        truncate: cut a text to a number of tokens, preferably at a line break.
+        """
+        marker = "\n... (truncated)"
+        cut = self.tokenizer.truncate(text, max_tokens - self.tokenizer.count(marker))
+        if not cut:
+            return ""
+        line_break = cut.rfind("\n")
+        if line_break > len(cut) // 2:
+            cut = cut[:line_break]
+        return cut + marker
+
+    def assemble(self, separator: str = "\n\n"):
+        """
+        assemble: build the prompt within the budget.
+        Args:
+            separator: the separator between the sections.
+
+        Returns: the prompt as a CacheablePrompt, the details are stored in `report`.
+        """
+        separator_tokens = self.tokenizer.count(separator)
+        remaining = self.budget
+        kept = {}
+        dropped, truncated = [], []
+
+        for index, section in sorted(enumerate(self.sections), key=lambda s: (-s[1].priority, s[0])):
+            cost = section.tokens + separator_tokens
+            if cost <= remaining:
+                kept[index] = section.text
+                remaining -= cost
+            elif section.truncatable and remaining > separator_tokens:
+                text = self.truncate(section.text, remaining - separator_tokens)
+                if text:
+                    kept[index] = text
+                    remaining -= self.tokenizer.count(text) + separator_tokens
+                    truncated.append(section.name)
+                else:
+                    dropped.append(section.name)
+            else:
+                dropped.append(section.name)
+
+        prefix = separator.join(kept[i] for i in sorted(kept) if not self.sections[i].volatile)
+        suffix = separator.join(kept[i] for i in sorted(kept) if self.sections[i].volatile)
+        self.report = {
+            'budget': self.budget,
+            'tokens': self.budget - remaining,
+            'prefix_tokens': self.tokenizer.count(prefix),
+            'tokenizer': self.tokenizer.name,
+            'dropped': dropped,
+            'truncated': truncated,
+        }
+        return CacheablePrompt(prefix, suffix, separator)
@@ -1,22 +1,31 @@
+import math
+import json
+import time
 import uuid
+import heapq
 import os.path
 from typing import List, Dict
-
-import chromadb
-from chromadb.utils import embedding_functions
-
-chromadb.logger.setLevel(chromadb.logging.ERROR)
+from contextlib import contextmanager
 
 from termax.utils.const import *
 from termax.utils.metadata import *
 from termax.utils import Config, CONFIG_HOME
+from termax.utils.profiler import profiled
+from termax.utils.files import atomic_write_json
+
+try:
+    import fcntl
+except ImportError:  # Windows, the counts are best effort.
+    fcntl = None
 
 
 class Memory:
+    @profiled('memory_open')
     def __init__(
             self,
             data_path: str = CONFIG_HOME,
-            embedding_model: str = "text-embedding-ada-002"
+            embedding_model: str = "text-embedding-ada-002",
+            embedding_function=None
     ):
         """
         RAG for Termax: memory and external knowledge management.
@@ -25,12 +34,27 @@ class Memory:
             embedding_model: the embedding model to use, default will use the embedding model from ChromaDB,
              if the OpenAI has been set in the configuration, it will use the OpenAI embedding model
              "text-embedding-ada-002".
+            embedding_function: a ChromaDB embedding function used for every collection instead,
+             e.g. the deterministic one of the benchmarks.
         """
+        # chromadb is a heavy import, only pay for it once the memory is actually opened.
+        import chromadb
+        from chromadb.utils import embedding_functions
+        chromadb.logger.setLevel(chromadb.logging.ERROR)
+
         self.config = Config().read()
         self.client = chromadb.PersistentClient(path=os.path.join(data_path, DB_PATH))
+        self.embedding_function = embedding_function
+        # the number of records of each collection, counted once then kept up to date across the processes,
+        # see count(), and the uses of the records not written to the database yet, see touch().
+        self.counts_path = os.path.join(data_path, MEMORY_COUNT_FILE)
+        self.counts_lock_path = os.path.join(data_path, f"{MEMORY_COUNT_FILE}.lock")
+        self.touches_path = os.path.join(data_path, MEMORY_TOUCH_FILE)
 
-        # use the OpenAI embedding function if the openai section is set in the configuration.
-        if self.config.get(CONFIG_SEC_OPENAI, None):
+        # an explicit embedding function wins, then the OpenAI one if the openai section is set in the configuration.
+        if embedding_function is not None:
+            self.collection(DB_COMMAND_HISTORY)
+        elif self.config.get(CONFIG_SEC_OPENAI, None):
             self.client.get_or_create_collection(
                 DB_COMMAND_HISTORY,
                 embedding_function=embedding_functions.OpenAIEmbeddingFunction(
@@ -41,6 +65,16 @@ class Memory:
         else:
             self.client.get_or_create_collection(DB_COMMAND_HISTORY)
 
+    def collection(self, name: str = DB_COMMAND_HISTORY):
+        """
+        collection: get or create a collection, with the embedding function of the memory if one was given.
+        Args:
+            name: the name of the collection.
+        """
+        if self.embedding_function is not None:
+            return self.client.get_or_create_collection(name, embedding_function=self.embedding_function)
+        return self.client.get_or_create_collection(name)
+
     def add_query(
             self,
             queries: List[Dict[str, str]],
@@ -53,7 +87,8 @@ class Memory:
             queries: the queries to add to the memery. Should be in the format of
                 {
                     "query": "the query",
-                    "response": "the response"
+                    "response": "the response",
+                    "executed": True  # optional, the response has been executed successfully
                 }
             collection: the name of the collection to add the queries.
             idx: the ids of the queries, should be in the same length as the queries.
@@ -68,16 +103,172 @@ class Memory:
 
         query_list = [query['query'] for query in queries]
         added_time = datetime.now().isoformat()
-        resp_list = [{'response': query['response'], 'created_at': added_time} for query in queries]
-        # insert the record into the database
-        self.client.get_or_create_collection(collection).add(
-            documents=query_list,
-            metadatas=resp_list,
-            ids=ids
-        )
-
+        now = time.time()
+        resp_list = [
+            {'response': query['response'], 'created_at': added_time, 'executed': query.get('executed', False),
+             'last_used': now, 'hits': 0}
+            for query in queries
+        ]
+        # insert the records into the database, in batches the client accepts.
+        target = self.collection(collection)
+        batch_size = getattr(self.client, 'max_batch_size', None) or len(ids) or 1
+        with self._counts() as counts:
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                target.add(documents=query_list[start:end], metadatas=resp_list[start:end], ids=ids[start:end])
+            if collection in counts:
+                counts[collection] += len(ids)
         return ids
 
+    @contextmanager
+    def _counts(self):
+        """
+        _counts: the number of records of each collection, locked across the processes (the CLI, the daemon and
+        the batches) while the records are added or deleted, written back on exit.
+        """
+        os.makedirs(os.path.dirname(self.counts_lock_path), exist_ok=True)
+        with open(self.counts_lock_path, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.counts_path, 'r', encoding='utf-8') as f:
+                        counts = json.load(f)
+                    counts = counts if isinstance(counts, dict) else {}
+                except (OSError, ValueError):
+                    counts = {}
+                original = dict(counts)
+                yield counts
+                if counts != original:
+                    try:
+                        atomic_write_json(self.counts_path, counts)
+                    except OSError:
+                        pass
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def touch(self, ids: List[str], metadatas: List[dict] = None, collection: str = DB_COMMAND_HISTORY):
+        """
+        touch: record that the records were used, their hit count and last use decide which ones are evicted.
+        The uses are appended to a journal, a query does not write to the database: they are written in one batch
+        by flush_touches(), on the save and eviction path or once the journal grows past MEMORY_TOUCH_FLUSH_SIZE.
+        Args:
+            ids: the ids of the records.
+            metadatas: unused, kept for the callers passing the results of query().
+            collection: the name of the collection of the records.
+        """
+        if not ids:
+            return
+        entry = json.dumps({'c': collection, 't': time.time(), 'ids': list(ids)}, separators=(',', ':'))
+        try:
+            os.makedirs(os.path.dirname(self.touches_path), exist_ok=True)
+            with open(self.touches_path, 'a', encoding='utf-8') as f:
+                f.write(entry + "\n")
+                size = f.tell()
+        except OSError:
+            return
+        if size > MEMORY_TOUCH_FLUSH_SIZE:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """
+        flush_touches: write the uses recorded by touch(), in one update per collection.
+        Only the usage fields are updated, the other fields of the metadata are kept.
+
+        Returns: the number of updated records.
+        """
+        # the journal is moved aside first, the uses recorded meanwhile go to a new one.
+        flushing = f"{self.touches_path}.{uuid.uuid4().hex}.flush"
+        try:
+            os.replace(self.touches_path, flushing)
+            with open(flushing, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            os.remove(flushing)
+        except OSError:
+            return 0
+
+        uses = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            hits = uses.setdefault(entry['c'], {})
+            for record_id in entry['ids']:
+                count, last_used = hits.get(record_id, (0, 0.0))
+                hits[record_id] = (count + 1, max(last_used, entry['t']))
+
+        updated = 0
+        for collection, hits in uses.items():
+            target = self.collection(collection)
+            # the records evicted since they were used are gone, they are left out.
+            current = target.get(ids=list(hits), include=['metadatas'])
+            if not current['ids']:
+                continue
+            target.update(
+                ids=current['ids'],
+                metadatas=[
+                    {'last_used': hits[record_id][1], 'hits': int((metadata or {}).get('hits', 0)) + hits[record_id][0]}
+                    for record_id, metadata in zip(current['ids'], current['metadatas'])
+                ]
+            )
+            updated += len(current['ids'])
+        return updated
+
+    @staticmethod
+    def record_value(metadata: dict, now: float, half_life: float = MEMORY_HALF_LIFE):
+        """
+        record_value: the value of keeping a record, its hit count decayed by the time since its last use.
+        Args:
+            metadata: the metadata of the record.
+            now: the current time.
+            half_life: the time (seconds) after which an unused record has lost half of its value.
+        """
+        last_used = metadata.get('last_used')
+        if last_used is None:
+            # records saved before the usage fields existed, their creation is their last use.
+            try:
+                last_used = datetime.fromisoformat(metadata['created_at']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                last_used = 0.0
+        age = max(0.0, now - float(last_used))
+        return (1 + int(metadata.get('hits', 0))) * math.pow(0.5, age / half_life)
+
+    def evict(self, keep: int, collection: str = DB_COMMAND_HISTORY, page_size: int = MEMORY_EVICT_PAGE_SIZE):
+        """
+        evict: delete the records of the lowest value until `keep` of them are left.
+        The records are ranked a page at a time, only the ids of the lowest valued ones are kept in memory.
+        Args:
+            keep: the number of records to keep.
+            collection: the name of the collection.
+            page_size: the number of records read at a time.
+
+        Returns: the number of evicted records.
+        """
+        self.flush_touches()
+        target = self.collection(collection)
+        with self._counts() as counts:
+            total = target.count()
+            excess = total - keep
+            if excess <= 0:
+                counts[collection] = total
+                return 0
+
+            now = time.time()
+
+            def values():
+                for offset in range(0, total, page_size):
+                    page = target.get(include=['metadatas'], limit=page_size, offset=offset)
+                    for record_id, metadata in zip(page['ids'], page['metadatas']):
+                        yield self.record_value(metadata or {}, now), record_id
+
+            evicted = [record_id for _, record_id in heapq.nsmallest(excess, values())]
+            target.delete(ids=evicted)
+            counts[collection] = total - len(evicted)
+        return len(evicted)
+
+    @profiled('rag_query')
     def query(self, query_texts: List[str], collection: str = DB_COMMAND_HISTORY, n_results: int = 5):
         """
         query: query the memery.
@@ -88,7 +279,7 @@ class Memory:
 
         Returns: the top k results.
         """
-        return self.client.get_or_create_collection(collection).query(query_texts=query_texts, n_results=n_results)
+        return self.collection(collection).query(query_texts=query_texts, n_results=n_results)
 
     def peek(self, collection: str = DB_COMMAND_HISTORY, n_results: int = 20):
         """
@@ -99,7 +290,7 @@ class Memory:
 
         Returns: the top k results.
         """
-        return self.client.get_or_create_collection(collection).peek(limit=n_results)
+        return self.collection(collection).peek(limit=n_results)
 
     def get(self, record_id: str = None, collection: str = DB_COMMAND_HISTORY):
         """
@@ -122,16 +313,22 @@ class Memory:
         Args:
             collection_name: the name of the collection to delete.
         """
-        return self.client.delete_collection(name=collection_name)
+        with self._counts() as counts:
+            counts.pop(collection_name, None)
+            return self.client.delete_collection(name=collection_name)
 
     def count(self, collection_name: str = DB_COMMAND_HISTORY):
         """
         count: count the number of records in the memery.
+        The collection is counted once, then the count is kept up to date by add_query() and evict() in a file next
+        to the database, so a CLI run does not count the whole collection again to decide whether to evict.
         Args:
             collection_name: the name of the collection to count.
         """
-
-        return self.client.get_collection(name=collection_name).count()
+        with self._counts() as counts:
+            if collection_name not in counts:
+                counts[collection_name] = self.client.get_collection(name=collection_name).count()
+            return counts[collection_name]
 
     def reset(self):
         """
@@ -139,3 +336,8 @@ class Memory:
         Notice: You may need to set the environment variable `ALLOW_RESET` to `TRUE` to enable this function.
         """
         self.client.reset()
+        for path in (self.counts_path, self.counts_lock_path, self.touches_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -1,28 +1,227 @@
 from .memory import Memory
+from .assembler import PromptAssembler, HeuristicTokenizer
 from termax.utils.metadata import *
+from termax.utils.snapshot import get_system_snapshot
+from termax.utils.collector import run_collectors
+from termax.utils.listing import describe_file_summary
 from termax.utils import CONFIG_SEC_OPENAI
+from termax.utils.profiler import profiled
 
 import textwrap
 from datetime import datetime
 
 
 class Prompt:
-    def __init__(self, memory):
+    def __init__(self, memory, budget: int = DEFAULT_PROMPT_BUDGET, tokenizer=None):
         """
         Prompt for Termax: the prompt for the LLMs.
         Args:
             memory: the memory instance.
+            budget: the token budget of the prompts, see get_prompt_budget().
+            tokenizer: the tokenizer estimating the prompt size, default is the heuristic.
         """
-        # TODO: make the sync of system related metadata once happened at the initialization
-        self.system_metadata = get_system_metadata()
+        self.budget = budget
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+        # the budget, the size and the dropped sections of the last prompt.
+        self.report = {}
+
+        # the system metadata is a cached snapshot, the fields are only probed when a prompt reads them.
+        self.system_metadata = get_system_snapshot()
         self.path_metadata = get_path_metadata()
         # self.command_history = get_command_history()
 
-        # share the same memory instance.
-        if memory is None:
-            self.memory = Memory()
-        else:
-            self.memory = memory
+        # share the same memory instance, opened on first use since not every prompt needs the RAG.
+        self._memory = memory
+        # the status and timing of each metadata source used by the last prompt.
+        self.collector_report = {}
+        # the memory results of the last request, shared by match_memory() and gen_commands().
+        self._samples = (None, None)
+        # the memory results of the requests of a batch, see prefetch_memory().
+        self._prefetched = {}
+        # the metadata collected once for the requests of a batch, see prefetch_metadata().
+        self._metadata = None
+
+    @property
+    def memory(self):
+        """
+        memory: the memory instance, created lazily if none was shared.
+        """
+        if self._memory is None:
+            self._memory = Memory()
+        return self._memory
+
+    def query_memory(self, text: str):
+        """
+        query_memory: the stored requests similar to the text, the memory is queried once per text.
+        Args:
+            text: the natural language text.
+        """
+        if text in self._prefetched:
+            return self._prefetched[text]
+        if self._samples[0] != text:
+            self._samples = (text, self.memory.query([text]))
+            self.touch_samples(self._samples[1])
+        return self._samples[1]
+
+    def touch_samples(self, samples):
+        """
+        touch_samples: count the retrieved records as used, the most used ones survive the memory eviction.
+        Args:
+            samples: the results of Memory.query().
+        """
+        ids = [record_id for group in samples.get('ids') or [] for record_id in group]
+        metadatas = [metadata for group in samples.get('metadatas') or [] for metadata in group]
+        try:
+            self.memory.touch(ids, metadatas)
+        except Exception:
+            # the usage is bookkeeping, it never fails a request.
+            pass
+
+    def prefetch_memory(self, texts):
+        """
+        prefetch_memory: query the memory for many requests at once, the embeddings are computed in one batch.
+        Args:
+            texts: the natural language texts.
+        """
+        texts = list(dict.fromkeys(text for text in texts if text not in self._prefetched))
+        if not texts:
+            return
+        results = self.memory.query(texts)
+        self.touch_samples(results)
+        # split the results into the shape of a single query.
+        for index, text in enumerate(texts):
+            self._prefetched[text] = {
+                key: [value[index]] if isinstance(value, list) else value for key, value in results.items()
+            }
+
+    def prefetch_metadata(self):
+        """
+        prefetch_metadata: collect the metadata of the current directory once for the requests of a batch.
+        With the memory prefetched too, the prompts of the batch are built without any I/O, they do not block
+        the event loop of the batch.
+        """
+        self._metadata = self.collect(['files'])
+
+    def match_memory(self, text: str, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        """
+        match_memory: the stored command of a near-duplicate request, for the semantic cache.
+        Args:
+            text: the natural language text.
+            threshold: the maximum distance between the requests.
+
+        Returns: a dictionary with the stored query, its command, the distance and the confidence,
+            None if no executed command is close enough.
+        """
+        samples = self.query_memory(text)
+        if not samples['ids'] or not samples['ids'][0]:
+            return None
+
+        # the nearest sample comes first.
+        metadata, document = samples['metadatas'][0][0], samples['documents'][0][0]
+        distance = samples['distances'][0][0]
+        # entries saved before the flag existed were only ever saved after a successful execution.
+        if distance > threshold or not metadata.get('executed', True):
+            return None
+        return {
+            'query': document,
+            'command': metadata['response'],
+            'distance': distance,
+            # the embeddings are normalized, the squared L2 distance is 2 - 2 * cosine similarity.
+            'confidence': max(0.0, 1 - distance / 2),
+        }
+
+    @profiled('collectors')
+    def collect(self, names):
+        """
+        collect: run the metadata sources concurrently, an unavailable source degrades to a marker.
+        Args:
+            names: the names of the registered metadata sources.
+
+        Returns: a dictionary of the collected metadata keyed by source name.
+        """
+        results = run_collectors(names)
+        self.collector_report = {
+            name: {'status': r['status'], 'elapsed_ms': r['elapsed_ms'], 'error': r['error']}
+            for name, r in results.items()
+        }
+
+        collected = {}
+        for name, result in results.items():
+            if result['status'] == 'ok':
+                collected[name] = result['data']
+            elif name == 'files':
+                collected[name] = {
+                    'files': COLLECTOR_UNAVAILABLE, 'directory': COLLECTOR_UNAVAILABLE,
+                    'invisible_files': COLLECTOR_UNAVAILABLE, 'invisible_directory': COLLECTOR_UNAVAILABLE
+                }
+            else:
+                collected[name] = None
+        return collected
+
+    def system_section(self):
+        """
+        system_section: the system information of the user.
+        """
+        return textwrap.dedent(
+            f"""\
+            [INFORMATION] The user's current system information:
+            1. OS: {self.system_metadata['platform']}
+            2. OS Version: {self.system_metadata['platform_version']}
+            3. Architecture: {self.system_metadata['architecture']}"""
+        )
+
+    def user_section(self):
+        """
+        user_section: the user, stable across the invocations.
+        """
+        return textwrap.dedent(
+            f"""\
+            [INFORMATION] The user's information:
+            1. User: {self.path_metadata['user']}"""
+        )
+
+    def directory_section(self):
+        """
+        directory_section: the current directory, it changes between the invocations so it follows the prefix.
+        """
+        return textwrap.dedent(
+            f"""\
+            [INFORMATION] The user's current PATH information:
+            1. Current PATH: {self.path_metadata['current_directory']}"""
+        )
+
+    @staticmethod
+    def files_section(files):
+        """
+        files_section: the content of the current directory, or its summary for a large directory.
+        Args:
+            files: the file metadata.
+        """
+        lines = [
+            "[INFORMATION] The content of the current directory:",
+            f"1. Files under the current directory: {files['files']}",
+            f"2. Directories under the current directory: {files['directory']}",
+            f"3. Invisible files under the current directory: {files['invisible_files']}",
+            f"4. Invisible directories under the current directory: {files['invisible_directory']}",
+        ]
+        summary = describe_file_summary(files)
+        if summary:
+            lines.append(f"5. The current directory is too large to list, summary: {summary}")
+        return "\n".join(lines)
+
+    @profiled('prompt_assembly')
+    def assemble(self, sections):
+        """
+        assemble: pack the sections into the budget of the prompt.
+        Args:
+            sections: a list of (name, text, priority, truncatable, volatile).
+        """
+        assembler = PromptAssembler(self.budget, self.tokenizer)
+        for name, text, priority, truncatable, volatile in sections:
+            assembler.add(name, text, priority, truncatable, volatile)
+        prompt = assembler.assemble()
+        self.report = assembler.report
+        return prompt
 
     def gen_suggestions(self, primary: str, model: str = CONFIG_SEC_OPENAI):
         """
@@ -31,87 +230,44 @@ class Prompt:
             primary: the primary data source, could be git or docker.
             model: the model to use, default is OpenAI.
         """
-        if primary == 'git':
-            primary_data = "\n".join(
-                f"{index + 1}. {key}: {value}" for index, (key, value) in enumerate(get_git_metadata().items()))
-        elif primary == 'docker':
-            primary_data = "\n".join(
-                f"{index + 1}. {key}: {value}" for index, (key, value) in enumerate(get_docker_metadata().items()))
+        # TODO: add more models specific prompt
+        if primary in ('git', 'docker'):
+            collected = self.collect(['files', primary])
+            if collected[primary] is None:
+                primary_data = f"{primary}: {COLLECTOR_UNAVAILABLE}"
+            else:
+                primary_data = "\n".join(
+                    f"{index + 1}. {key}: {value}" for index, (key, value) in enumerate(collected[primary].items()))
         else:
+            collected = self.collect(['files'])
             primary_data = 'No primary data source available'
 
-        files = get_file_metadata()
-        if model == CONFIG_SEC_OPENAI:
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you need to assist user to infer the next command based on
-                 user's given intent description.
-                
-                [INFORMATION] The user's current system information:
-                
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-                
-                [INFORMATION] The current time: {datetime.now().isoformat()}
-
-                [INFORMATION] The primary command information:
-                {primary_data}
-                
-                Here are some rules you need to follow:
-                1. Please provide only shell commands as the format below for os without any description.
-                2. Ensure the output is a valid shell command.
-                
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
-        else:
-            # TODO: add more models specific prompt
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you need to assist user to infer the next command based on
-                 user's given intent description.
-                
-                [INFORMATION] The user's current system information:
-                
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-                
-                [INFORMATION] The current time: {datetime.now().isoformat()}
-
-                [INFORMATION] The primary command information:
-                {primary_data}
-                
-                Here are some rules you need to follow:
-                1. Please provide only shell commands as the format below for os without any description.
-                2. Ensure the output is a valid shell command.
-                
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
+        instructions = textwrap.dedent(
+            """\
+            You are an shell expert, you need to assist user to infer the next command based on
+             user's given intent description."""
+        )
+        output_format = textwrap.dedent(
+            """\
+            Here are some rules you need to follow:
+            1. Please provide only shell commands as the format below for os without any description.
+            2. Ensure the output is a valid shell command.
+
+            The output shell commands is (please replace the `{commands}` with the actual commands):
+
+            Commands: ${commands}"""
+        )
+        # the stable sections form the cacheable prefix, what changes between invocations follows.
+        return self.assemble([
+            ('instructions', instructions, 100, False, False),
+            ('output_format', output_format, 100, False, False),
+            ('system', self.system_section(), 90, False, False),
+            ('user', self.user_section(), 80, False, False),
+            ('directory', self.directory_section(), 80, False, True),
+            ('primary', f"[INFORMATION] The primary command information:\n{primary_data}", 70, True, True),
+            ('time', f"[INFORMATION] The current time: {datetime.now().isoformat()}", 50, False, True),
+            ('files', self.files_section(collected['files']), 40, True, True),
+        ])
 
     def explain_commands(self, model: str = CONFIG_SEC_OPENAI):
         """
@@ -132,98 +288,62 @@ class Prompt:
             text: the natural language text.
             model: the model to use, default is OpenAI.
         """
+        # TODO: add more models specific prompt
         # query the history database to get similar samples
-        samples = self.memory.query([text])
+        samples = self.query_memory(text)
         metadatas = samples['metadatas'][0]
         documents = samples['documents'][0]
         distances = samples['distances'][0]
 
-        # construct a string that contains the samples in a human-readable format
-        sample_string = ""
+        # each sample is a section, the least similar ones are dropped first.
+        sample_sections = []
         for i in range(len(documents)):
-            sample_string += f"""
-            User Input: {documents[i]}
-            Generated Commands: {metadatas[i]['response']}
-            Distance Score: {distances[i]}
-            Date: {metadatas[i]['created_at']}\n
-            """
-
-        # refresh the metadata
-        files = get_file_metadata()
-        if model == CONFIG_SEC_OPENAI:
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you can convert natural language text from user to shell commands.
-                
-                1. Please provide only shell commands for os without any description.
-                2. Ensure the output is a valid shell command.
-                3. If multiple steps required try to combine them together.
-                
-                Here are some rules you need to follow:
-
-                1. The commands should be able to run on the current system according to the system information.
-                2. The files in the commands should be available in the path, according to the path information.
-                3. The CLI application should be installed in the system (check the path information).
-
-                Here are some information you may need to know:
-                
-                [INFORMATION] The user's current system information:
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-    
-                Here are some similar commands generated before:
-                {sample_string}
-
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
-        else:
-            # TODO: add more models specific prompt
-            return textwrap.dedent(
-                f"""\
-                You are an shell expert, you can convert natural language text from user to shell commands.
-                
-                1. Please provide only shell commands for os without any extra description.
-                2. Ensure the output is a valid shell command.
-                3. If multiple steps required try to combine them together.
-                
-                Here are some rules you need to follow:
-
-                1. The commands should be able to run on the current system according to the system information.
-                2. The files in the commands should be available in the path, according to the path information.
-                3. The CLI application should be installed in the system (check the path information).
-
-                Here are some information you may need to know:
-                
-                [INFORMATION] The user's current system information:
-                1. OS: {self.system_metadata['platform']}
-                2. OS Version: {self.system_metadata['platform_version']}
-                3. Architecture: {self.system_metadata['architecture']}
-                
-                [INFORMATION] The user's current PATH information:
-                1. User: {self.path_metadata['user']}
-                2. Current PATH: {self.path_metadata['current_directory']}
-                3. Files under the current directory: {files['files']}
-                4. Directories under the current directory: {files['directory']}
-                5. Invisible files under the current directory: {files['invisible_files']}
-                6. Invisible directories under the current directory: {files['invisible_directory']}
-                
-                Here are some similar commands generated before:
-                {sample_string}
-                
-                The output shell commands is (please replace the `{{commands}}` with the actual commands):
-
-                Commands: ${{commands}}
-                """
-            )
+            sample_sections.append((
+                f"sample_{i + 1}",
+                textwrap.dedent(
+                    f"""\
+                    User Input: {documents[i]}
+                    Generated Commands: {metadatas[i]['response']}
+                    Distance Score: {distances[i]}
+                    Date: {metadatas[i]['created_at']}"""
+                ),
+                30 - i,
+                False,
+                True
+            ))
+
+        # refresh the metadata, unless it was collected for the whole batch.
+        files = (self._metadata or self.collect(['files']))['files']
+        instructions = textwrap.dedent(
+            """\
+            You are an shell expert, you can convert natural language text from user to shell commands.
+
+            1. Please provide only shell commands for os without any description.
+            2. Ensure the output is a valid shell command.
+            3. If multiple steps required try to combine them together.
+
+            Here are some rules you need to follow:
+
+            1. The commands should be able to run on the current system according to the system information.
+            2. The files in the commands should be available in the path, according to the path information.
+            3. The CLI application should be installed in the system (check the path information)."""
+        )
+        output_format = textwrap.dedent(
+            """\
+            The output shell commands is (please replace the `{commands}` with the actual commands):
+
+            Commands: ${commands}"""
+        )
+        # the stable sections form the cacheable prefix, what changes between invocations follows.
+        sections = [
+            ('instructions', instructions, 100, False, False),
+            ('output_format', output_format, 100, False, False),
+            ('system', self.system_section(), 90, False, False),
+            ('user', self.user_section(), 80, False, False),
+            ('directory', self.directory_section(), 80, False, True),
+            ('files', self.files_section(files), 40, True, True),
+        ]
+        if sample_sections:
+            sections.append(('samples_header', "Here are some similar commands generated before:", 31, False, True))
+            sections.extend(sample_sections)
+        return self.assemble(sections)
@@ -1,6 +1,8 @@
 import re
 from urllib.parse import urlparse
 
+from termax.utils.profiler import profiled
+
 
 def extract_code_from_markdown(markdown_text, separator="\n\n"):
     """
@@ -15,6 +17,7 @@ def extract_code_from_markdown(markdown_text, separator="\n\n"):
     return separator.join(code_blocks)
 
 
+@profiled('parse')
 def extract_shell_commands(output):
     commands_start = "Commands: "
     commands_index = output.find(commands_start)
@@ -32,6 +35,67 @@ def extract_shell_commands(output):
     return commands
 
 
+class CommandStreamParser:
+    """
+    Incremental version of extract_shell_commands for streamed responses.
+
+    The command is complete once the `Command:`/`Commands:` line ends (a line ending with a backslash or a
+    pipe/`&&`/`||` operator continues on the next one), or once the first code fence is closed. The rest of the
+    response can then be cancelled.
+    """
+    code_block_regex = re.compile(r"```(?:[a-zA-Z0-9]+)?\n(.*?)```", re.DOTALL)
+    continuations = ('\\', '|', '&&', '||')
+
+    def __init__(self):
+        self.text = ""
+        self.command = None
+
+    @profiled('parse')
+    def feed(self, chunk):
+        """
+        Add a chunk of the response.
+        :param chunk: the text received since the last chunk.
+        :return: the command once it is complete, None before.
+        """
+        if self.command is None and chunk:
+            self.text += chunk
+            self.command = self._complete_command()
+        return self.command
+
+    def finish(self):
+        """
+        The end of the response: the complete command, or whatever the full text holds.
+        :return: the command.
+        """
+        return self.command if self.command is not None else extract_shell_commands(self.text)
+
+    def _complete_command(self):
+        # the same precedence as extract_shell_commands: `Command: ` first.
+        for marker in ("Command: ", "Commands: "):
+            index = self.text.find(marker)
+            if index >= 0:
+                return self._complete_line(self.text[index + len(marker):])
+
+        match = self.code_block_regex.search(self.text)
+        return match.group(1).strip() if match else None
+
+    def _complete_line(self, rest):
+        if rest.lstrip().startswith("```"):
+            match = self.code_block_regex.search(rest)
+            return match.group(1).strip() if match else None
+
+        # the last line may still be growing, only the lines followed by a newline are complete.
+        lines = []
+        for line in rest.split("\n")[:-1]:
+            line = line.strip()
+            if not line and not lines:
+                continue
+            lines.append(line)
+            if not line.endswith(self.continuations):
+                return "\n".join(lines)
+        return None
+
+
 def process_mac_script(text):
     """
     Process a script string to remove "osascript -e" and extra quotes,
@@ -0,0 +1,462 @@
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Union
+from urllib.parse import urlsplit
+
+from termax.utils.const import *
+from termax.utils.ratelimit import estimate_tokens
+
+
+@dataclass
+class MockResponse:
+    """
+    MockResponse: a scripted answer of the mock server.
+    Args:
+        content: the text of the answer.
+        function_call: a function call instead of the text, a dictionary with its name and arguments.
+        ttfb: the seconds before the first byte of the answer.
+        tokens_per_second: the rate of the streamed tokens, 0 sends them all at once.
+        error: an HTTP status (429, 500, ...) to fail the request with, or `timeout` to never answer.
+        retry_after: the Retry-After header of a 429.
+    """
+    content: str = MOCK_CONTENT
+    function_call: Optional[dict] = None
+    ttfb: float = 0.0
+    tokens_per_second: float = 0.0
+    error: Optional[Union[int, str]] = None
+    retry_after: Optional[float] = None
+
+    def tokens(self):
+        """
+        tokens: the streamed chunks of the content, a word and its trailing space each.
+        """
+        words = self.content.split(' ')
+        return [word + ' ' for word in words[:-1]] + [words[-1]]
+
+
+@dataclass
+class CapturedRequest:
+    path: str
+    body: dict
+    headers: dict
+    received_at: float
+    first_byte_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    status: int = 200
+    response: Optional[MockResponse] = field(default=None, repr=False)
+
+    @property
+    def duration(self):
+        """
+        duration: the seconds the server spent on the request, None until it is answered.
+        """
+        return None if self.finished_at is None else self.finished_at - self.received_at
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: '_Server'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, obj, status: int = 200, headers: Optional[dict] = None):
+        data = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        self.server.mock.handle(self, 'GET', {})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.send_json({'error': 'invalid JSON'}, status=400)
+        self.server.mock.handle(self, 'POST', body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mock):
+        self.mock = mock
+        super().__init__(address, _Handler)
+
+
+class MockLLMServer:
+    def __init__(self, host: str = MOCK_SERVER_HOST, port: int = 0, default: Optional[MockResponse] = None,
+                 responder: Optional[Callable[[CapturedRequest], MockResponse]] = None, error_rate: float = 0.0,
+                 error: Union[int, str] = 500, seed: Optional[int] = None, timeout: float = MOCK_SERVER_TIMEOUT):
+        """
+        MockLLMServer: a local stand-in for the OpenAI chat completions and the Ollama APIs.
+        Point OpenAIModel(base_url=server.openai_url) or OllamaModel(host_url=server.url) at it to run the
+        client side of Termax without a provider: the answers are scripted, the latency and the failures are
+        injected, and every request is captured with the server side timings.
+        Args:
+            host: the address to listen on.
+            port: the port, 0 picks a free one.
+            default: the answer once the scripted ones are used up.
+            responder: called with each request to pick its answer, instead of the script.
+            error_rate: the probability of failing a request that is not scripted to fail.
+            error: the failure injected by error_rate, an HTTP status or `timeout`.
+            seed: the seed of the error injection, for a reproducible run.
+            timeout: the seconds a `timeout` failure holds the connection, or until the server stops.
+        """
+        self.default = default or MockResponse()
+        self.responder = responder
+        self.error_rate = error_rate
+        self.error = error
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.requests: List[CapturedRequest] = []
+        self.loaded = set()
+        self._script = deque()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = _Server((host, port), self)
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        url: the base url of the server, the host of the Ollama client.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_url(self):
+        """
+        openai_url: the base url of the OpenAI client.
+        """
+        return self.url + "/v1"
+
+    def start(self):
+        """
+        start: serve the requests from a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve(self):
+        """
+        serve: serve the requests from the current thread, until interrupted.
+        """
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stopped.set()
+            self._server.server_close()
+
+    def stop(self):
+        """
+        stop: stop the server, the requests held by a `timeout` failure are released.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def script(self, *responses: Union[MockResponse, str]):
+        """
+        script: queue the answers of the next requests, in order. A string is the content of an answer.
+        """
+        with self._lock:
+            self._script.extend(MockResponse(content=r) if isinstance(r, str) else r for r in responses)
+
+    def reset(self):
+        """
+        reset: forget the captured requests, the script and the loaded models.
+        """
+        with self._lock:
+            self.requests.clear()
+            self._script.clear()
+            self.loaded.clear()
+
+    def next_response(self, request: CapturedRequest):
+        """
+        next_response: the answer of a request, from the responder, the script or the default,
+        then the random failure injection.
+        """
+        if self.responder:
+            response = self.responder(request)
+        else:
+            with self._lock:
+                response = self._script.popleft() if self._script else self.default
+        if response.error is None and self.error_rate and self.random.random() < self.error_rate:
+            response = MockResponse(content=response.content, ttfb=response.ttfb, error=self.error,
+                                    retry_after=response.retry_after)
+        return response
+
+    def handle(self, handler: _Handler, method: str, body: dict):
+        """
+        handle: route a request to the OpenAI or the Ollama API.
+        """
+        path = urlsplit(handler.path).path.rstrip('/')
+        if method == 'GET':
+            if path in ('/v1/models', '/models'):
+                return handler.send_json({'object': 'list', 'data': [
+                    {'id': name, 'object': 'model', 'created': 0, 'owned_by': 'termax'} for name in sorted(self.loaded)
+                ]})
+            if path in ('/api/ps', '/api/tags'):
+                return handler.send_json({'models': [
+                    {'name': name, 'model': name, 'size': 1, 'digest': '', 'details': {}, 'size_vram': 1,
+                     'expires_at': '2100-01-01T00:00:00Z'} for name in sorted(self.loaded)
+                ]})
+            if path == '/api/version':
+                return handler.send_json({'version': '0.0.0'})
+            return handler.send_json({'error': f"{path} not found"}, status=404)
+
+        routes = {
+            '/v1/chat/completions': self.openai_chat, '/chat/completions': self.openai_chat,
+            '/api/chat': self.ollama_chat, '/api/generate': self.ollama_generate,
+        }
+        if path not in routes:
+            return handler.send_json({'error': f"{path} not found"}, status=404)
+
+        request = CapturedRequest(path=path, body=body, headers=dict(handler.headers), received_at=time.time())
+        with self._lock:
+            self.requests.append(request)
+        response = request.response = self.next_response(request)
+        try:
+            if response.ttfb:
+                self._stopped.wait(response.ttfb)
+            if response.error == 'timeout':
+                request.status = 0
+                self._stopped.wait(self.timeout)
+                handler.close_connection = True
+                return
+            if response.error is not None:
+                request.status = int(response.error)
+                return self.send_error(handler, path, request.status, response.retry_after)
+            routes[path](handler, request, response)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading, e.g. termax closes the stream once the command is complete.
+            handler.close_connection = True
+        finally:
+            request.finished_at = time.time()
+
+    def send_error(self, handler: _Handler, path: str, status: int, retry_after: Optional[float] = None):
+        """
+        send_error: fail a request in the error format of its API.
+        """
+        message = "Rate limit exceeded" if status == 429 else "Injected failure"
+        headers = {'Retry-After': f"{retry_after:g}"} if retry_after is not None else {}
+        if path.startswith('/api/'):
+            return handler.send_json({'error': message}, status=status, headers=headers)
+        error = {'message': message, 'type': 'rate_limit_exceeded' if status == 429 else 'server_error',
+                 'param': None, 'code': None}
+        handler.send_json({'error': error}, status=status, headers=headers)
+
+    def stream_tokens(self, request: CapturedRequest, response: MockResponse):
+        """
+        stream_tokens: yield the chunks of an answer at its token rate.
+        """
+        delay = 1.0 / response.tokens_per_second if response.tokens_per_second else 0.0
+        for index, token in enumerate(response.tokens()):
+            if index and delay:
+                self._stopped.wait(delay)
+            if self._stopped.is_set():
+                return
+            yield token
+
+    @staticmethod
+    def usage(request: CapturedRequest, response: MockResponse):
+        """
+        usage: the token counts of a request, estimated with the heuristic tokenizer.
+        """
+        prompt_tokens = estimate_tokens(request.body.get('messages') or request.body.get('prompt') or '',
+                                        request.body.get('system') or '')
+        completion_tokens = estimate_tokens(response.content if response.function_call is None
+                                            else json.dumps(response.function_call))
+        return prompt_tokens, completion_tokens
+
+    def openai_chat(self, handler: _Handler, request: CapturedRequest, response: MockResponse):
+        """
+        openai_chat: answer a chat completion, the function call follows the format of the request
+        (`tools` or the legacy `functions`).
+        """
+        body = request.body
+        model = body.get('model', '')
+        self.loaded.add(model)
+        completion_id = f"chatcmpl-mock-{len(self.requests)}"
+        created = int(request.received_at)
+        prompt_tokens, completion_tokens = self.usage(request, response)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        tools = 'tools' in body
+        call = response.function_call
+        arguments = None
+        if call is not None:
+            arguments = call.get('arguments', {})
+            arguments = arguments if isinstance(arguments, str) else json.dumps(arguments)
+        finish_reason = 'stop' if call is None else ('tool_calls' if tools else 'function_call')
+
+        if not body.get('stream'):
+            message = {'role': 'assistant', 'content': response.content if call is None else None}
+            if call is not None and tools:
+                message['tool_calls'] = [{'id': 'call_mock', 'type': 'function',
+                                          'function': {'name': call['name'], 'arguments': arguments}}]
+            elif call is not None:
+                message['function_call'] = {'name': call['name'], 'arguments': arguments}
+            choices = [{'index': i, 'message': message, 'finish_reason': finish_reason, 'logprobs': None}
+                       for i in range(int(body.get('n') or 1))]
+            request.first_byte_at = time.time()
+            return handler.send_json({'id': completion_id, 'object': 'chat.completion', 'created': created,
+                                      'model': model, 'choices': choices, 'usage': usage})
+
+        def chunk(delta, finish=None, chunk_usage=None):
+            frame = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [] if delta is None else
+                     [{'index': 0, 'delta': delta, 'finish_reason': finish, 'logprobs': None}]}
+            if chunk_usage is not None:
+                frame['usage'] = chunk_usage
+            handler.write_chunk(f"data: {json.dumps(frame)}\n\n".encode('utf-8'))
+
+        handler.start_stream('text/event-stream')
+        request.first_byte_at = time.time()
+        if call is None:
+            chunk({'role': 'assistant', 'content': ''})
+            for token in self.stream_tokens(request, response):
+                chunk({'content': token})
+        elif tools:
+            chunk({'role': 'assistant', 'tool_calls': [{'index': 0, 'id': 'call_mock', 'type': 'function',
+                                                        'function': {'name': call['name'], 'arguments': ''}}]})
+            chunk({'tool_calls': [{'index': 0, 'function': {'arguments': arguments}}]})
+        else:
+            chunk({'role': 'assistant', 'function_call': {'name': call['name'], 'arguments': ''}})
+            chunk({'function_call': {'arguments': arguments}})
+        chunk({}, finish=finish_reason)
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk(None, chunk_usage=usage)
+        handler.write_chunk(b"data: [DONE]\n\n")
+        handler.end_stream()
+
+    def ollama_answer(self, handler: _Handler, request: CapturedRequest, response: MockResponse, frame):
+        """
+        ollama_answer: answer an Ollama request, as one JSON object or a stream of JSON lines.
+        Args:
+            frame: builds the object of a chunk from its text and whether it is the last one.
+        """
+        body = request.body
+        model = body.get('model', '')
+        self.loaded.add(model if ':' in model else model + ':latest')
+        prompt_tokens, completion_tokens = self.usage(request, response)
+        final = {'done': True, 'done_reason': 'stop', 'total_duration': 0, 'load_duration': 0,
+                 'prompt_eval_count': prompt_tokens, 'eval_count': completion_tokens}
+
+        if body.get('stream') is False:
+            request.first_byte_at = time.time()
+            return handler.send_json({**frame(response.content, True), **final})
+
+        handler.start_stream('application/x-ndjson')
+        request.first_byte_at = time.time()
+        for token in self.stream_tokens(request, response):
+            handler.write_chunk((json.dumps({**frame(token, False), 'done': False}) + '\n').encode('utf-8'))
+        handler.write_chunk((json.dumps({**frame('', True), **final}) + '\n').encode('utf-8'))
+        handler.end_stream()
+
+    def ollama_chat(self, handler: _Handler, request: CapturedRequest, response: MockResponse):
+        """
+        ollama_chat: answer /api/chat, a function call is sent as a tool call.
+        """
+        call = response.function_call
+
+        def frame(text, last):
+            message = {'role': 'assistant', 'content': text if call is None else ''}
+            if call is not None and last:
+                arguments = call.get('arguments', {})
+                message['tool_calls'] = [{'function': {
+                    'name': call['name'], 'arguments': json.loads(arguments) if isinstance(arguments, str) else arguments
+                }}]
+            return {'model': request.body.get('model', ''), 'created_at': _timestamp(), 'message': message}
+
+        self.ollama_answer(handler, request, response, frame)
+
+    def ollama_generate(self, handler: _Handler, request: CapturedRequest, response: MockResponse):
+        """
+        ollama_generate: answer /api/generate, an empty prompt (without a system prompt) only loads the model and
+        `num_predict: 0` only evaluates the prompt, as Ollama does.
+        """
+        body = request.body
+        if not body.get('prompt') and not body.get('system'):
+            model = body.get('model', '')
+            self.loaded.add(model if ':' in model else model + ':latest')
+            request.first_byte_at = time.time()
+            return handler.send_json({'model': model, 'created_at': _timestamp(), 'response': '', 'done': True,
+                                      'done_reason': 'load'})
+
+        if (body.get('options') or {}).get('num_predict') == 0:
+            response = replace(response, content='')
+        # the context grows with the conversation (the prompt and the answer), like the token ids Ollama returns.
+        evaluated = estimate_tokens(body.get('system') or '', body.get('prompt') or '')
+        context = list(body.get('context') or []) + list(range(evaluated + estimate_tokens(response.content)))
+
+        def frame(text, last):
+            chunk = {'model': body.get('model', ''), 'created_at': _timestamp(), 'response': text}
+            if last:
+                chunk['context'] = context
+            return chunk
+
+        self.ollama_answer(handler, request, response, frame)
+
+
+def _timestamp():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI/Ollama server for load and latency testing.")
+    parser.add_argument('--host', default=MOCK_SERVER_HOST, help="the address to listen on.")
+    parser.add_argument('--port', type=int, default=MOCK_SERVER_PORT, help="the port to listen on.")
+    parser.add_argument('--content', default=MOCK_CONTENT, help="the text of every answer.")
+    parser.add_argument('--ttfb', type=float, default=0.0, help="the seconds before the first byte.")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="the rate of the streamed tokens.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="the probability of failing a request.")
+    parser.add_argument('--error', default='500', help="the injected failure, an HTTP status or `timeout`.")
+    parser.add_argument('--seed', type=int, help="the seed of the error injection.")
+    args = parser.parse_args()
+
+    default = MockResponse(content=args.content, ttfb=args.ttfb, tokens_per_second=args.tokens_per_second)
+    error = args.error if args.error == 'timeout' else int(args.error)
+    server = MockLLMServer(args.host, args.port, default=default, error_rate=args.error_rate, error=error,
+                           seed=args.seed)
+    print(f"Mock server on {server.url} (OpenAI base url {server.openai_url})", flush=True)
+    server.serve()
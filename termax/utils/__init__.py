@@ -2,3 +2,4 @@ from .const import *
 from .config import *
 from .metadata import *
 from .qa import *
+from .files import *
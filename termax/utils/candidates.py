@@ -0,0 +1,171 @@
+import os
+import shlex
+from typing import Iterable
+
+from termax.utils.const import *
+
+# the shell builtins and keywords, they are not on $PATH.
+SHELL_BUILTINS = {
+    '.', ':', '[', '[[', 'alias', 'bg', 'bind', 'break', 'builtin', 'case', 'cd', 'command', 'continue',
+    'declare', 'dirs', 'echo', 'eval', 'exec', 'exit', 'export', 'fg', 'for', 'function', 'hash', 'history',
+    'if', 'jobs', 'kill', 'let', 'local', 'popd', 'printf', 'pushd', 'pwd', 'read', 'readonly', 'return', 'set',
+    'shift', 'source', 'test', 'times', 'trap', 'type', 'ulimit', 'umask', 'unalias', 'unset', 'until', 'wait',
+    'while', '{', '(',
+}
+# the wrappers whose argument is the program actually run, with their options taking a value.
+COMMAND_WRAPPERS = {
+    'sudo': {'-u', '-g', '-p', '-C', '-D', '-r', '-t', '-T', '-U', '-R', '--user', '--group', '--prompt',
+             '--close-from', '--chdir', '--host', '--role', '--type', '--command-timeout', '--other-user',
+             '--chroot'},
+    'env': {'-u', '-C', '--unset', '--chdir'},
+    'time': {'-f', '-o', '--format', '--output'},
+    'nice': {'-n', '--adjustment'},
+    'exec': {'-a'},
+    'nohup': set(),
+    'command': set(),
+    'builtin': set(),
+}
+SELF_INVOKING = {'t', 'termax'}
+
+
+def _takes_value(option: str, options: set):
+    """
+    _takes_value: whether an option is followed by its value, e.g. `-u` or `-iu` but not `-uroot` or `--user=root`.
+    """
+    if option.startswith('--'):
+        return option in options
+    for index, flag in enumerate(option[1:], 1):
+        if f"-{flag}" in options:
+            return index == len(option) - 1
+    return False
+
+
+def command_program(command: str):
+    """
+    command_program: the program a command runs, skipping the variable assignments and the wrappers (sudo, env...)
+    with their options, e.g. `root` is the value of `-u` in `sudo -u root ls`.
+    Args:
+        command: the shell command.
+
+    Returns: the name or path of the program, None for an empty command.
+    """
+    try:
+        tokens = shlex.split(command, comments=True)
+    except ValueError:
+        # unbalanced quotes, the first word is still a good guess.
+        tokens = command.split()
+
+    options, skip = set(), False
+    for token in tokens:
+        if skip:
+            skip = False
+            continue
+        if '=' in token and not token.startswith(('=', '/', '.')) and token.split('=', 1)[0].isidentifier():
+            continue
+        if token in COMMAND_WRAPPERS:
+            options = COMMAND_WRAPPERS[token]
+            continue
+        if token.startswith('-'):
+            skip = token != '--' and _takes_value(token, options)
+            continue
+        return token
+    return None
+
+
+def score_command(command: str, path_index=None, weights: dict = CANDIDATE_WEIGHTS,
+                  required: Iterable[str] = CANDIDATE_REQUIRED):
+    """
+    score_command: validate a candidate command locally, without running it.
+    Args:
+        command: the candidate command.
+        path_index: the index of the search path, default is the one of the process.
+        weights: the weight of each check in the score.
+        required: the checks a candidate must pass.
+
+    Returns: a dictionary with the command, its score in [0, 1], the result of each check and whether it passed.
+    """
+    command = (command or '').strip()
+    program = command_program(command) if command else None
+
+    resolvable = False
+    if program:
+        if program in SHELL_BUILTINS:
+            resolvable = True
+        elif os.sep in program:
+            resolvable = os.path.exists(os.path.expanduser(program))
+        else:
+            if path_index is None:
+                from termax.utils.path_index import get_path_index
+                path_index = get_path_index()
+            resolvable = program in path_index
+
+    checks = {
+        'non_empty': bool(command),
+        'not_self_invoking': bool(command) and program not in SELF_INVOKING,
+        'resolvable': resolvable,
+        'single_line': bool(command) and '\n' not in command,
+    }
+    return {
+        'command': command,
+        'score': round(sum(weight for name, weight in weights.items() if checks.get(name)), 4),
+        'checks': checks,
+        'passed': all(checks[name] for name in required),
+    }
+
+
+def select_candidate(candidates: Iterable, score=score_command):
+    """
+    select_candidate: pick a command among the candidates, in the order they complete.
+    The first candidate passing the checks is returned at once, the iterator is closed so the pending
+    candidates are abandoned; otherwise the best scored candidate is returned.
+    Args:
+        candidates: an iterator of candidate commands, None for a failed request.
+        score: the scoring function, see score_command().
+
+    Returns: a tuple of the command ('' if no usable command, None if all the requests failed) and the scores.
+    """
+    scores = []
+    try:
+        for candidate in candidates:
+            if candidate is None:
+                continue
+            result = score(candidate)
+            scores.append(result)
+            if result['passed']:
+                return result['command'], scores
+    finally:
+        close = getattr(candidates, 'close', None)
+        if close:
+            close()
+
+    if not scores:
+        return None, scores
+    best = max(scores, key=lambda r: r['score'])
+    return (best['command'] if best['checks']['not_self_invoking'] else ''), scores
+
+
+async def aselect_candidate(candidates, score=score_command):
+    """
+    aselect_candidate: select_candidate() for an async iterator of candidates.
+    Args:
+        candidates: an async iterator of candidate commands, None for a failed request.
+        score: the scoring function, see score_command().
+    """
+    scores = []
+    try:
+        async for candidate in candidates:
+            if candidate is None:
+                continue
+            result = score(candidate)
+            scores.append(result)
+            if result['passed']:
+                return result['command'], scores
+    finally:
+        aclose = getattr(candidates, 'aclose', None)
+        if aclose:
+            await aclose()
+
+    if not scores:
+        return None, scores
+    best = max(scores, key=lambda r: r['score'])
+    return (best['command'] if best['checks']['not_self_invoking'] else ''), scores
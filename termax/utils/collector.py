@@ -0,0 +1,72 @@
+import time
+import threading
+from typing import Dict, List, Optional
+
+from termax.utils.const import *
+
+# name -> (collector, timeout), see register_collector().
+COLLECTORS = {}
+
+
+def register_collector(name: str, timeout: float):
+    """
+    register_collector: register a function as a metadata source.
+    Args:
+        name: the name of the source, e.g. git or docker.
+        timeout: the deadline (seconds) of the source.
+    """
+
+    def decorator(func):
+        COLLECTORS[name] = (func, timeout)
+        return func
+
+    return decorator
+
+
+def run_collectors(names: List[str], timeout: Optional[float] = None) -> Dict[str, dict]:
+    """
+    run_collectors: run the metadata sources concurrently, each one within its own deadline.
+    A source that fails or misses its deadline degrades to an `unavailable` result, the others are unaffected.
+    Args:
+        names: the names of the registered sources to run.
+        timeout: overrides the deadline of every source.
+
+    Returns: a dictionary keyed by source name, with:
+        status: `ok`, `timeout` or `error`.
+        data: the collected metadata, None unless the status is `ok`.
+        error: the reason the source is unavailable.
+        elapsed_ms: the time spent in the source, or until its deadline.
+    """
+    results = {}
+    threads = {}
+    start = time.perf_counter()
+
+    def collect(holder, func):
+        try:
+            holder.update(status='ok', data=func())
+        except Exception as e:
+            holder.update(status='error', error=str(e))
+        holder['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    for name in names:
+        func, default_timeout = COLLECTORS[name]
+        holder = {'status': 'running', 'data': None, 'error': None, 'elapsed_ms': None}
+        # daemon threads: a hung source must never keep the process alive.
+        thread = threading.Thread(target=collect, args=(holder, func), name=f"termax-collector-{name}", daemon=True)
+        thread.start()
+        threads[name] = (thread, holder, default_timeout if timeout is None else timeout)
+
+    for name, (thread, holder, deadline) in threads.items():
+        thread.join(max(0.0, deadline - (time.perf_counter() - start)))
+        if thread.is_alive():
+            # the holder is left to the late thread, the caller gets its own result.
+            results[name] = {
+                'status': 'timeout',
+                'data': None,
+                'error': f"{COLLECTOR_UNAVAILABLE}: no answer within {deadline}s",
+                'elapsed_ms': round(deadline * 1000, 1)
+            }
+        else:
+            results[name] = dict(holder)
+
+    return results
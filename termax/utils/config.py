@@ -3,6 +3,7 @@ import configparser
 from pathlib import Path
 
 from termax.utils.const import *
+from termax.utils.profiler import profiled
 
 CONFIG_HOME = os.path.join(str(Path.home()), ".termax")
 CONFIG_PATH = os.path.join(CONFIG_HOME, "config")
@@ -23,6 +24,7 @@ class Config:
         self.snowflake_auth = None
         self.docker_auth = None
 
+    @profiled('config')
     def read(self):
         """
         read: read the configuration file.
@@ -14,6 +14,14 @@ COMMAND_HISTORY_COUNT = 15
 DB_PATH = 'database'
 DB_COMMAND_HISTORY = 'history'
 DB_SYS_METRICS = 'system'
+# the records of the history are evicted by value once it grows past `storage_size`, down to this share of it.
+MEMORY_STORAGE_SIZE = 2000
+MEMORY_LOW_WATER = 0.9
+MEMORY_HALF_LIFE = 30 * 24 * 3600  # seconds after which an unused record has lost half of its value.
+MEMORY_COUNT_FILE = 'memory_counts.json'  # the number of records of each collection, next to the database.
+MEMORY_TOUCH_FILE = 'memory_touches.jsonl'  # the records used since the last flush, see Memory.touch().
+MEMORY_TOUCH_FLUSH_SIZE = 64 * 1024  # bytes of pending uses after which they are written to the database.
+MEMORY_EVICT_PAGE_SIZE = 1000  # records read at a time to rank them for the eviction.
 
 # LLMs
 CONFIG_SEC_OPENAI = 'openai'
@@ -31,3 +39,136 @@ PLUGIN_SHELL_FISH = 'fish'
 
 
 PLUGIN_LIST = [PLUGIN_SHELL_ZSH, PLUGIN_SHELL_BASH, PLUGIN_SHELL_FISH]
+
+# Startup budget (milliseconds) of each CLI subcommand, measured by `python -m termax.cli.startup`.
+# The budget covers imports and argument parsing on top of a bare interpreter, the work of the command is excluded.
+STARTUP_DEFAULT_BUDGET = 100  # the startup budget (ms over a bare interpreter) of every subcommand.
+STARTUP_BUDGET = {}  # the subcommands with a budget of their own, by name (`generate` is the default command).
+# modules that no subcommand should import before it actually runs.
+STARTUP_HEAVY_MODULES = [
+    'chromadb', 'rich', 'inquirer', 'pyperclip', 'instructor', 'pydantic',
+    'openai', 'ollama', 'anthropic', 'mistralai', 'dashscope', 'qianfan', 'google.generativeai'
+]
+
+# Daemon
+DAEMON_IDLE_TIMEOUT = 1800  # seconds without a request before `termax serve` exits.
+
+# Metadata caches, stored under the config home.
+PATH_INDEX_FILE = 'path_index.json'
+SYSTEM_SNAPSHOT_FILE = 'system_metadata.json'
+# seconds within which a directory may still change in the same mtime tick, it is not trusted by the caches.
+RACY_MTIME_WINDOW = 2
+
+# Metadata collectors, the deadline (seconds) of each source.
+COLLECTOR_TIMEOUT_GIT = 2
+COLLECTOR_TIMEOUT_DOCKER = 3
+COLLECTOR_TIMEOUT_FILES = 2
+COLLECTOR_TIMEOUT_EXECUTABLES = 2
+COLLECTOR_UNAVAILABLE = 'source unavailable'
+
+# Docker
+DOCKER_SOCKET_PATH = '/var/run/docker.sock'
+DOCKER_RESULT_LIMIT = 20  # the maximum number of containers and images put in the prompt.
+
+# Directory listing
+FILE_NAME_LIMIT = 200  # up to this many entries the names are listed, a summary is used above.
+FILE_SCAN_LIMIT = 10000  # the scan of the current directory stops after this many entries.
+FILE_SUMMARY_TOP = 5  # the number of newest/largest files and extensions in the summary.
+FILE_SAMPLE_SIZE = 20  # the number of names kept as a sample of a summarized directory.
+
+# Listing cache, the summaries of the large directories, stored under the config home.
+LISTING_CACHE_FILE = 'listing_cache.json'
+LISTING_CACHE_SIZE = 32  # the number of large directories whose summary is cached.
+
+# Prompt budget (tokens) of the system prompt, by model prefix, see termax.prompt.get_prompt_budget().
+DEFAULT_PROMPT_BUDGET = 1500
+PROMPT_BUDGETS = {
+    'gpt-3.5-turbo': 2000,
+    'gpt-4': 2500,
+    'llama2': 1500,
+    'mistral': 2000,
+    'gemini': 3000,
+    'claude': 3000,
+    'qwen': 2000,
+    'ERNIE': 1500,
+}
+
+# Provider prompt caching, the hits are counted per model under the config home.
+PROMPT_CACHE_STATS_FILE = 'prompt_cache.json'
+
+# Response cache of the generated commands, stored under the config home.
+RESPONSE_CACHE_FILE = 'response_cache.db'
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # seconds before a cached command expires.
+RESPONSE_CACHE_SIZE = 1000  # the least recently used commands are evicted above this many entries.
+
+# Semantic cache: answer from the memory when a stored request is this close (chromadb distance) to the new one.
+SEMANTIC_CACHE_THRESHOLD = 0.1
+
+# Async models, the size of the thread pool running the backends without an async client.
+ASYNC_MODEL_WORKERS = 8
+
+# Hedged requests, see termax.agent.HedgedModel.
+HEDGE_DEFAULT_DELAY = 2.0  # seconds before the next provider is asked, until the primary has enough samples.
+HEDGE_QUANTILE = 0.9  # the hedge delay is this quantile of the primary latency.
+LATENCY_FILE = 'latency.json'
+LATENCY_BUCKETS = [25 * 2 ** i for i in range(12)]  # the upper bounds (ms) of the histogram buckets.
+LATENCY_MIN_SAMPLES = 10  # the samples required before the quantiles are used.
+LATENCY_MAX_SAMPLES = 1000  # the counts are halved above this many samples, so old latencies fade out.
+
+# Candidate mode, see termax.utils.candidates.score_command().
+CANDIDATE_WEIGHTS = {
+    'non_empty': 0.3,
+    'not_self_invoking': 0.3,
+    'resolvable': 0.3,  # the program (first token) is a shell builtin, on $PATH or an existing file.
+    'single_line': 0.1,
+}
+CANDIDATE_REQUIRED = ['non_empty', 'not_self_invoking', 'resolvable']  # the checks a candidate must pass.
+
+# Ollama
+OLLAMA_KEEP_ALIVE = '30m'  # how long the model stays loaded after a request, see `ollama run --keepalive`.
+OLLAMA_CONTEXT_FILE = 'ollama_context.json'
+OLLAMA_CONTEXT_CACHE_SIZE = 16  # the evaluated prompt prefixes kept for reuse.
+
+# Rate limits
+RATE_LIMIT_DIR = 'ratelimit'
+RATE_LIMITS = {  # the default requests and tokens per minute of each provider, 0 is unlimited.
+    CONFIG_SEC_OPENAI: (0, 0),
+    CONFIG_SEC_CLAUDE: (0, 0),
+    CONFIG_SEC_GEMINI: (0, 0),
+    CONFIG_SEC_MISTRAL: (0, 0),
+    CONFIG_SEC_QIANFAN: (0, 0),
+    CONFIG_SEC_QIANWEN: (0, 0),
+}
+RATE_LIMIT_RETRIES = 4  # the retries of a rate limited request.
+RATE_LIMIT_BACKOFF = 1.0  # the base (seconds) of the exponential backoff.
+RATE_LIMIT_MAX_BACKOFF = 30.0  # the maximum wait (seconds) before a retry.
+
+# Batch
+BATCH_CONCURRENCY = 8  # the requests of `termax batch` translated at the same time.
+
+# Profiling
+PROFILE_FILE = 'profile.jsonl'  # the history of the profiled runs, aggregated by `termax profile report`.
+PROFILE_MAX_BYTES = 2 * 1024 * 1024  # the older half of the history is dropped above this size.
+PROFILE_QUANTILES = (0.5, 0.95, 0.99)
+
+# Usage accounting
+USAGE_LEDGER_FILE = 'usage.jsonl'  # one line per request: tokens, cost and cache savings.
+USAGE_SPEND_FILE = 'spend.json'  # the spend of the last days, read by the daily spend cap.
+USAGE_PRICES_FILE = 'prices.json'  # optional overrides of the price tables, same layout as PRICES.
+USAGE_SPEND_DAYS = 7
+SPEND_CAP_ACTIONS = ('refuse', 'downgrade')
+
+# Mock LLM server, see termax.testing.MockLLMServer.
+MOCK_SERVER_HOST = '127.0.0.1'
+MOCK_SERVER_PORT = 11435
+MOCK_SERVER_TIMEOUT = 60  # seconds a `timeout` failure holds the connection.
+MOCK_CONTENT = "Commands: ls -la\n"
+
+# Benchmarks, see termax.benchmarks.
+BENCH_REPEAT = 5
+BENCH_BASELINE_FILE = 'bench_baseline.json'
+BENCH_REGRESSION_THRESHOLD = 0.2  # a case is reported as a regression above this relative slowdown.
+
+# Function calling, see termax.function.FunctionRegistry.
+FUNCTION_ENTRY_POINT_GROUP = 'termax.functions'
+FUNCTION_SCHEMA_CACHE_FILE = 'function_schemas.json'
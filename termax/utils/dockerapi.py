@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import socket
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from urllib.parse import urlencode
+from typing import List, Optional
+
+from termax.utils.const import *
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        """
+        HTTP over a Unix domain socket, as spoken by the Docker Engine.
+        Args:
+            socket_path: the path of the socket.
+            timeout: the timeout of the socket operations.
+        """
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+    def set_timeout(self, timeout: float):
+        """
+        set_timeout: the timeout of the next socket operations, a kept-alive socket included.
+        """
+        self.timeout = timeout
+        if self.sock is not None:
+            self.sock.settimeout(timeout)
+
+
+def get_docker_socket_path():
+    """
+    get_docker_socket_path: the socket of the Docker Engine, honouring a unix:// DOCKER_HOST.
+    """
+    docker_host = os.environ.get('DOCKER_HOST', '')
+    if docker_host.startswith('unix://'):
+        return docker_host[len('unix://'):]
+    return DOCKER_SOCKET_PATH
+
+
+def _format_size(size: int):
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if size < 1000:
+            return f"{size:.3g}{unit}"
+        size /= 1000
+    return f"{size:.3g}TB"
+
+
+def _format_created(timestamp: int):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _format_ports(ports: list):
+    formatted = []
+    for port in ports or []:
+        if port.get('PublicPort'):
+            formatted.append(f"{port.get('IP', '')}:{port['PublicPort']}->{port['PrivatePort']}/{port['Type']}")
+        else:
+            formatted.append(f"{port['PrivatePort']}/{port['Type']}")
+    return ", ".join(formatted)
+
+
+class DockerClient:
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = COLLECTOR_TIMEOUT_DOCKER):
+        """
+        A minimal Docker Engine API client, the connection is kept alive between the requests.
+        Args:
+            socket_path: the path of the Docker socket, defaults to DOCKER_HOST or /var/run/docker.sock.
+            timeout: the timeout of each request, waiting for the shared connection included.
+        """
+        self.socket_path = socket_path or get_docker_socket_path()
+        self.timeout = timeout
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def get(self, path: str, params: Optional[dict] = None):
+        """
+        get: send a GET request to the engine.
+        Args:
+            path: the path of the endpoint.
+            params: the query parameters.
+
+        Returns: the decoded JSON response.
+        """
+        url = f"{path}?{urlencode(params)}" if params else path
+        deadline = time.monotonic() + self.timeout
+        # the requests share the connection: a request stuck on the engine holds the lock until its socket times
+        # out, the others give up after their own timeout instead of queueing behind it.
+        if not self.lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Docker API request {path} timed out waiting for the connection")
+        try:
+            # a kept-alive connection may have been closed by the engine in the meantime, retry once on a new one.
+            for attempt in range(2):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Docker API request {path} timed out")
+                if self.connection is None:
+                    self.connection = UnixHTTPConnection(self.socket_path, remaining)
+                else:
+                    self.connection.set_timeout(remaining)
+                try:
+                    self.connection.request('GET', url, headers={'Host': 'docker'})
+                    response = self.connection.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    self.close()
+                    if attempt == 1:
+                        raise
+                except Exception:
+                    # a timeout included: the engine may still answer on this connection, it cannot be reused.
+                    self.close()
+                    raise
+        finally:
+            self.lock.release()
+
+        if response.status != 200:
+            raise Exception(f"Docker API error {response.status}: {body.decode('utf-8', 'replace')}")
+        return json.loads(body)
+
+    def containers(self, limit: int = DOCKER_RESULT_LIMIT, labels: Optional[List[str]] = None):
+        """
+        containers: the running containers, filtered by the engine.
+        Args:
+            limit: the maximum number of containers.
+            labels: only the containers with these labels (`key` or `key=value`).
+        """
+        filters = {'status': ['running']}
+        if labels:
+            filters['label'] = labels
+        # size=false: computing the container sizes is the expensive part of this endpoint.
+        containers = self.get('/containers/json', {'limit': limit, 'size': 'false', 'filters': json.dumps(filters)})
+        return [
+            {
+                'CONTAINER ID': c['Id'][:12],
+                'IMAGE': c.get('Image', ''),
+                'COMMAND': c.get('Command', ''),
+                'CREATED': _format_created(c.get('Created', 0)),
+                'STATUS': c.get('Status', ''),
+                'NAMES': ",".join(name.lstrip('/') for name in c.get('Names') or []),
+                'PORTS': _format_ports(c.get('Ports'))
+            }
+            for c in containers[:limit]
+        ]
+
+    def images(self, limit: int = DOCKER_RESULT_LIMIT, labels: Optional[List[str]] = None):
+        """
+        images: the tagged images, filtered by the engine.
+        Args:
+            limit: the maximum number of images, the engine has no limit for this endpoint.
+            labels: only the images with these labels (`key` or `key=value`).
+        """
+        filters = {'dangling': ['false']}
+        if labels:
+            filters['label'] = labels
+        images = self.get('/images/json', {'filters': json.dumps(filters)})
+        # the engine returns them unsorted, keep the most recent ones like `docker images`.
+        images.sort(key=lambda i: i.get('Created', 0), reverse=True)
+
+        results = []
+        for image in images[:limit]:
+            repository, _, tag = ((image.get('RepoTags') or ['<none>:<none>'])[0]).rpartition(':')
+            results.append({
+                'REPOSITORY': repository,
+                'TAG': tag,
+                'IMAGE ID': image['Id'].split(':')[-1][:12],
+                'CREATED': _format_created(image.get('Created', 0)),
+                'SIZE': _format_size(image.get('Size', 0))
+            })
+        return results
+
+    def close(self):
+        """
+        close: close the kept-alive connection.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def get_docker_metadata_from_cli(limit: int = DOCKER_RESULT_LIMIT, labels: Optional[List[str]] = None):
+    """
+    get_docker_metadata_from_cli: the fallback when the engine socket is not reachable, e.g. a remote DOCKER_HOST.
+    The CLI output is requested as JSON, one document per line.
+    """
+
+    def run_command(command):
+        result = subprocess.run(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False,
+            timeout=COLLECTOR_TIMEOUT_DOCKER
+        )
+        if result.returncode != 0:
+            raise Exception("Docker command failed: " + result.stderr)
+        return [json.loads(line) for line in result.stdout.splitlines() if line.strip()][:limit]
+
+    label_filters = [arg for label in labels or [] for arg in ('--filter', f"label={label}")]
+    containers = run_command(
+        ["docker", "ps", "--filter", "status=running", *label_filters, "--format", "{{json .}}"]
+    )
+    images = run_command(["docker", "images", "--filter", "dangling=false", *label_filters, "--format", "{{json .}}"])
+
+    return {
+        "docker_containers": [
+            {
+                'CONTAINER ID': c.get('ID', ''),
+                'IMAGE': c.get('Image', ''),
+                'COMMAND': c.get('Command', ''),
+                'CREATED': c.get('CreatedAt', ''),
+                'STATUS': c.get('Status', ''),
+                'NAMES': c.get('Names', ''),
+                'PORTS': c.get('Ports', '')
+            }
+            for c in containers
+        ],
+        "docker_images": [
+            {
+                'REPOSITORY': i.get('Repository', ''),
+                'TAG': i.get('Tag', ''),
+                'IMAGE ID': i.get('ID', ''),
+                'CREATED': i.get('CreatedAt', ''),
+                'SIZE': i.get('Size', '')
+            }
+            for i in images
+        ],
+    }
+
+
+_docker_client = None
+
+
+def get_docker_client():
+    """
+    get_docker_client: the Docker client shared by the current process, so the daemon reuses its connection.
+    """
+    global _docker_client
+    if _docker_client is None:
+        _docker_client = DockerClient()
+    return _docker_client
@@ -0,0 +1,41 @@
+import os
+import json
+import tempfile
+
+
+def atomic_write_text(path: str, text: str):
+    """
+    atomic_write_text: replace a file with the text, the readers see the old file or the new one, never a
+    partial write. The temporary file is unique (a thread or a process writing the same file has its own),
+    and in the directory of the file so the final rename does not cross file systems.
+    Args:
+        path: the path of the file, its directory is created if needed.
+        text: the content of the file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix=f".{os.path.basename(path)}.",
+                                     suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            f.write(text)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path: str, data, indent=None):
+    """
+    atomic_write_json: replace a file with the JSON document of the data, see atomic_write_text().
+    Args:
+        path: the path of the file.
+        data: the object to serialize.
+        indent: the indent of the document, None for a compact one.
+    """
+    atomic_write_text(path, json.dumps(data, indent=indent))
@@ -0,0 +1,179 @@
+import os
+import re
+import zlib
+from typing import Dict, Optional, Tuple
+
+# refs that belong to a single worktree, the other refs are shared through the common directory.
+_WORKTREE_REFS = ('HEAD', 'refs/bisect/', 'refs/worktree/', 'refs/rewritten/')
+_SECTION_REGEX = re.compile(r'^\[\s*([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+_AUTHOR_REGEX = re.compile(r'^(.*) <[^>]*> (\d+) [+-]\d{4}$')
+
+
+def _read_file(path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def find_repository(start: Optional[str] = None):
+    """
+    find_repository: find the git repository containing a directory.
+    Handles subdirectories of the work tree, `.git` files (worktrees, submodules) and the common directory
+    shared by linked worktrees.
+    Args:
+        start: the directory to start from, defaults to the current directory.
+
+    Returns: a tuple of (git_dir, common_dir, work_tree), None if the directory is not in a repository.
+    """
+    directory = os.path.abspath(start or os.getcwd())
+    while True:
+        dot_git = os.path.join(directory, '.git')
+        git_dir = None
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+        elif os.path.isfile(dot_git):
+            content = _read_file(dot_git) or ''
+            if content.startswith('gitdir:'):
+                git_dir = os.path.normpath(os.path.join(directory, content[len('gitdir:'):].strip()))
+
+        if git_dir and os.path.isfile(os.path.join(git_dir, 'HEAD')):
+            common_dir = git_dir
+            commondir = _read_file(os.path.join(git_dir, 'commondir'))
+            if commondir:
+                common_dir = os.path.normpath(os.path.join(git_dir, commondir))
+            return git_dir, common_dir, directory
+
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def read_packed_refs(common_dir: str) -> Dict[str, str]:
+    """
+    read_packed_refs: read the refs packed by `git pack-refs` or `git gc`.
+    Returns: a dictionary of ref name to sha.
+    """
+    refs = {}
+    try:
+        with open(os.path.join(common_dir, 'packed-refs'), 'r', encoding='utf-8') as f:
+            for line in f:
+                # skip the header and the peeled tags (^sha).
+                if line.startswith('#') or line.startswith('^'):
+                    continue
+                parts = line.split()
+                if len(parts) == 2:
+                    refs[parts[1]] = parts[0]
+    except OSError:
+        pass
+    return refs
+
+
+def resolve_ref(git_dir: str, common_dir: str, ref: str, depth: int = 5) -> Optional[str]:
+    """
+    resolve_ref: resolve a (possibly symbolic) ref to a sha, through loose and packed refs.
+    Args:
+        git_dir: the git directory of the worktree.
+        common_dir: the common git directory.
+        ref: the ref to resolve, e.g. HEAD or refs/heads/main.
+        depth: the maximum number of symbolic refs to follow.
+
+    Returns: the sha, None for an unborn branch.
+    """
+    if depth < 0:
+        return None
+    base = git_dir if ref.startswith(_WORKTREE_REFS) else common_dir
+    content = _read_file(os.path.join(base, ref))
+    if content is None:
+        return read_packed_refs(common_dir).get(ref)
+    if content.startswith('ref:'):
+        return resolve_ref(git_dir, common_dir, content[len('ref:'):].strip(), depth - 1)
+    return content
+
+
+def read_head(git_dir: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    read_head: read the HEAD of a worktree.
+    Returns: a tuple of (symbolic ref, sha), the ref is None for a detached HEAD.
+    """
+    content = _read_file(os.path.join(git_dir, 'HEAD')) or ''
+    if content.startswith('ref:'):
+        return content[len('ref:'):].strip(), None
+    return None, content or None
+
+
+def read_remotes(common_dir: str) -> Dict[str, dict]:
+    """
+    read_remotes: parse the remotes from the repository configuration.
+    Returns: a dictionary of remote name to its fetch and push urls.
+    """
+    remotes = {}
+    try:
+        with open(os.path.join(common_dir, 'config'), 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+    except (OSError, UnicodeDecodeError):
+        return remotes
+
+    remote = None
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in '#;':
+            continue
+        match = _SECTION_REGEX.match(line)
+        if match:
+            section, subsection = match.group(1).lower(), match.group(2)
+            # both `[remote "origin"]` and the deprecated `[remote.origin]` syntax.
+            if section == 'remote' and subsection is not None:
+                remote = subsection
+            elif section.startswith('remote.'):
+                remote = match.group(1)[len('remote.'):]
+            else:
+                remote = None
+            if remote is not None:
+                remotes.setdefault(remote, {'url': '', 'pushurl': ''})
+            continue
+
+        if remote is None or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        key, value = key.strip().lower(), value.strip().strip('"')
+        # the first url is the one used for fetching.
+        if key in ('url', 'pushurl') and not remotes[remote][key]:
+            remotes[remote][key] = value
+
+    return {
+        name: {'fetch_url': urls['url'], 'push_url': urls['pushurl'] or urls['url']}
+        for name, urls in remotes.items()
+    }
+
+
+def read_commit(common_dir: str, sha: str) -> Optional[dict]:
+    """
+    read_commit: read a commit from the loose objects of the repository.
+    Args:
+        common_dir: the common git directory.
+        sha: the sha of the commit.
+
+    Returns: a dictionary with the author, timestamp and message of the commit,
+        None if the commit is only available in a packfile.
+    """
+    try:
+        with open(os.path.join(common_dir, 'objects', sha[:2], sha[2:]), 'rb') as f:
+            raw = zlib.decompress(f.read())
+    except (OSError, zlib.error):
+        return None
+
+    header, _, body = raw.partition(b'\x00')
+    if not header.startswith(b'commit '):
+        return None
+
+    # the headers end at the first empty line, multi-line headers (gpgsig) continue with a leading space.
+    headers, _, message = body.decode('utf-8', 'replace').partition('\n\n')
+    for line in headers.split('\n'):
+        if line.startswith('author '):
+            match = _AUTHOR_REGEX.match(line[len('author '):])
+            if match:
+                return {'author': match.group(1), 'timestamp': int(match.group(2)), 'message': message.strip()}
+    return None
@@ -0,0 +1,87 @@
+import os
+import json
+from typing import Optional
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+
+class LatencyHistogram:
+    def __init__(self, histogram_path: str = os.path.join(CONFIG_HOME, LATENCY_FILE)):
+        """
+        LatencyHistogram: the latency histogram of each provider, kept across the runs.
+        The buckets grow exponentially from LATENCY_BUCKETS, the last one counts everything above.
+        Args:
+            histogram_path: the path of the histogram file.
+        """
+        self.histogram_path = histogram_path
+        self.histograms = {}
+        self.load()
+
+    def load(self):
+        """
+        load: load the histograms, a histogram with a different bucket layout is discarded.
+        """
+        try:
+            with open(self.histogram_path, 'r', encoding='utf-8') as f:
+                histograms = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.histograms = {
+            key: counts for key, counts in histograms.items() if len(counts) == len(LATENCY_BUCKETS) + 1
+        }
+
+    def save(self):
+        """
+        save: write the histograms atomically.
+        """
+        try:
+            atomic_write_json(self.histogram_path, self.histograms)
+        except OSError:
+            pass
+
+    def record(self, key: str, seconds: float, save: bool = True):
+        """
+        record: count a latency.
+        Args:
+            key: the provider, `platform/model`.
+            seconds: the latency of the request.
+            save: write the histograms to disk.
+        """
+        counts = self.histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 1))
+        milliseconds = seconds * 1000
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if milliseconds <= bound), len(LATENCY_BUCKETS))
+        counts[index] += 1
+        if sum(counts) > LATENCY_MAX_SAMPLES:
+            self.histograms[key] = [count // 2 for count in counts]
+        if save:
+            self.save()
+
+    def count(self, key: str):
+        """
+        count: the number of samples of a provider.
+        """
+        return sum(self.histograms.get(key, []))
+
+    def quantile(self, key: str, q: float) -> Optional[float]:
+        """
+        quantile: the latency (seconds) under which a fraction of the requests of a provider completed.
+        Args:
+            key: the provider, `platform/model`.
+            q: the fraction, e.g. 0.9 for the p90.
+
+        Returns: the upper bound of the bucket holding the quantile, None without enough samples.
+        """
+        counts = self.histograms.get(key)
+        total = sum(counts or [])
+        if total < LATENCY_MIN_SAMPLES:
+            return None
+
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= q * total:
+                # the overflow bucket has no upper bound, use the largest one.
+                return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)] / 1000
+        return LATENCY_BUCKETS[-1] / 1000
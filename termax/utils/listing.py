@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import heapq
+from collections import Counter
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+
+def _sample(names: list, size: int):
+    """
+    _sample: an evenly spread, deterministic sample of the sorted names.
+    """
+    names = sorted(names)
+    if len(names) <= size:
+        return names
+    step = len(names) / size
+    return [names[int(i * step)] for i in range(size)]
+
+
+def scan_listing(directory: str, name_limit: int = FILE_NAME_LIMIT, scan_limit: int = FILE_SCAN_LIMIT,
+                 top: int = FILE_SUMMARY_TOP, sample_size: int = FILE_SAMPLE_SIZE):
+    """
+    scan_listing: list a directory, summarizing it when it has more than `name_limit` entries.
+    The file types come from the d_type of the entries, files are only stat'ed to build a summary.
+    Args:
+        directory: the directory to list.
+        name_limit: the maximum number of entries listed by name.
+        scan_limit: the scan stops after this many entries, the summary then describes the scanned part.
+        top: the number of extensions and newest/largest files in the summary.
+        sample_size: the number of names kept, across all kinds, when the directory is summarized.
+
+    Returns: the file metadata, see get_file_metadata().
+    """
+    result = {
+        "directory": [],
+        "files": [],
+        "invisible_files": [],
+        "invisible_directory": [],
+        "summary": None
+    }
+    files = []
+    scanned = 0
+    truncated = False
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if scanned >= scan_limit:
+                truncated = True
+                break
+            scanned += 1
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if entry.name.startswith('.'):
+                result["invisible_directory" if is_dir else "invisible_files"].append(entry.name)
+            else:
+                result["directory" if is_dir else "files"].append(entry.name)
+            if not is_dir:
+                files.append(entry)
+
+    if scanned <= name_limit:
+        del result["summary"]
+        return result
+
+    # too many entries for the prompt: keep a sample of each kind and describe the rest.
+    extensions = Counter(os.path.splitext(entry.name)[1].lower() or '<none>' for entry in files)
+    stats = []
+    for entry in files:
+        try:
+            stat = entry.stat()
+            stats.append((entry.name, stat.st_mtime, stat.st_size))
+        except OSError:
+            continue
+
+    total = sum(len(result[key]) for key in ("directory", "files", "invisible_files", "invisible_directory"))
+    for key in ("directory", "files", "invisible_files", "invisible_directory"):
+        result[key] = _sample(result[key], max(1, sample_size * len(result[key]) // total))
+
+    result["summary"] = {
+        "entries": f"more than {scanned}" if truncated else scanned,
+        "files": len(files),
+        "extensions": dict(extensions.most_common(top)),
+        "newest": [name for name, _, _ in heapq.nlargest(top, stats, key=lambda s: s[1])],
+        "largest": [f"{name} ({size} bytes)" for name, _, size in heapq.nlargest(top, stats, key=lambda s: s[2])],
+    }
+    return result
+
+
+def load_listing_cache(cache_path: str):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_listing_cache(cache_path: str, cache: dict):
+    atomic_write_json(cache_path, cache)
+
+
+def get_listing(directory: str, incremental: bool = True,
+                cache_path: str = os.path.join(CONFIG_HOME, LISTING_CACHE_FILE), **kwargs):
+    """
+    get_listing: list a directory, reusing the previous listing of a large directory whose mtime is unchanged.
+    Only summarized (large) listings are cached, small directories are cheaper to list than to look up.
+    Args:
+        directory: the directory to list.
+        incremental: reuse the cached listing when possible.
+        cache_path: the path of the on-disk cache.
+        kwargs: the limits passed to scan_listing().
+    """
+    directory = os.path.abspath(directory)
+    if not incremental:
+        return scan_listing(directory, **kwargs)
+
+    mtime = os.stat(directory).st_mtime_ns
+    cache = load_listing_cache(cache_path)
+    cached = cache.get(directory)
+    if cached is not None and cached['mtime'] == mtime:
+        return cached['listing']
+
+    listing = scan_listing(directory, **kwargs)
+    if listing.get("summary") and time.time() - mtime / 1e9 > RACY_MTIME_WINDOW:
+        cache.pop(directory, None)
+        cache[directory] = {'mtime': mtime, 'listing': listing}
+        # keep the most recently listed directories, dictionaries preserve the insertion order.
+        for stale in list(cache)[:-LISTING_CACHE_SIZE]:
+            del cache[stale]
+        try:
+            save_listing_cache(cache_path, cache)
+        except OSError:
+            pass
+    return listing
+
+
+def describe_file_summary(files: dict):
+    """
+    describe_file_summary: a one line description of a summarized listing, empty for a complete listing.
+    """
+    summary = files.get("summary")
+    if not summary:
+        return ""
+    return (
+        f"{summary['entries']} entries ({summary['files']} files, the names above are a sample), "
+        f"most common extensions: {summary['extensions']}, newest files: {summary['newest']}, "
+        f"largest files: {summary['largest']}"
+    )
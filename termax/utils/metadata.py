@@ -1,236 +1,159 @@
 import re
 import os
 import sys
-import psutil
-import socket
 import shutil
 import getpass
 import platform
 import subprocess
-from datetime import datetime
+from datetime import datetime, timezone
 
+from termax.utils.const import *
+from termax.utils.collector import register_collector
 
+
+@register_collector('git', timeout=COLLECTOR_TIMEOUT_GIT)
 def get_git_metadata():
     """
     get_git_metadata: Records the git information on the current workspace.
+    The repository files are read directly, git itself only runs for commits stored in a packfile.
     Returns: a dictionary of git metadata.
 
     """
+    from .gitreader import find_repository, read_head, resolve_ref, read_remotes, read_commit
+
+    metadata = {
+        "git_sha": "",
+        "git_current_branch": "",
+        "git_remotes": [],
+        "git_latest_commit_author": "",
+        "git_latest_commit_date": "",
+        "git_latest_commit_message": ""
+    }
 
-    def run_git_command(command):
-        """
-        Run a git command and return the output.
-        Args:
-            command: the git command to run.
-
-        Returns: the output of the git command.
+    # Check whether the directory belongs to a git repository
+    repository = find_repository()
+    if repository is None:
+        return metadata
+    git_dir, common_dir, work_tree = repository
+
+    # Get current branch name, `HEAD` when detached like `git rev-parse --abbrev-ref HEAD`
+    head_ref, head_sha = read_head(git_dir)
+    if head_ref is not None:
+        metadata["git_current_branch"] = head_ref[len('refs/heads/'):] \
+            if head_ref.startswith('refs/heads/') else head_ref
+        head_sha = resolve_ref(git_dir, common_dir, head_ref)
+    else:
+        metadata["git_current_branch"] = "HEAD"
 
-        """
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, shell=True)
+    # Get remotes
+    metadata["git_remotes"] = [
+        {"remote_name": name, "fetch_url": urls['fetch_url'], "push_url": urls['push_url']}
+        for name, urls in read_remotes(common_dir).items()
+    ]
+
+    # an unborn branch has no commit yet.
+    if not head_sha:
+        return metadata
+
+    # Get latest commit
+    commit = read_commit(common_dir, head_sha)
+    if commit is None:
+        result = subprocess.run(
+            ["git", "log", "-1", "--pretty=%an%x00%ct%x00%B", head_sha], cwd=work_tree,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=COLLECTOR_TIMEOUT_GIT
+        )
         if result.returncode != 0:
             raise Exception(f"Git command failed: {result.stderr}")
-        return result.stdout.strip()
-
-    # Check whether the directory is initialized with git
-    if run_git_command("[ -d .git ] && echo 1 || echo 0") == "0":
-        return {
-            "git_sha": "",
-            "git_current_branch": "",
-            "git_remotes": [],
-            "git_latest_commit_author": "",
-            "git_latest_commit_date": "",
-            "git_latest_commit_message": ""
-        }
+        author, timestamp, message = result.stdout.split('\x00', 2)
+        commit = {'author': author, 'timestamp': int(timestamp), 'message': message.strip()}
 
-    # Get latest commit hash
-    latest_commit_hash = run_git_command("git rev-parse HEAD")
-    latest_commit_author = run_git_command("git log -1 --pretty=%an")
-    latest_commit_message = run_git_command("git log -1 --pretty=%B")
-    latest_commit_timestamp = run_git_command("git log -1 --pretty=%ct")
-    latest_commit_date = datetime.utcfromtimestamp(int(latest_commit_timestamp)).strftime('%Y-%m-%d %H:%M:%S UTC')
+    metadata.update({
+        "git_sha": head_sha,
+        "git_latest_commit_author": commit['author'],
+        "git_latest_commit_date": datetime.fromtimestamp(
+            commit['timestamp'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC'),
+        "git_latest_commit_message": commit['message']
+    })
+    return metadata
 
-    # Get current branch name
-    current_branch = run_git_command("git rev-parse --abbrev-ref HEAD")
 
-    # Get remotes
-    remotes_raw = run_git_command("git remote -v")
-    remotes = {}
-    for line in remotes_raw.split('\n'):
-        if line:
-            name, url, typ = line.split()
-            if name not in remotes:
-                remotes[name] = {'fetchUrl': '', 'pushUrl': ''}
-            if typ == '(fetch)':
-                remotes[name]['fetchUrl'] = url
-            elif typ == '(push)':
-                remotes[name]['pushUrl'] = url
-
-    remote_list = []
-    for name, urls in remotes.items():
-        remote_list.append(
-            {
-                "remote_name": name,
-                "fetch_url": urls['fetchUrl'],
-                "push_url": urls['pushUrl']
-            }
-        )
-
-    return {
-        "git_sha": latest_commit_hash,
-        "git_current_branch": current_branch,
-        "git_remotes": remote_list,
-        "git_latest_commit_author": latest_commit_author,
-        "git_latest_commit_date": latest_commit_date,
-        "git_latest_commit_message": latest_commit_message
-    }
+@register_collector('docker', timeout=COLLECTOR_TIMEOUT_DOCKER)
+def get_docker_metadata(limit: int = DOCKER_RESULT_LIMIT, labels: list = None):
+    """
+    Records the running Docker containers and the images of the current workspace.
+    The Docker Engine API is queried over its Unix socket, the docker CLI is the fallback.
 
+    Args:
+        limit: the maximum number of containers and images.
+        labels: only the containers and images with these labels (`key` or `key=value`).
 
-def get_docker_metadata():
-    """
-    Records the Docker containers and images information of the current workspace.
-    
     Returns:
         A dictionary with Docker containers and images metadata.
     """
+    from .dockerapi import get_docker_client, get_docker_metadata_from_cli
 
-    def parse_docker_output(output, headers):
-        """
-        Parses the output of a Docker command into a list of dictionaries based on provided headers.
-        
-        Args:
-            output: String output from Docker command.
-            headers: List of headers that correspond to Docker output columns.
-            
-        Returns:
-            List of dictionaries with Docker data.
-        """
-        entries = []
-        for line in output.strip().split('\n')[1:]:
-            parts = re.split(r'\s{2,}', line)
-            entry = {header: parts[i] if i < len(parts) else "" for i, header in enumerate(headers)}
-            entries.append(entry)
-        return entries
-
-    def run_command(command):
-        """
-        Executes a shell command and returns the output.
-        
-        Args:
-            command: List of command arguments.
-        
-        Returns:
-            A tuple of (success flag, output or error message).
-        """
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            raise Exception("Docker command failed: " + e.stderr)
-
-    containers_info = run_command(
-        [
-            "docker", "ps", "-a", "--format",
-            "table {{.ID}}\t{{.Image}}\t{{.Command}}\t{{.CreatedAt}}\t{{.Status}}\t{{.Names}}\t{{.Ports}}"
-        ]
-    )
-    containers_headers = ['CONTAINER ID', 'IMAGE', 'COMMAND', 'CREATED', 'STATUS', 'NAMES', 'PORTS']
-    containers = parse_docker_output(containers_info, containers_headers)
-
-    images_info = run_command(["docker", "images"])
-    images_headers = ['REPOSITORY', 'TAG', 'IMAGE ID', 'CREATED', 'SIZE']
-    images = parse_docker_output(images_info, images_headers)
-
-    # docker_info = run_command(["docker", "info"])
-    # docker_headers = []
-    # docker = parse_docker_output(docker_info, docker_headers)
-
-    return {
-        # "docker_info": docker_info,
-        "docker_containers": containers,
-        "docker_images": images,
-    }
+    client = get_docker_client()
+    try:
+        return {
+            "docker_containers": client.containers(limit=limit, labels=labels),
+            "docker_images": client.images(limit=limit, labels=labels),
+        }
+    except (FileNotFoundError, PermissionError, ConnectionRefusedError):
+        # no local engine socket, or no permission to use it.
+        return get_docker_metadata_from_cli(limit=limit, labels=labels)
 
 
 def get_system_metadata():
     """
     Records the system information.
+    Every field is probed again, the prompts read the cached snapshot instead, see get_system_snapshot().
 
     Return a dictionary containing the system metadata.
     """
-    return {
-        'platform': platform.system(),
-        'platform_release': platform.release(),
-        'platform_version': platform.version(),
-        'architecture': platform.machine(),
-        'hostname': socket.gethostname(),
-        'ip_address': socket.gethostbyname(socket.gethostname()),
-        'physical_cores': psutil.cpu_count(logical=False),
-        'total_cores': psutil.cpu_count(logical=True),
-        'ram_total': round(psutil.virtual_memory().total / (1024.0 ** 3)),
-        'ram_available': round(psutil.virtual_memory().available / (1024.0 ** 3)),
-        'ram_used_percent': psutil.virtual_memory().percent
-    }
+    from .snapshot import probe_system_metadata
+    return probe_system_metadata()
 
 
 def get_path_metadata():
     """
     Records the path information.
+    The executables on $PATH are expensive to list, see get_executable_commands().
 
     Return a dictionary containing the path metadata.
     """
-    # List all executable commands by scanning the PATH directories
-    paths = os.environ['PATH'].split(os.pathsep)
-    commands = set()
-    for path in paths:
-        if os.path.exists(path):
-            try:
-                for item in os.listdir(path):
-                    item_path = os.path.join(path, item)
-                    if os.path.isfile(item_path) and os.access(item_path, os.X_OK):
-                        commands.add(item)
-            except PermissionError:
-                # This can happen if we don't have permission to list the contents of the directory
-                continue
-
     return {
-        "user": os.getlogin(),
+        "user": getpass.getuser(),
         "current_directory": os.getcwd(),
-        "home_directory": os.path.expanduser("~"),
-        "executable_commands": sorted(list(commands))
+        "home_directory": os.path.expanduser("~")
     }
 
 
-def get_file_metadata():
+@register_collector('executables', timeout=COLLECTOR_TIMEOUT_EXECUTABLES)
+def get_executable_commands():
     """
-    get_file_metadata: Records the file information in the current directory.
+    get_executable_commands: Records the executable commands on $PATH, served from the on-disk PATH index.
+
+    Return a sorted list of the executable names.
     """
-    result = {
-        "directory": [],
-        "files": [],
-        "invisible_files": [],
-        "invisible_directory": []
-    }
+    from .path_index import get_path_index
+    return get_path_index().commands()
 
-    # Get the current directory
-    current_directory = os.getcwd()
-
-    # List all files and directories in the current directory
-    for item in os.listdir(current_directory):
-        # Build the full path of the item
-        item_path = os.path.join(current_directory, item)
-        # Check if the item is invisible (hidden)
-        if item.startswith('.'):
-            if os.path.isdir(item_path):
-                result["invisible_directory"].append(item)
-            else:
-                result["invisible_files"].append(item)
-        else:
-            if os.path.isdir(item_path):
-                result["directory"].append(item)
-            else:
-                result["files"].append(item)
 
-    return result
+@register_collector('files', timeout=COLLECTOR_TIMEOUT_FILES)
+def get_file_metadata(path: str = None, incremental: bool = True):
+    """
+    get_file_metadata: Records the file information in the current directory.
+    Large directories are summarized, see termax.utils.listing.scan_listing().
+
+    Args:
+        path: the directory to list, defaults to the current directory.
+        incremental: reuse the previous listing of a large directory if its mtime is unchanged.
+
+    Returns: a dictionary with the (visible and invisible) files and directories, and a `summary` when the
+        directory has too many entries to list by name.
+    """
+    from .listing import get_listing
+    return get_listing(path or os.getcwd(), incremental=incremental)
 
 
 def get_python_metadata():
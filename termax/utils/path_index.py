@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import bisect
+from typing import Dict, List, Optional
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+
+def _is_executable(entry: os.DirEntry):
+    """
+    _is_executable: check whether a directory entry is an executable file.
+    `is_file` relies on the d_type of the entry, so only symlinks cost an extra stat.
+    """
+    try:
+        if not entry.is_file():
+            return False
+        if os.name == 'nt':
+            return os.path.splitext(entry.name)[1].upper() in os.environ.get('PATHEXT', '.EXE').upper().split(';')
+        # the stat result is cached on the entry.
+        return bool(entry.stat().st_mode & 0o111)
+    except OSError:
+        return False
+
+
+def scan_directory(directory: str):
+    """
+    scan_directory: list the executables of a single directory.
+    Args:
+        directory: the directory to scan.
+
+    Returns: a sorted list of executable names.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(entry.name for entry in entries if _is_executable(entry))
+    except OSError:
+        # missing directories or directories we do not have permission to list.
+        return []
+
+
+class PathIndex:
+    def __init__(self, index_path: str = os.path.join(CONFIG_HOME, PATH_INDEX_FILE), path: Optional[str] = None):
+        """
+        PathIndex: the executables available on $PATH, persisted on disk.
+        Each directory is stored with its mtime and is only rescanned once the mtime has changed.
+        Args:
+            index_path: the path of the on-disk index.
+            path: the search path, defaults to $PATH.
+        """
+        self.index_path = index_path
+        self.search_path = os.environ.get('PATH', '') if path is None else path
+        # keep the order of the search path, it decides which executable wins.
+        self.directories = list(dict.fromkeys(d for d in self.search_path.split(os.pathsep) if d))
+
+        self.entries: Dict[str, dict] = {}
+        self._commands: Optional[List[str]] = None
+        self.load()
+
+    def load(self):
+        """
+        load: load the index from the disk, a missing or corrupted index is simply rebuilt.
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """
+        save: write the index atomically, concurrent shells never read a partial file.
+        """
+        atomic_write_json(self.index_path, self.entries)
+
+    def refresh(self):
+        """
+        refresh: rescan the directories of the search path whose mtime has changed.
+
+        Returns: the list of rescanned directories.
+        """
+        now = time.time()
+        rescanned = []
+        for directory in self.directories:
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self.entries.get(directory)
+            if entry is not None and entry['mtime'] == mtime:
+                continue
+
+            self.entries[directory] = {
+                # a directory modified this recently is rescanned next time.
+                'mtime': mtime if now - mtime / 1e9 > RACY_MTIME_WINDOW else None,
+                'commands': scan_directory(directory)
+            }
+            rescanned.append(directory)
+
+        if rescanned:
+            self._commands = None
+            try:
+                self.save()
+            except OSError:
+                pass
+        return rescanned
+
+    def commands(self):
+        """
+        commands: all the executable names on the search path.
+
+        Returns: a sorted list of unique names.
+        """
+        if self._commands is None:
+            names = set()
+            for directory in self.directories:
+                names.update(self.entries.get(directory, {}).get('commands', []))
+            self._commands = sorted(names)
+        return self._commands
+
+    def resolve(self, name: str):
+        """
+        resolve: find the executable the shell would run for a name.
+        Args:
+            name: the name of the command.
+
+        Returns: the full path of the executable, None if it is not on the search path.
+        """
+        for directory in self.directories:
+            commands = self.entries.get(directory, {}).get('commands', [])
+            index = bisect.bisect_left(commands, name)
+            if index < len(commands) and commands[index] == name:
+                return os.path.join(directory, name)
+        return None
+
+    def __contains__(self, name: str):
+        return self.resolve(name) is not None
+
+
+_path_index = None
+
+
+def get_path_index():
+    """
+    get_path_index: the index of the current search path, shared by the process.
+    It is refreshed on each call (a stat per directory, only the modified ones are rescanned), so a long-lived
+    process such as the daemon sees the executables installed after it started.
+    """
+    global _path_index
+    if _path_index is None or _path_index.search_path != os.environ.get('PATH', ''):
+        _path_index = PathIndex()
+    _path_index.refresh()
+    return _path_index
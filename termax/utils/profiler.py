@@ -0,0 +1,271 @@
+import os
+import json
+import math
+import time
+import functools
+import threading
+import contextlib
+from datetime import datetime
+from typing import Optional
+
+from termax.utils.const import *
+from termax.utils.files import atomic_write_text
+
+# the profiler of the current run, None when profiling is off, see start_profiler().
+_active = None
+
+
+class Profiler:
+    def __init__(self, command: str):
+        """
+        Profiler: the time spent in each stage of a run.
+        A stage entered several times (e.g. the configuration is read by each loader) is counted once with
+        the sum of its durations, the stages nested in another one keep their depth for the table.
+        Args:
+            command: the name of the profiled command.
+        """
+        self.command = command
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+        # the nesting of the stages is the one of each thread, e.g. the collectors run concurrently.
+        self._local = threading.local()
+
+    @property
+    def depth(self):
+        return getattr(self._local, 'depth', 0)
+
+    @depth.setter
+    def depth(self, value: int):
+        self._local.depth = value
+
+    def add(self, name: str, milliseconds: float, depth: Optional[int] = None):
+        """
+        add: count the duration of a stage.
+        """
+        with self.lock:
+            stage = self.stages.setdefault(name, {'ms': 0.0, 'calls': 0,
+                                                  'depth': self.depth if depth is None else depth})
+            stage['ms'] += milliseconds
+            stage['calls'] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        stage: time the block as a stage.
+        """
+        depth = self.depth
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth = depth
+            self.add(name, (time.perf_counter() - start) * 1000, depth)
+
+    def first_token(self, name: str, callback=None):
+        """
+        first_token: wrap a streaming callback to time the first chunk, e.g. the TTFB of the LLM.
+        Args:
+            name: the name of the stage.
+            callback: the callback to wrap, may be None.
+        """
+        start = time.perf_counter()
+        received = []
+
+        def on_token(token):
+            if not received:
+                received.append(True)
+                self.add(name, (time.perf_counter() - start) * 1000)
+            if callback:
+                callback(token)
+
+        return on_token
+
+    def record(self):
+        """
+        record: the run as a JSON record, the durations in milliseconds.
+        """
+        with self.lock:
+            return {
+                'time': datetime.now().isoformat(),
+                'command': self.command,
+                'total_ms': round((time.perf_counter() - self.start) * 1000, 2),
+                'stages': {name: round(stage['ms'], 2) for name, stage in self.stages.items()},
+                'calls': {name: stage['calls'] for name, stage in self.stages.items()},
+            }
+
+    def table(self):
+        """
+        table: the stages as a human readable table, in the order they were first left.
+        """
+        record = self.record()
+        lines = [f"{'stage':<28}{'ms':>10}{'calls':>7}"]
+        for name, stage in self.stages.items():
+            label = "  " * stage['depth'] + name
+            lines.append(f"{label:<28}{stage['ms']:>10.1f}{stage['calls']:>7}")
+        lines.append(f"{'total':<28}{record['total_ms']:>10.1f}")
+        return "\n".join(lines)
+
+
+def profiling_target(flag: bool = False):
+    """
+    profiling_target: whether to profile the run, from the `--profile` flag and the TERMAX_PROFILE variable.
+    TERMAX_PROFILE=1 shows the table like the flag, any other value is the path of a JSONL trace file.
+
+    Returns: None when profiling is off, '' to show the table, the path of the trace file otherwise.
+    """
+    value = os.environ.get('TERMAX_PROFILE', '')
+    if value.lower() in ('', '0', 'false', 'no'):
+        return '' if flag else None
+    return '' if flag or value.lower() in ('1', 'true', 'yes') else value
+
+
+def start_profiler(command: str, flag: bool = False):
+    """
+    start_profiler: start profiling the run if it is enabled, see profiling_target().
+    Args:
+        command: the name of the profiled command.
+        flag: the `--profile` flag of the command.
+
+    Returns: the profiler, None when profiling is off.
+    """
+    global _active
+    target = profiling_target(flag)
+    if target is None:
+        return None
+    _active = Profiler(command)
+    _active.target = target
+    return _active
+
+
+def get_profiler():
+    """
+    get_profiler: the profiler of the current run, None when profiling is off.
+    """
+    return _active
+
+
+def stage(name: str):
+    """
+    stage: time the block as a stage of the current run, nothing is measured when profiling is off.
+    """
+    return _active.stage(name) if _active is not None else contextlib.nullcontext()
+
+
+def profiled(name: str):
+    """
+    profiled: time every call of the decorated function as a stage of the current run.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def first_token(name: str, callback=None):
+    """
+    first_token: time the first chunk of a stream as a stage, see Profiler.first_token().
+    """
+    return _active.first_token(name, callback) if _active is not None else callback
+
+
+def _append(path: str, record: dict, max_bytes: Optional[int] = None):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+        if max_bytes and os.path.getsize(path) > max_bytes:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            atomic_write_text(path, "".join(lines[len(lines) // 2:]))
+    except OSError:
+        pass
+
+
+def finish_profiler(show: bool = True, history_path: Optional[str] = None):
+    """
+    finish_profiler: stop profiling, keep the run in the history and write its table or trace.
+    Args:
+        show: print the table to stderr, unless the run is traced to a file.
+        history_path: the path of the history, default is PROFILE_FILE under the config home.
+
+    Returns: the record of the run, None when profiling is off.
+    """
+    global _active
+    profiler, _active = _active, None
+    if profiler is None:
+        return None
+
+    from termax.utils.config import CONFIG_HOME
+
+    record = profiler.record()
+    _append(history_path or os.path.join(CONFIG_HOME, PROFILE_FILE), record, PROFILE_MAX_BYTES)
+    if profiler.target:
+        _append(profiler.target, record)
+    elif show:
+        import sys
+        sys.stderr.write(profiler.table() + "\n")
+    return record
+
+
+def read_history(history_path: Optional[str] = None, command: Optional[str] = None, last: Optional[int] = None):
+    """
+    read_history: the recorded runs.
+    Args:
+        history_path: the path of the history, default is PROFILE_FILE under the config home.
+        command: only the runs of this command.
+        last: only the last runs.
+    """
+    from termax.utils.config import CONFIG_HOME
+
+    records = []
+    try:
+        with open(history_path or os.path.join(CONFIG_HOME, PROFILE_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if command is None or record.get('command') == command:
+                    records.append(record)
+    except OSError:
+        pass
+    return records[-last:] if last else records
+
+
+def percentile(values, q: float):
+    """
+    percentile: the nearest-rank percentile of the values.
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def aggregate(records, quantiles=PROFILE_QUANTILES):
+    """
+    aggregate: the percentiles of each stage over the recorded runs.
+    Args:
+        records: the runs, see read_history().
+        quantiles: the quantiles to compute.
+
+    Returns: a dictionary of stage name to the number of runs with the stage and its percentiles (ms),
+        the total of the runs comes last.
+    """
+    samples = {}
+    for record in records:
+        for name, milliseconds in record.get('stages', {}).items():
+            samples.setdefault(name, []).append(milliseconds)
+        samples.setdefault('total', []).append(record.get('total_ms', 0))
+    samples['total'] = samples.pop('total', [])
+    return {
+        name: {'runs': len(values), **{f"p{round(q * 100)}": percentile(values, q) for q in quantiles}}
+        for name, values in samples.items() if values
+    }
@@ -0,0 +1,50 @@
+import os
+import json
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+
+def read_prompt_cache_stats(stats_path: str = os.path.join(CONFIG_HOME, PROMPT_CACHE_STATS_FILE)):
+    """
+    read_prompt_cache_stats: the provider prompt cache counters of each model.
+    Args:
+        stats_path: the path of the counters file.
+
+    Returns: a dictionary keyed by `platform/model` with the requests, hits, input and cached tokens.
+    """
+    try:
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_prompt_cache(model_key: str, input_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0,
+                        stats_path: str = os.path.join(CONFIG_HOME, PROMPT_CACHE_STATS_FILE)):
+    """
+    record_prompt_cache: count a request against the provider prompt cache.
+    The counters are best effort: concurrent processes may lose an update, they never corrupt the file.
+    Args:
+        model_key: the key of the model, `platform/model`.
+        input_tokens: the input tokens of the request, cached ones included.
+        cached_tokens: the input tokens read from the provider cache.
+        cache_write_tokens: the input tokens written to the provider cache.
+        stats_path: the path of the counters file.
+    """
+    stats = read_prompt_cache_stats(stats_path)
+    entry = stats.setdefault(model_key, {
+        'requests': 0, 'hits': 0, 'input_tokens': 0, 'cached_tokens': 0, 'cache_write_tokens': 0
+    })
+    entry['requests'] += 1
+    entry['hits'] += 1 if cached_tokens else 0
+    entry['input_tokens'] += input_tokens
+    entry['cached_tokens'] += cached_tokens
+    entry['cache_write_tokens'] += cache_write_tokens
+
+    try:
+        atomic_write_json(stats_path, stats)
+    except OSError:
+        pass
+    return entry
@@ -1,6 +1,7 @@
-import inquirer
 from termax.utils.const import *
 
+# NOTE: inquirer is imported inside each question, it is only needed by the interactive paths of the CLI.
+
 
 def qa_platform(model_list: dict = CONFIG_LLM_LIST):
     """
@@ -9,6 +10,8 @@ def qa_platform(model_list: dict = CONFIG_LLM_LIST):
     Args:
         model_list: the list of models.
     """
+    import inquirer
+
     try:
         # Prompt for platform selection
         platform_question = [
@@ -65,6 +68,10 @@ def qa_platform(model_list: dict = CONFIG_LLM_LIST):
             'host_url': answers.get('host_url') if selected_platform == 'Ollama' else 'None',
             'base_url': answers.get('base_url') if selected_platform == 'OpenAI' else 'None'
         }
+        if selected_platform == 'Ollama':
+            # keep the model loaded between the requests, see OllamaModel.
+            config_dict['keep_alive'] = OLLAMA_KEEP_ALIVE
+            config_dict['reuse_context'] = False
 
         return config_dict
     except TypeError:
@@ -78,6 +85,8 @@ def qa_general(model_list: dict = CONFIG_LLM_LIST):
     Args:
         model_list: the list of models.
     """
+    import inquirer
+
     try:
         exe_questions = [
             inquirer.List(
@@ -103,11 +112,22 @@ def qa_general(model_list: dict = CONFIG_LLM_LIST):
             ]
             sc_answer = inquirer.prompt(sc_question)
 
+        semantic_question = [
+            inquirer.Confirm(
+                "semantic_cache",
+                message="Do you want to reuse the stored command of a near-duplicate request instead of the LLM?",
+                default=False,
+            )
+        ]
+        semantic_answer = inquirer.prompt(semantic_question)
+
         general_config = {
             "platform": answers["platform"].lower(),
             "auto_execute": answers["auto_execute"],
             "show_command": sc_answer["show_command"],
-            "storage_size": 2000
+            "storage_size": MEMORY_STORAGE_SIZE,
+            "semantic_cache": semantic_answer["semantic_cache"],
+            "semantic_threshold": SEMANTIC_CACHE_THRESHOLD
         }
 
         return general_config
@@ -115,16 +135,24 @@ def qa_general(model_list: dict = CONFIG_LLM_LIST):
         return None
 
 
-def qa_confirm():
+def qa_confirm(regenerate: bool = False):
     """
     qa_execute: ask the user confirm whether to execute the generated commmand.
+
+    Args:
+        regenerate: offer to ask the LLM again, for a command answered from a cache.
     """
+    import inquirer
+
+    choices = [('Execute', 0), ('Abort', 1), ('Describe', 2)]
+    if regenerate:
+        choices.append(('Regenerate', 3))
     try:
         exe_questions = [
             inquirer.List(
                 'execute',
                 message="Choose your action",
-                choices=[('Execute', 0), ('Abort', 1), ('Describe', 2)],
+                choices=choices,
                 carousel=False
             )
         ]
@@ -138,6 +166,8 @@ def qa_action():
     """
     qa_action: ask the user to choose the action to perform for guess output.
     """
+    import inquirer
+
     try:
         action_questions = [
             inquirer.List(
@@ -157,6 +187,8 @@ def qa_prompt():
     """
     qa_prompt: ask the user to input the prompt and intent.
     """
+    import inquirer
+
     try:
         command_questions = [
             inquirer.List(
@@ -185,6 +217,8 @@ def qa_revise():
     """
     qa_revise: ask the user to input the revised command.
     """
+    import inquirer
+
     try:
         revise_questions = [
             inquirer.Text(
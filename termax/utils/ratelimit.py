@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+try:
+    import fcntl
+except ImportError:  # Windows, the limits are only shared by the threads of a process.
+    fcntl = None
+
+# the limiters of this process, see get_rate_limiter().
+_limiters = {}
+
+
+class RateLimitExceeded(Exception):
+    """
+    RateLimitExceeded: raised once a rate limited request is still refused after RATE_LIMIT_RETRIES retries.
+    """
+
+
+class RateLimiter:
+    def __init__(self, key: str, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 state_dir: str = os.path.join(CONFIG_HOME, RATE_LIMIT_DIR)):
+        """
+        RateLimiter: token buckets of requests and tokens per minute, shared by every process using a provider.
+        The state of the buckets lives in a file locked with flock, so the shells, the daemon and the scripts
+        using the same API key queue behind each other instead of bursting into 429s.
+        Args:
+            key: the provider, e.g. openai.
+            requests_per_minute: the requests allowed per minute, 0 is unlimited.
+            tokens_per_minute: the tokens allowed per minute, 0 is unlimited.
+            state_dir: the directory of the state files.
+        """
+        self.key = key
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.state_path = os.path.join(state_dir, f"{key}.json")
+        self.lock_path = os.path.join(state_dir, f"{key}.lock")
+        self.thread_lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        """
+        _state: the state of the buckets, locked across the threads and the processes, written back on exit.
+        """
+        with self.thread_lock:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            with open(self.lock_path, 'a') as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    try:
+                        with open(self.state_path, 'r', encoding='utf-8') as f:
+                            state = json.load(f)
+                    except (OSError, ValueError):
+                        state = {}
+                    yield state
+                    atomic_write_json(self.state_path, state)
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        try_acquire: take a request and its tokens from the buckets if they are available.
+        Args:
+            tokens: the estimated tokens of the request.
+
+        Returns: 0 if the request can be sent, otherwise the seconds to wait before trying again.
+        """
+        now = time.time()
+        with self._state() as state:
+            if state.get('blocked_until', 0) > now:
+                return state['blocked_until'] - now
+
+            # the buckets are full after a minute, a request larger than the bucket waits for a full one.
+            elapsed = now - state.get('updated', now)
+            waits = []
+            levels = {}
+            for name, limit, cost in (('requests', self.requests_per_minute, 1),
+                                      ('tokens', self.tokens_per_minute, tokens)):
+                if not limit:
+                    continue
+                level = min(limit, state.get(name, limit) + elapsed * limit / 60)
+                levels[name] = level
+                cost = min(cost, limit)
+                if level < cost:
+                    waits.append((cost - level) * 60 / limit)
+                else:
+                    levels[name] = level - cost
+
+            if waits:
+                return max(waits)
+            state.update(levels, updated=now)
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        acquire: wait until the request can be sent.
+        Args:
+            tokens: the estimated tokens of the request.
+
+        Returns: the seconds spent waiting.
+        """
+        start = time.perf_counter()
+        wait = self.try_acquire(tokens)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire(tokens)
+        return time.perf_counter() - start
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """
+        aacquire: wait until the request can be sent, without blocking the event loop.
+        """
+        start = time.perf_counter()
+        wait = self.try_acquire(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.try_acquire(tokens)
+        return time.perf_counter() - start
+
+    def block(self, seconds: float):
+        """
+        block: hold every request to the provider, e.g. for the Retry-After of a 429.
+        Args:
+            seconds: the seconds before the next request.
+        """
+        with self._state() as state:
+            state['blocked_until'] = max(state.get('blocked_until', 0), time.time() + seconds)
+
+
+def get_rate_limiter(plat: str, config_dict: dict):
+    """
+    get_rate_limiter: the rate limiter of a platform, shared by the models of the process.
+    Args:
+        plat: the platform.
+        config_dict: the configuration, `requests_per_minute` and `tokens_per_minute` in the platform section
+            override RATE_LIMITS.
+
+    Returns: the limiter, None for the local platforms and when both limits are 0 (unlimited).
+    """
+    if plat not in RATE_LIMITS:
+        return None
+    requests, tokens = RATE_LIMITS[plat]
+    section = config_dict.get(plat, {})
+    limits = (int(section.get('requests_per_minute', requests)), int(section.get('tokens_per_minute', tokens)))
+    if not any(limits):
+        return None
+    if (plat, limits) not in _limiters:
+        _limiters[(plat, limits)] = RateLimiter(plat, *limits)
+    return _limiters[(plat, limits)]
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    retry_after: whether an error of a provider SDK is a rate limit, and how long the provider asked to wait.
+    The SDKs raise their own exceptions, they are recognized by their HTTP status (429).
+    Args:
+        error: the error.
+
+    Returns: None if the error is not a rate limit, the Retry-After (seconds) or 0 if the provider gave none.
+    """
+    status = None
+    for attribute in ('status_code', 'http_status', 'code', 'status'):
+        value = getattr(error, attribute, None)
+        value = value() if callable(value) else value
+        if isinstance(value, int):
+            status = value
+            break
+    if status != 429 and type(error).__name__ not in ('RateLimitError', 'ResourceExhausted'):
+        return None
+
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        # an HTTP date, the backoff is used instead.
+        pass
+    return 0.0
+
+
+def backoff_delay(attempt: int, after: float = 0.0) -> float:
+    """
+    backoff_delay: the wait before retrying a rate limited request.
+    Exponential backoff with full jitter, so the processes retrying together spread out, at least the
+    Retry-After of the provider.
+    Args:
+        attempt: the number of the retry, from 0.
+        after: the Retry-After of the provider, in seconds.
+    """
+    jitter = random.uniform(0, min(RATE_LIMIT_MAX_BACKOFF, RATE_LIMIT_BACKOFF * 2 ** attempt))
+    return min(RATE_LIMIT_MAX_BACKOFF, after + jitter) if after < RATE_LIMIT_MAX_BACKOFF else after
+
+
+def estimate_tokens(*values) -> int:
+    """
+    estimate_tokens: the heuristic token count (4 characters per token) of the text in the arguments of a request.
+    """
+    characters = 0
+    stack = list(values)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            characters += len(value)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return (characters + 3) // 4
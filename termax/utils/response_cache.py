@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import platform
+from typing import Optional
+
+from termax.utils.const import *
+from termax.utils.profiler import profiled
+from termax.utils.config import CONFIG_HOME
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    command TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def normalize_request(text: str):
+    """
+    normalize_request: the form of a request used in the cache key, case, spacing and final punctuation ignored.
+    Args:
+        text: the natural language text.
+    """
+    return " ".join(text.lower().split()).rstrip(".?! ")
+
+
+def context_fingerprint(cwd: Optional[str] = None, primary: Optional[str] = None):
+    """
+    context_fingerprint: the part of the context a cached command depends on.
+    Args:
+        cwd: the working directory, defaults to the current directory.
+        primary: the primary data source, e.g. git or docker.
+    """
+    return {
+        'cwd': os.path.abspath(cwd or os.getcwd()),
+        'os': f"{platform.system()} {platform.machine()}",
+        'primary': primary,
+    }
+
+
+def response_cache_key(text: str, platform_name: str, model_version: str, fingerprint: dict):
+    """
+    response_cache_key: the key of a request in the response cache.
+    Args:
+        text: the natural language text.
+        platform_name: the platform of the model.
+        model_version: the model version.
+        fingerprint: the context fingerprint, see context_fingerprint().
+    """
+    payload = json.dumps([normalize_request(text), platform_name, model_version, fingerprint], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_path: str = os.path.join(CONFIG_HOME, RESPONSE_CACHE_FILE),
+                 ttl: int = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_SIZE):
+        """
+        ResponseCache: the generated commands keyed by request and context, with LRU and TTL eviction.
+        The cache is a SQLite database shared by the CLI and the daemon.
+        Args:
+            cache_path: the path of the database.
+            ttl: the seconds before a cached command expires.
+            max_entries: the maximum number of cached commands.
+        """
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # a database locked by another process for more than a second is skipped, a get is a miss and a put is
+        # not written, the cache never delays nor fails a request.
+        self.connection = sqlite3.connect(cache_path, timeout=1, check_same_thread=False)
+        try:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(_SCHEMA)
+        except sqlite3.OperationalError:
+            pass
+
+    def _count(self, name: str):
+        self.connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    @profiled('response_cache')
+    def get(self, key: str):
+        """
+        get: the cached command of a request, counted as a hit or a miss.
+        Args:
+            key: the key of the request, see response_cache_key().
+
+        Returns: the command, None on a miss or an expired entry.
+        """
+        now = time.time()
+        try:
+            with self.connection:
+                row = self.connection.execute(
+                    "SELECT command, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] >= self.ttl:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+
+                if row is None:
+                    self._count('misses')
+                    return None
+
+                self.connection.execute(
+                    "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+                self._count('hits')
+                return row[0]
+        except sqlite3.OperationalError:
+            return None
+
+    def put(self, key: str, text: str, command: str, model: str):
+        """
+        put: cache the command of a request, then evict the expired and least recently used ones.
+        Only the commands the user executed successfully are cached, a wrong command is not replayed.
+        Args:
+            key: the key of the request, see response_cache_key().
+            text: the natural language text, kept for `termax cache`.
+            command: the command.
+            model: the `platform/model` that generated the command.
+        """
+        now = time.time()
+        try:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, text, command, model, created_at, last_used, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0)", (key, text, command, model, now, now)
+                )
+                self.connection.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+                self.connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+                )
+        except sqlite3.OperationalError:
+            pass
+
+    def invalidate(self, key: str):
+        """
+        invalidate: remove the cached command of a request, e.g. rejected by the user or failed when executed.
+        Args:
+            key: the key of the request, see response_cache_key().
+        """
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.OperationalError:
+            pass
+
+    def stats(self):
+        """
+        stats: the number of cached commands and the hit/miss counters.
+        """
+        counters = dict(self.connection.execute("SELECT name, value FROM counters").fetchall())
+        entries = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {'entries': entries, 'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0)}
+
+    def clear(self):
+        """
+        clear: remove all the cached commands and reset the counters.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.execute("DELETE FROM counters")
+
+    def close(self):
+        self.connection.close()
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """
+    get_response_cache: the response cache shared by the process.
+    """
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
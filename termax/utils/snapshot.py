@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import socket
+import platform
+from collections.abc import Mapping
+
+from termax.utils.const import *
+from termax.utils.config import CONFIG_HOME
+from termax.utils.files import atomic_write_json
+
+
+def probe_platform():
+    return {
+        'platform': platform.system(),
+        'platform_release': platform.release(),
+        'platform_version': platform.version(),
+        'architecture': platform.machine()
+    }
+
+
+def probe_hostname():
+    return {'hostname': socket.gethostname()}
+
+
+def probe_ip_address():
+    # connecting a UDP socket only picks the outgoing interface: nothing is sent and no resolver is involved,
+    # unlike gethostbyname(gethostname()) which can stall on a broken DNS setup.
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(('10.254.254.254', 1))
+            return {'ip_address': s.getsockname()[0]}
+    except OSError:
+        return {'ip_address': '127.0.0.1'}
+
+
+def probe_hardware():
+    import psutil
+    return {
+        'physical_cores': psutil.cpu_count(logical=False),
+        'total_cores': psutil.cpu_count(logical=True),
+        'ram_total': round(psutil.virtual_memory().total / (1024.0 ** 3))
+    }
+
+
+def probe_memory():
+    import psutil
+    memory = psutil.virtual_memory()
+    return {
+        'ram_available': round(memory.available / (1024.0 ** 3)),
+        'ram_used_percent': memory.percent
+    }
+
+
+# (fields, probe, ttl in seconds): a ttl of None caches the fields until the next reboot.
+SYSTEM_METADATA_PROBES = [
+    (('platform', 'platform_release', 'platform_version', 'architecture'), probe_platform, None),
+    (('hostname',), probe_hostname, 24 * 3600),
+    (('ip_address',), probe_ip_address, 300),
+    (('physical_cores', 'total_cores', 'ram_total'), probe_hardware, None),
+    (('ram_available', 'ram_used_percent'), probe_memory, 30),
+]
+
+
+def get_boot_id():
+    """
+    get_boot_id: an identifier that changes on every reboot.
+    """
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+            return f.read().strip()
+    except OSError:
+        import psutil
+        return str(int(psutil.boot_time()))
+
+
+def probe_system_metadata():
+    """
+    probe_system_metadata: probe all the system metadata, bypassing the snapshot.
+    """
+    metadata = {}
+    for _, probe, _ in SYSTEM_METADATA_PROBES:
+        metadata.update(probe())
+    return metadata
+
+
+class SystemSnapshot(Mapping):
+    def __init__(self, snapshot_path: str = os.path.join(CONFIG_HOME, SYSTEM_SNAPSHOT_FILE)):
+        """
+        SystemSnapshot: the system metadata cached on disk, with a TTL per field.
+        A field is only probed when it is read and its cached value has expired, so the prompts only pay for
+        the fields they reference.
+        Args:
+            snapshot_path: the path of the on-disk snapshot.
+        """
+        self.snapshot_path = snapshot_path
+        self.probes = {field: (probe, ttl) for fields, probe, ttl in SYSTEM_METADATA_PROBES for field in fields}
+        self.boot_id = get_boot_id()
+        self.fields = {}
+        self.load()
+
+    def load(self):
+        """
+        load: load the snapshot, it is discarded after a reboot.
+        """
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        if snapshot.get('boot_id') == self.boot_id:
+            self.fields = snapshot.get('fields', {})
+
+    def save(self):
+        """
+        save: write the snapshot atomically.
+        """
+        atomic_write_json(self.snapshot_path, {'boot_id': self.boot_id, 'fields': self.fields})
+
+    def is_fresh(self, field: str):
+        """
+        is_fresh: check whether the cached value of a field can be used.
+        """
+        entry = self.fields.get(field)
+        if entry is None:
+            return False
+        ttl = self.probes[field][1]
+        return ttl is None or time.time() - entry['probed_at'] < ttl
+
+    def probe(self, probe, save: bool = True):
+        """
+        probe: run a probe and cache all the fields it returns.
+        """
+        probed_at = time.time()
+        for field, value in probe().items():
+            self.fields[field] = {'value': value, 'probed_at': probed_at}
+        if save:
+            try:
+                self.save()
+            except OSError:
+                pass
+
+    def refresh(self):
+        """
+        refresh: probe all the fields again, regardless of their TTL.
+        """
+        for _, probe, _ in SYSTEM_METADATA_PROBES:
+            self.probe(probe, save=False)
+        self.save()
+
+    def __getitem__(self, field: str):
+        if field not in self.probes:
+            raise KeyError(field)
+        if not self.is_fresh(field):
+            self.probe(self.probes[field][0])
+        return self.fields[field]['value']
+
+    def __iter__(self):
+        return iter(self.probes)
+
+    def __len__(self):
+        return len(self.probes)
+
+
+_system_snapshot = None
+
+
+def get_system_snapshot():
+    """
+    get_system_snapshot: the system metadata snapshot shared by the current process.
+    """
+    global _system_snapshot
+    if _system_snapshot is None:
+        _system_snapshot = SystemSnapshot()
+    return _system_snapshot
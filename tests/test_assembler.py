@@ -0,0 +1,84 @@
+import unittest
+
+from termax.prompt.assembler import PromptAssembler, HeuristicTokenizer, CacheablePrompt
+
+
+class TestPromptAssembler(unittest.TestCase):
+    """
+    TestPromptAssembler: the sections packed into small budgets, measured with the heuristic tokenizer
+    (4 characters per token, the separator counts for 1).
+    """
+
+    def assembler(self, budget):
+        assembler = PromptAssembler(budget=budget, tokenizer=HeuristicTokenizer())
+        assembler.add('instructions', 'i' * 40, priority=100)
+        assembler.add('system', 's' * 40, priority=50)
+        assembler.add('files', "\n".join(f"file_{i:03d}.txt" for i in range(20)), priority=10, truncatable=True,
+                      volatile=True)
+        assembler.add('history', 'h' * 40, priority=20, volatile=True)
+        return assembler
+
+    def test_everything_fits(self):
+        assembler = self.assembler(budget=1000)
+        prompt = assembler.assemble()
+        self.assertIsInstance(prompt, CacheablePrompt)
+        self.assertEqual(prompt.prefix, 'i' * 40 + "\n\n" + 's' * 40)
+        self.assertTrue(prompt.suffix.startswith("file_000.txt"))
+        self.assertTrue(prompt.suffix.endswith("\n\n" + 'h' * 40))
+        self.assertEqual(str(prompt), prompt.prefix + "\n\n" + prompt.suffix)
+        self.assertEqual(assembler.report['dropped'], [])
+        self.assertEqual(assembler.report['truncated'], [])
+        self.assertEqual(assembler.report['prefix_tokens'], 21)
+
+    def test_priority_packing(self):
+        # the instructions, the system and the history fit (3 x 11 tokens), the files do not and are truncated.
+        assembler = self.assembler(budget=50)
+        prompt = assembler.assemble()
+        self.assertEqual(assembler.report['truncated'], ['files'])
+        self.assertEqual(assembler.report['dropped'], [])
+        self.assertLessEqual(assembler.report['tokens'], 50)
+        files = prompt.suffix.split("\n\n")[0]
+        self.assertTrue(files.endswith("\n... (truncated)"))
+        # cut at a line break, no half file name.
+        self.assertRegex(files.split("\n")[-2], r"^file_\d{3}\.txt$")
+        self.assertTrue(prompt.suffix.endswith('h' * 40))
+
+    def test_drop_lowest_priority(self):
+        # the history does not fit and cannot be truncated, the room left is too small for the truncated files.
+        assembler = self.assembler(budget=25)
+        prompt = assembler.assemble()
+        self.assertEqual(assembler.report['dropped'], ['history', 'files'])
+        self.assertEqual(prompt.prefix, 'i' * 40 + "\n\n" + 's' * 40)
+        self.assertEqual(prompt.suffix, "")
+        self.assertEqual(assembler.report['tokens'], 22)
+
+    def test_budget_too_small(self):
+        assembler = self.assembler(budget=5)
+        prompt = assembler.assemble()
+        self.assertEqual(str(prompt), "")
+        self.assertEqual(assembler.report['dropped'], ['instructions', 'system', 'history', 'files'])
+
+    def test_ties_in_insertion_order(self):
+        assembler = PromptAssembler(budget=11, tokenizer=HeuristicTokenizer())
+        assembler.add('first', 'a' * 40, priority=1)
+        assembler.add('second', 'b' * 40, priority=1)
+        self.assertEqual(str(assembler.assemble()), 'a' * 40)
+        self.assertEqual(assembler.report['dropped'], ['second'])
+
+    def test_prefix_stability(self):
+        # the volatile sections change between invocations, the prefix sent to the provider does not.
+        prompts = []
+        for files in ("a.txt\nb.txt", "c.txt\nd.txt\ne.txt"):
+            assembler = PromptAssembler(budget=1000, tokenizer=HeuristicTokenizer())
+            assembler.add('files', files, priority=10, volatile=True)
+            assembler.add('instructions', 'i' * 40, priority=100)
+            assembler.add('system', 's' * 40, priority=50)
+            prompts.append(assembler.assemble())
+        self.assertEqual(prompts[0].prefix, prompts[1].prefix)
+        self.assertNotEqual(prompts[0].suffix, prompts[1].suffix)
+        # a volatile section added first still comes after the stable ones.
+        self.assertTrue(str(prompts[0]).startswith(prompts[0].prefix))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import io
+import json
+import asyncio
+import unittest
+import importlib.util
+from unittest import mock
+
+from termax.testing import MockResponse
+from termax.cli.batch import run_batch, read_requests
+from tests.test_models import MockServerTestCase
+
+SNAPSHOT = {'platform': 'Linux', 'platform_version': '6.1', 'architecture': 'x86_64'}
+
+
+@unittest.skipUnless(importlib.util.find_spec('openai') and importlib.util.find_spec('chromadb'),
+                     "openai or chromadb is not installed")
+class TestBatch(MockServerTestCase):
+    def setUp(self):
+        from termax.prompt import Prompt, Memory
+        from termax.benchmarks.fixtures import HashEmbeddingFunction
+
+        super().setUp()
+        # the later requests are answered first.
+        self.server.responder = lambda request: MockResponse(
+            content=f"Commands: echo {request.body['messages'][1]['content']}",
+            ttfb=0.02 * (5 - int(request.body['messages'][1]['content'].split()[-1]))
+        )
+        with mock.patch('termax.prompt.prompt.get_system_snapshot', return_value=SNAPSHOT):
+            self.prompt = Prompt(Memory(data_path=self.directory, embedding_function=HashEmbeddingFunction()))
+        self.requests = read_requests(io.StringIO("".join(f"request {i}\n" for i in range(5))))
+
+    def run_batch(self, ordered):
+        from termax.agent import AsyncOpenAIModel
+
+        output = io.StringIO()
+
+        async def run():
+            model = AsyncOpenAIModel(api_key='sk-mock', version='gpt-4o', temperature=0.0,
+                                     base_url=self.server.openai_url)
+            return await run_batch(self.requests, output, concurrency=5, ordered=ordered, no_cache=True,
+                                   model=model, platform='openai', prompt=self.prompt,
+                                   config_dict={'general': {'platform': 'openai'}, 'openai': {'model': 'gpt-4o'}})
+
+        with mock.patch.object(self.prompt, 'collect', wraps=self.prompt.collect) as collect:
+            summary = asyncio.run(run())
+        # the metadata of the directory is collected once for the whole batch.
+        self.assertEqual(collect.call_count, 1)
+        self.assertEqual(summary, {'requests': 5, 'cache_hits': 0, 'failures': 0})
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_ordered(self):
+        results = self.run_batch(ordered=True)
+        self.assertEqual([result['index'] for result in results], list(range(5)))
+        self.assertEqual([result['command'] for result in results], [f"echo request {i}" for i in range(5)])
+
+    def test_completion_order(self):
+        results = self.run_batch(ordered=False)
+        self.assertEqual(sorted(result['index'] for result in results), list(range(5)))
+        self.assertNotEqual([result['index'] for result in results], list(range(5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import functools
+import importlib.util
+from unittest import mock
+
+from click.testing import CliRunner
+
+from termax.utils.const import *
+from termax.prompt import CacheablePrompt
+from termax.testing import MockLLMServer
+from termax.pricing import record_request, spent_today
+from termax.utils.response_cache import ResponseCache
+from termax.utils.prompt_cache import record_prompt_cache, read_prompt_cache_stats
+
+PROMPT = CacheablePrompt("You are a shell assistant. " * 20, "The current directory is /tmp.")
+
+
+class CLITestCase(unittest.TestCase):
+    """
+    CLITestCase: the CLI on a configuration of its own, with an OpenAI model served by a mock server.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-cli-')
+        self.server = MockLLMServer().start()
+
+        self.config_path = os.path.join(self.directory, 'config')
+        mock.patch('termax.utils.config.CONFIG_PATH', self.config_path).start()
+        mock.patch('termax.cli.cli.CONFIG_PATH', self.config_path).start()
+        # the memory (chromadb) and the metadata are not needed to reach the model.
+        mock.patch('termax.cli.cli.load_memory').start()
+        mock.patch('termax.cli.cli.load_prompt', return_value=mock.Mock(
+            gen_commands=mock.Mock(return_value=PROMPT), report=None
+        )).start()
+        mock.patch('termax.pricing.record_request').start()
+        mock.patch('termax.utils.prompt_cache.record_prompt_cache').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_config(self, **general):
+        general = {'platform': 'openai', 'auto_execute': 'False', 'show_command': 'False', **general}
+        with open(self.config_path, 'w') as f:
+            f.write("[general]\n" + "".join(f"{key} = {value}\n" for key, value in general.items()))
+            f.write(f"[openai]\napi_key = sk-mock\nmodel = gpt-4o\ntemperature = 0.0\n"
+                    f"base_url = {self.server.openai_url}\nrequests_per_minute = 0\ntokens_per_minute = 0\n"
+                    f"budget_model = gpt-4o-mini\n")
+
+    def generate(self, *options):
+        from termax.cli.cli import generate
+        return CliRunner(mix_stderr=False).invoke(generate, [*options, 'list files'])
+
+
+@unittest.skipUnless(importlib.util.find_spec('openai'), "openai is not installed")
+class TestSpendCap(CLITestCase):
+    """
+    TestSpendCap: the CLI against a ledger past the daily spend cap of the configuration.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # a million input tokens of gpt-4o, $2.50 spent today.
+        spend_path = os.path.join(self.directory, USAGE_SPEND_FILE)
+        record_request('openai/gpt-4o', {'input_tokens': 1000000, 'output_tokens': 0, 'cached_tokens': 0,
+                                         'cache_write_tokens': 0},
+                       ledger_path=os.path.join(self.directory, USAGE_LEDGER_FILE), spend_path=spend_path)
+        mock.patch('termax.pricing.ledger.spent_today', functools.partial(spent_today, spend_path)).start()
+
+    def generate(self):
+        return super().generate('-p', '--no-cache')
+
+    def test_refuse(self):
+        self.write_config(daily_spend_cap='1.0')
+        result = self.generate()
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("The daily spend cap of $1.00 is reached", result.stderr)
+        # nothing goes to the shell buffer, and the request is not sent.
+        self.assertEqual(result.stdout, '')
+        self.assertEqual(self.server.requests, [])
+
+    def test_downgrade(self):
+        self.write_config(daily_spend_cap='1.0', spend_cap_action='downgrade')
+        result = self.generate()
+        self.assertEqual(result.stdout.strip(), 'ls -la')
+        self.assertEqual(self.server.requests[0].body['model'], 'gpt-4o-mini')
+
+
+@unittest.skipUnless(importlib.util.find_spec('openai'), "openai is not installed")
+class TestResponseCache(CLITestCase):
+    """
+    TestResponseCache: only the commands executed successfully are answered from the response cache.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cache = ResponseCache(cache_path=os.path.join(self.directory, RESPONSE_CACHE_FILE))
+        mock.patch('termax.utils.response_cache._response_cache', self.cache).start()
+        mock.patch('termax.cli.cli.save_command').start()
+
+    def tearDown(self):
+        self.cache.close()
+        super().tearDown()
+
+    def test_print_not_cached(self):
+        self.write_config()
+        self.assertEqual(self.generate('-p').stdout.strip(), 'ls -la')
+        self.assertEqual(self.generate('-p').stdout.strip(), 'ls -la')
+        # the command of -p goes to the shell buffer unconfirmed, the model is asked again.
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_executed(self):
+        self.write_config(auto_execute='True')
+        with mock.patch('termax.cli.cli.execute_command', return_value=True):
+            self.generate()
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        self.assertEqual(self.generate('-p').stdout.strip(), 'ls -la')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_failed(self):
+        self.write_config(auto_execute='True')
+        with mock.patch('termax.cli.cli.execute_command', return_value=True):
+            self.generate()
+        # the cached command fails, it is not replayed.
+        with mock.patch('termax.cli.cli.execute_command', return_value=False):
+            self.generate()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.generate('-p')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_rejected(self):
+        self.write_config(auto_execute='True')
+        with mock.patch('termax.cli.cli.execute_command', return_value=True):
+            self.generate()
+        self.write_config()
+        with mock.patch('termax.cli.cli.qa_confirm', return_value=1):
+            self.generate()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_locked(self):
+        # another process holding the database, the cache is skipped instead of failing the request.
+        self.cache.connection.execute("PRAGMA busy_timeout = 10")
+        locker = sqlite3.connect(self.cache.cache_path)
+        locker.execute("BEGIN EXCLUSIVE")
+        try:
+            self.cache.put('key', 'list files', 'ls -la', 'openai/gpt-4o')
+            self.assertIsNone(self.cache.get('key'))
+        finally:
+            locker.rollback()
+            locker.close()
+        self.assertIsNone(self.cache.get('key'))
+
+
+
+class TestCacheStats(CLITestCase):
+    """
+    TestCacheStats: `termax cache` shows the response cache and the provider prompt cache counters.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cache = ResponseCache(cache_path=os.path.join(self.directory, RESPONSE_CACHE_FILE))
+        mock.patch('termax.utils.response_cache._response_cache', self.cache).start()
+        self.stats_path = os.path.join(self.directory, PROMPT_CACHE_STATS_FILE)
+        mock.patch('termax.utils.prompt_cache.read_prompt_cache_stats',
+                   lambda stats_path=self.stats_path: read_prompt_cache_stats(stats_path)).start()
+
+    def tearDown(self):
+        self.cache.close()
+        super().tearDown()
+
+    def show(self):
+        from termax.cli.cli import cache
+        result = CliRunner(mix_stderr=False).invoke(cache, [], terminal_width=200)
+        self.assertEqual(result.exit_code, 0, result.output)
+        return result.stdout
+
+    def test_response_cache_only(self):
+        output = self.show()
+        self.assertIn("Cached commands: 0", output)
+        self.assertNotIn("Provider prompt cache", output)
+
+    def test_prompt_cache(self):
+        record_prompt_cache('openai/gpt-4o', 2000, stats_path=self.stats_path)
+        record_prompt_cache('openai/gpt-4o', 2000, cached_tokens=1024, stats_path=self.stats_path)
+        output = self.show()
+        self.assertIn("Provider prompt cache", output)
+        row = next(line for line in output.splitlines() if 'openai/gpt-4o' in line)
+        self.assertEqual(row.replace('│', ' ').split(), ['openai/gpt-4o', '2', '1', '50%', '4000', '1024', '0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
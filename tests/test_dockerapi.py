@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import socketserver
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler
+
+from termax.utils import dockerapi
+from termax.utils.dockerapi import DockerClient
+from termax.utils.metadata import get_docker_metadata
+
+CONTAINERS = [
+    {
+        'Id': f"{i:02d}" + 'a' * 62, 'Image': 'nginx:latest', 'Command': 'nginx -g daemon off;',
+        'Created': 1700000000 + i, 'Status': 'Up 2 hours', 'Names': [f'/web{i}'],
+        'Ports': [{'IP': '0.0.0.0', 'PrivatePort': 80, 'PublicPort': 8080 + i, 'Type': 'tcp'}],
+    }
+    for i in range(5)
+]
+IMAGES = [
+    {'Id': 'sha256:' + f"{i:02d}" + 'b' * 62, 'RepoTags': [f'repo{i}:v{i}'], 'Created': 1700000000 + i,
+     'Size': 1000000 * (i + 1)}
+    for i in range(5)
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return 'docker'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, params))
+        if url.path == '/containers/json':
+            body = CONTAINERS[:int(params.get('limit', len(CONTAINERS)))]
+        elif url.path == '/images/json':
+            body = IMAGES
+        elif url.path == '/slow':
+            # an engine stuck on a request.
+            self.server.release.wait(10)
+            body = {}
+        else:
+            body = None
+        data = json.dumps(body).encode('utf-8')
+        # an engine dropping the idle kept-alive connection, without telling the client.
+        self.close_connection = self.server.drop_connections
+        self.send_response(200 if body is not None else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.requests = []
+        self.connections = 0
+        self.drop_connections = False
+        self.release = threading.Event()
+        super().__init__(path, _Handler)
+
+    def handle_error(self, request, client_address):
+        # the client gave up on a slow request and closed its connection.
+        pass
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class TestDockerClient(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-docker-')
+        self.socket_path = os.path.join(self.directory, 'docker.sock')
+        self.server = _Server(self.socket_path)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = DockerClient(socket_path=self.socket_path, timeout=5)
+
+    def tearDown(self):
+        self.server.release.set()
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def filters(self, index: int):
+        return json.loads(self.server.requests[index][1]['filters'])
+
+    def test_keep_alive(self):
+        self.client.containers()
+        self.client.images()
+        self.client.containers()
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnect(self):
+        self.server.drop_connections = True
+        self.client.containers()
+        self.server.drop_connections = False
+        self.client.images()
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_running_filter(self):
+        containers = self.client.containers()
+        path, params = self.server.requests[0]
+        self.assertEqual(path, '/containers/json')
+        self.assertEqual(self.filters(0), {'status': ['running']})
+        self.assertEqual(params['size'], 'false')
+        self.assertEqual(containers[0]['CONTAINER ID'], CONTAINERS[0]['Id'][:12])
+        self.assertEqual(containers[0]['NAMES'], 'web0')
+        self.assertEqual(containers[0]['PORTS'], '0.0.0.0:8080->80/tcp')
+
+    def test_label_filter(self):
+        self.client.containers(labels=['com.example.app=web'])
+        self.client.images(labels=['com.example.app'])
+        self.assertEqual(self.filters(0), {'status': ['running'], 'label': ['com.example.app=web']})
+        self.assertEqual(self.filters(1), {'dangling': ['false'], 'label': ['com.example.app']})
+
+    def test_limit(self):
+        containers = self.client.containers(limit=2)
+        images = self.client.images(limit=3)
+        self.assertEqual(self.server.requests[0][1]['limit'], '2')
+        self.assertEqual(len(containers), 2)
+        # the images endpoint has no limit, the most recent ones are kept.
+        self.assertEqual([image['REPOSITORY'] for image in images], ['repo4', 'repo3', 'repo2'])
+
+    def test_api_error(self):
+        with self.assertRaises(Exception):
+            self.client.get('/unknown')
+
+    def test_timeout(self):
+        client = DockerClient(socket_path=self.socket_path, timeout=0.3)
+        errors = {}
+
+        def get(path):
+            started = time.monotonic()
+            try:
+                client.get(path)
+            except Exception as e:
+                errors[path] = e
+            return time.monotonic() - started
+
+        slow = threading.Thread(target=get, args=('/slow',))
+        slow.start()
+        time.sleep(0.05)
+        # queued behind the stuck request, it answers or gives up within its own timeout.
+        self.assertLess(get('/containers/json'), 0.5)
+        slow.join(1)
+        self.assertFalse(slow.is_alive())
+        self.assertIsInstance(errors['/slow'], TimeoutError)
+        if '/containers/json' in errors:
+            self.assertIsInstance(errors['/containers/json'], TimeoutError)
+
+        # the lock is released and the stuck connection closed, the next request goes through on a new one.
+        self.assertEqual(len(client.containers()), len(CONTAINERS))
+        self.assertEqual(self.server.connections, 2)
+        client.close()
+
+
+class TestDockerCLIFallback(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-docker-')
+        # a fake docker CLI, it records its arguments and prints one JSON document per line.
+        self.log_path = os.path.join(self.directory, 'docker.log')
+        with open(os.path.join(self.directory, 'docker'), 'w') as f:
+            f.write(
+                "#!/bin/sh\n"
+                f"echo \"$@\" >> {self.log_path}\n"
+                "if [ \"$1\" = ps ]; then\n"
+                "  for i in 1 2 3; do echo '{\"ID\": \"c'$i'\", \"Image\": \"nginx\", \"Names\": \"web'$i'\"}'; done\n"
+                "else\n"
+                "  for i in 1 2 3; do echo '{\"ID\": \"i'$i'\", \"Repository\": \"repo'$i'\", \"Tag\": \"v'$i'\"}'; done\n"
+                "fi\n"
+            )
+        os.chmod(os.path.join(self.directory, 'docker'), 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_missing_socket(self):
+        client = DockerClient(socket_path=os.path.join(self.directory, 'missing.sock'), timeout=5)
+        with mock.patch.object(dockerapi, '_docker_client', client), \
+                mock.patch.dict(os.environ, {'PATH': self.directory + os.pathsep + os.environ.get('PATH', '')}):
+            metadata = get_docker_metadata(limit=2, labels=['app=web'])
+
+        self.assertEqual([c['CONTAINER ID'] for c in metadata['docker_containers']], ['c1', 'c2'])
+        self.assertEqual([i['REPOSITORY'] for i in metadata['docker_images']], ['repo1', 'repo2'])
+        with open(self.log_path) as f:
+            calls = f.read().splitlines()
+        self.assertIn('--filter status=running --filter label=app=web', calls[0])
+        self.assertIn('--filter dangling=false --filter label=app=web', calls[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
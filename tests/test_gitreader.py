@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+from termax.utils.metadata import get_git_metadata
+from termax.utils.gitreader import find_repository, read_packed_refs, resolve_ref, read_head, read_remotes, \
+    read_commit
+
+# a fixed author and date, without the configuration of the user.
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'Ada Lovelace', 'GIT_AUTHOR_EMAIL': 'ada@example.com',
+    'GIT_COMMITTER_NAME': 'Ada Lovelace', 'GIT_COMMITTER_EMAIL': 'ada@example.com',
+    'GIT_AUTHOR_DATE': '1700000000 +0000', 'GIT_COMMITTER_DATE': '1700000000 +0000',
+    'GIT_CONFIG_GLOBAL': os.devnull, 'GIT_CONFIG_NOSYSTEM': '1',
+}
+
+
+@unittest.skipUnless(shutil.which('git'), "git is not installed")
+class TestGitReader(unittest.TestCase):
+    """
+    TestGitReader: the repository files read directly, against a repository built by git in a temporary directory.
+    """
+
+    def setUp(self):
+        self.directory = os.path.realpath(tempfile.mkdtemp(prefix='termax-git-'))
+        self.work_tree = os.path.join(self.directory, 'repository')
+        self.git_dir = os.path.join(self.work_tree, '.git')
+        os.makedirs(self.work_tree)
+        self.git('init', '-q', '-b', 'main')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def git(self, *args, cwd=None):
+        return subprocess.run(['git', *args], cwd=cwd or self.work_tree, env={**os.environ, **GIT_ENV},
+                              check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+    def commit(self, message, work_tree=None):
+        self.git('commit', '-q', '--allow-empty', '-m', message, cwd=work_tree)
+        return self.git('rev-parse', 'HEAD', cwd=work_tree)
+
+    def metadata(self, directory=None):
+        cwd = os.getcwd()
+        os.chdir(directory or self.work_tree)
+        try:
+            return get_git_metadata()
+        finally:
+            os.chdir(cwd)
+
+    def test_find_repository(self):
+        subdirectory = os.path.join(self.work_tree, 'src', 'package')
+        os.makedirs(subdirectory)
+        self.assertEqual(find_repository(subdirectory), (self.git_dir, self.git_dir, self.work_tree))
+        self.assertIsNone(find_repository(self.directory))
+
+    def test_loose_commit(self):
+        sha = self.commit("Initial commit\n\nWith a body.")
+        self.assertEqual(read_head(self.git_dir), ('refs/heads/main', None))
+        self.assertEqual(resolve_ref(self.git_dir, self.git_dir, 'HEAD'), sha)
+        self.assertEqual(read_commit(self.git_dir, sha), {
+            'author': 'Ada Lovelace', 'timestamp': 1700000000, 'message': "Initial commit\n\nWith a body."
+        })
+
+        # git is not run for a loose commit.
+        with mock.patch('subprocess.run', side_effect=AssertionError):
+            metadata = self.metadata()
+        self.assertEqual(metadata['git_sha'], sha)
+        self.assertEqual(metadata['git_current_branch'], 'main')
+        self.assertEqual(metadata['git_latest_commit_author'], 'Ada Lovelace')
+        self.assertEqual(metadata['git_latest_commit_date'], '2023-11-14 22:13:20 UTC')
+
+    def test_packed_refs(self):
+        sha = self.commit("Initial commit")
+        self.git('tag', '-a', 'v1.0', '-m', "Release")
+        self.git('pack-refs', '--all')
+        self.assertFalse(os.path.exists(os.path.join(self.git_dir, 'refs', 'heads', 'main')))
+
+        refs = read_packed_refs(self.git_dir)
+        # the tag object, the peeled line (^sha of the commit) is skipped.
+        self.assertEqual(refs, {'refs/heads/main': sha, 'refs/tags/v1.0': self.git('rev-parse', 'v1.0')})
+        self.assertEqual(resolve_ref(self.git_dir, self.git_dir, 'HEAD'), sha)
+
+        # a loose ref written after the packing wins.
+        new_sha = self.commit("Second commit")
+        self.assertEqual(resolve_ref(self.git_dir, self.git_dir, 'refs/heads/main'), new_sha)
+
+    def test_unborn_branch(self):
+        self.assertIsNone(resolve_ref(self.git_dir, self.git_dir, 'HEAD'))
+        metadata = self.metadata()
+        self.assertEqual(metadata['git_current_branch'], 'main')
+        self.assertEqual(metadata['git_sha'], '')
+
+    def test_detached_head(self):
+        sha = self.commit("Initial commit")
+        self.commit("Second commit")
+        self.git('checkout', '-q', '--detach', sha)
+        self.assertEqual(read_head(self.git_dir), (None, sha))
+
+        metadata = self.metadata()
+        self.assertEqual(metadata['git_current_branch'], 'HEAD')
+        self.assertEqual(metadata['git_sha'], sha)
+        self.assertEqual(metadata['git_latest_commit_message'], "Initial commit")
+
+    def test_worktree(self):
+        self.commit("Initial commit")
+        worktree = os.path.join(self.directory, 'feature')
+        self.git('worktree', 'add', '-q', '-b', 'feature', worktree)
+        sha = self.commit("Feature commit", worktree)
+
+        # the `.git` file of the worktree points to its own git directory, the refs are shared.
+        self.assertTrue(os.path.isfile(os.path.join(worktree, '.git')))
+        git_dir, common_dir, work_tree = find_repository(worktree)
+        self.assertEqual(git_dir, os.path.join(self.git_dir, 'worktrees', 'feature'))
+        self.assertEqual(common_dir, self.git_dir)
+        self.assertEqual(work_tree, worktree)
+
+        metadata = self.metadata(worktree)
+        self.assertEqual(metadata['git_current_branch'], 'feature')
+        self.assertEqual(metadata['git_sha'], sha)
+        self.assertEqual(self.metadata()['git_current_branch'], 'main')
+
+    def test_remotes(self):
+        self.git('remote', 'add', 'origin', 'https://example.com/origin.git')
+        self.git('remote', 'add', 'fork', 'https://example.com/fork.git')
+        self.git('remote', 'set-url', '--push', 'fork', 'git@example.com:fork.git')
+        self.assertEqual(read_remotes(self.git_dir), {
+            'origin': {'fetch_url': 'https://example.com/origin.git', 'push_url': 'https://example.com/origin.git'},
+            'fork': {'fetch_url': 'https://example.com/fork.git', 'push_url': 'git@example.com:fork.git'},
+        })
+
+    def test_packed_commit(self):
+        sha = self.commit("Packed commit\n\nWith a body.")
+        self.git('gc', '-q', '--prune=now')
+        self.assertIsNone(read_commit(self.git_dir, sha))
+
+        # the commit only lives in a packfile, `git log` reads it.
+        with mock.patch('subprocess.run', wraps=subprocess.run) as run:
+            metadata = self.metadata()
+        self.assertEqual(run.call_args.args[0][:2], ['git', 'log'])
+        self.assertEqual(metadata['git_sha'], sha)
+        self.assertEqual(metadata['git_latest_commit_author'], 'Ada Lovelace')
+        self.assertEqual(metadata['git_latest_commit_date'], '2023-11-14 22:13:20 UTC')
+        self.assertEqual(metadata['git_latest_commit_message'], "Packed commit\n\nWith a body.")
+
+
+if __name__ == '__main__':
+    unittest.main()
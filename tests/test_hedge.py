@@ -0,0 +1,79 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+from termax.agent.types import AsyncModel
+from termax.agent._hedge import HedgedModel
+from termax.utils.latency import LatencyHistogram
+
+
+class _SleepingModel(AsyncModel):
+    """
+    _SleepingModel: an async backend answering `echo <version>` after a delay.
+    """
+
+    def __init__(self, version, delay, command=None):
+        super().__init__()
+        self.model_type = 'mock'
+        self.version = version
+        self.delay = delay
+        self.command = command if command is not None else f"echo {version}"
+        self.cancelled = False
+
+    async def to_command(self, prompt, text):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.command
+
+    async def to_description(self, prompt, command):
+        return command
+
+
+class TestHedgedModel(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-hedge-')
+        self.histogram = LatencyHistogram(histogram_path=os.path.join(self.directory, 'latency.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def race(self, *models, delay=0.05):
+        hedged = HedgedModel(list(models), delay=delay, histogram=self.histogram)
+        return hedged, asyncio.run(hedged.to_command("You are a shell assistant.", "list files"))
+
+    def test_primary_wins(self):
+        fast, slow = _SleepingModel('fast', 0.01), _SleepingModel('slow', 0.5)
+        hedged, command = self.race(fast, slow)
+        self.assertEqual(command, 'echo fast')
+        self.assertIs(hedged.winner, fast)
+        self.assertEqual(self.histogram.count('mock/fast'), 1)
+        # answered before the hedge delay, the other model is never asked.
+        self.assertFalse(slow.cancelled)
+        self.assertEqual(self.histogram.count('mock/slow'), 0)
+
+    def test_hedged_loser_not_recorded(self):
+        slow, fast = _SleepingModel('slow', 0.5), _SleepingModel('fast', 0.01)
+        hedged, command = self.race(slow, fast)
+        self.assertEqual(command, 'echo fast')
+        self.assertIs(hedged.winner, fast)
+        # the slow primary is cancelled, its elapsed time is the latency of the winner, not its own.
+        self.assertTrue(slow.cancelled)
+        self.assertEqual(self.histogram.count('mock/slow'), 0)
+        self.assertEqual(self.histogram.count('mock/fast'), 1)
+
+    def test_empty_answer(self):
+        # an answer without a usable command is a completed request, the next model still wins.
+        empty, fast = _SleepingModel('empty', 0.01, command=''), _SleepingModel('fast', 0.05)
+        hedged, command = self.race(empty, fast, delay=1.0)
+        self.assertEqual(command, 'echo fast')
+        self.assertEqual(self.histogram.count('mock/empty'), 1)
+        self.assertEqual(self.histogram.count('mock/fast'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
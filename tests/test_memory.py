@@ -0,0 +1,119 @@
+import os
+import glob
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import importlib.util
+from unittest import mock
+from datetime import datetime
+
+from termax.utils.const import *
+
+
+@unittest.skipUnless(importlib.util.find_spec('chromadb'), "chromadb is not installed")
+class TestMemory(unittest.TestCase):
+    """
+    TestMemory: a memory of its own, with the deterministic embedding of the benchmarks (no model to download).
+    """
+
+    def setUp(self):
+        from termax.prompt import Memory
+        from termax.benchmarks.fixtures import HashEmbeddingFunction
+
+        self.directory = tempfile.mkdtemp(prefix='termax-memory-')
+        self.memory = Memory(data_path=self.directory, embedding_function=HashEmbeddingFunction())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add(self, n, offset=0):
+        return self.memory.add_query(
+            [{'query': f"request {i}", 'response': f"echo {i}", 'executed': True} for i in range(offset, offset + n)],
+            idx=[str(i) for i in range(offset, offset + n)]
+        )
+
+    def metadata(self, record_id):
+        return self.memory.collection().get(ids=[record_id])['metadatas'][0]
+
+    def test_record_value(self):
+        from termax.prompt import Memory
+
+        now = time.time()
+        self.assertEqual(Memory.record_value({'last_used': now, 'hits': 3}, now), 4)
+        self.assertAlmostEqual(Memory.record_value({'last_used': now - 10, 'hits': 1}, now, half_life=10), 1)
+        # a record used in the future (clock skew) is not worth more than a fresh one.
+        self.assertEqual(Memory.record_value({'last_used': now + 10}, now), 1)
+        # the records saved before the usage fields, their creation is their last use.
+        legacy = {'created_at': datetime.fromtimestamp(now - 10).isoformat()}
+        self.assertAlmostEqual(Memory.record_value(legacy, now, half_life=10), 0.5, places=3)
+        self.assertAlmostEqual(Memory.record_value({}, now), 0)
+
+    def test_count(self):
+        self.add(3)
+        self.assertEqual(self.memory.count(), 3)
+        # the count is kept up to date without counting the collection again.
+        with mock.patch('chromadb.api.models.Collection.Collection.count', side_effect=AssertionError):
+            self.add(2, offset=3)
+            self.assertEqual(self.memory.count(), 5)
+
+    def test_concurrent_count(self):
+        self.add(1)
+        self.memory.count()
+
+        threads = [threading.Thread(target=self.add, args=(5, 100 * (i + 1))) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.memory.count(), 21)
+        self.assertEqual(self.memory.collection().count(), 21)
+
+    def test_evict(self):
+        self.add(10)
+        # the used records are kept, whatever the page they are read from.
+        self.memory.touch(['2', '7', '9'])
+        self.assertEqual(self.memory.evict(keep=3, page_size=4), 7)
+        self.assertEqual(sorted(self.memory.collection().get()['ids']), ['2', '7', '9'])
+        self.assertEqual(self.memory.count(), 3)
+        self.assertEqual(self.memory.evict(keep=5), 0)
+
+    def test_touch_journal(self):
+        self.add(3)
+        self.memory.touch(['0', '1'])
+        self.memory.touch(['1'])
+        # the uses are journaled, the database is not written.
+        self.assertTrue(os.path.exists(self.memory.touches_path))
+        self.assertEqual(self.metadata('1')['hits'], 0)
+
+        self.assertEqual(self.memory.flush_touches(), 2)
+        self.assertEqual(self.metadata('0')['hits'], 1)
+        self.assertEqual(self.metadata('1')['hits'], 2)
+        self.assertEqual(self.metadata('2')['hits'], 0)
+        # the journal was moved aside then removed, the next uses start a new one.
+        self.assertFalse(os.path.exists(self.memory.touches_path))
+        self.assertEqual(glob.glob(f"{self.memory.touches_path}.*.flush"), [])
+        self.assertEqual(self.memory.flush_touches(), 0)
+
+        self.memory.touch(['1'])
+        self.memory.flush_touches()
+        self.assertEqual(self.metadata('1')['hits'], 3)
+
+    def test_touch_evicted(self):
+        self.add(3)
+        self.memory.touch(['0', '1'])
+        self.memory.collection().delete(ids=['0'])
+        # the records evicted since they were used are left out.
+        self.assertEqual(self.memory.flush_touches(), 1)
+
+    def test_touch_flush_size(self):
+        self.add(2)
+        with mock.patch('termax.prompt.memory.MEMORY_TOUCH_FLUSH_SIZE', 1):
+            self.memory.touch(['0'])
+        self.assertFalse(os.path.exists(self.memory.touches_path))
+        self.assertEqual(self.metadata('0')['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+import queue
+import asyncio
+import shutil
+import tempfile
+import textwrap
+import subprocess
+import unittest
+import importlib.util
+from unittest import mock
+
+from termax.utils.const import *
+from termax.prompt import CacheablePrompt
+from termax.testing import MockLLMServer, MockResponse
+from termax.function.base import FunctionRegistry
+from termax.agent.types import Model
+from termax.pricing import SpendCapExceeded
+from termax.utils.ratelimit import estimate_tokens
+
+PROMPT = CacheablePrompt("You are a shell assistant. " * 20, "The current directory is /tmp.")
+
+
+class MockServerTestCase(unittest.TestCase):
+    """
+    MockServerTestCase: a mock server per test, the state files (usage ledger, prompt cache statistics,
+    function schemas) are kept out of the home directory.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-models-')
+        self.server = MockLLMServer().start()
+        self.recorded = mock.patch('termax.pricing.record_request').start()
+        mock.patch('termax.utils.prompt_cache.record_prompt_cache').start()
+        mock.patch('termax.function.base._registry',
+                   FunctionRegistry(cache_path=os.path.join(self.directory, 'functions.json'))).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def paths(self):
+        return [request.path for request in self.server.requests]
+
+
+@unittest.skipUnless(importlib.util.find_spec('ollama'), "ollama is not installed")
+class TestOllamaModel(MockServerTestCase):
+    def model(self, **kwargs):
+        from termax.agent import OllamaModel
+        from termax.agent._ollama import OllamaContextCache
+
+        model = OllamaModel(host_url=self.server.url, version='llama3', **kwargs)
+        if model.contexts is not None:
+            model.contexts = OllamaContextCache(cache_path=os.path.join(self.directory, 'contexts.json'))
+        return model
+
+    def test_keep_alive(self):
+        model = self.model(keep_alive='1h')
+        self.assertEqual(model.to_command(PROMPT, "list files"), 'ls -la')
+        request = self.server.requests[-1]
+        self.assertEqual(request.path, '/api/chat')
+        self.assertEqual(request.body['keep_alive'], '1h')
+
+    def test_default_keep_alive(self):
+        model = self.model()
+        model.stream_command(PROMPT, "list files")
+        self.assertEqual(self.server.requests[-1].body['keep_alive'], OLLAMA_KEEP_ALIVE)
+
+    def test_is_resident(self):
+        model = self.model()
+        self.assertFalse(model.is_resident())
+        model.to_command(PROMPT, "list files")
+        # `llama3` is listed as `llama3:latest` by /api/ps.
+        self.assertTrue(model.is_resident())
+
+    def test_warm_up(self):
+        model = self.model()
+        self.assertFalse(model.warm_up())
+        self.assertEqual(self.paths(), ['/api/generate'])
+        self.assertNotIn('prompt', self.server.requests[0].body)
+        self.assertIn('llama3:latest', self.server.loaded)
+
+        # resident, the warm-up only checks /api/ps.
+        self.assertTrue(model.warm_up())
+        self.assertEqual(self.paths(), ['/api/generate'])
+
+    def test_reuse_context(self):
+        model = self.model(reuse_context=True)
+        self.assertEqual(model.to_command(PROMPT, "list files"), 'ls -la')
+        # the prefix is evaluated once, then the request continues from its context.
+        self.assertEqual(self.paths(), ['/api/generate', '/api/generate'])
+        prefix, first = self.server.requests
+        # evaluated as the system prompt, without generating: the context holds the prefix only.
+        self.assertEqual(prefix.body['system'], PROMPT.prefix)
+        self.assertNotIn('prompt', prefix.body)
+        self.assertEqual(prefix.body['options'], {'num_predict': 0})
+        self.assertEqual(len(first.body['context']), estimate_tokens(PROMPT.prefix))
+        self.assertNotIn(PROMPT.prefix, first.body['prompt'])
+
+        self.server.reset()
+        self.assertEqual(model.to_command(PROMPT, "list files"), 'ls -la')
+        self.assertEqual(self.paths(), ['/api/generate'])
+        self.assertEqual(self.server.requests[0].body['context'], first.body['context'])
+
+        # the contexts outlive the process.
+        self.server.reset()
+        self.model(reuse_context=True).stream_command(PROMPT, "list files")
+        self.assertEqual(self.paths(), ['/api/generate'])
+
+    def test_plain_prompt(self):
+        # a prompt without a static prefix goes to the chat API, there is no context to reuse.
+        model = self.model(reuse_context=True)
+        model.to_command("You are a shell assistant.", "list files")
+        self.assertEqual(self.paths(), ['/api/chat'])
+
+    def test_usage(self):
+        model = self.model()
+        model.to_command(PROMPT, "list files")
+        self.assertGreater(model.last_usage['input_tokens'], 0)
+        self.assertGreater(model.last_usage['output_tokens'], 0)
+        self.assertEqual(self.recorded.call_count, 1)
+
+
+@unittest.skipUnless(importlib.util.find_spec('openai'), "openai is not installed")
+class TestOpenAIModel(MockServerTestCase):
+    def model(self):
+        from termax.agent import OpenAIModel
+        return OpenAIModel(api_key='sk-mock', version='gpt-4o', temperature=0.0, base_url=self.server.openai_url)
+
+    def test_to_command(self):
+        model = self.model()
+        self.assertEqual(model.to_command(PROMPT, "list files"), 'ls -la')
+        request = self.server.requests[0]
+        self.assertEqual(request.path, '/v1/chat/completions')
+        self.assertEqual(request.body['messages'][0]['content'], PROMPT)
+        self.assertEqual(model.last_usage['input_tokens'], self.server.usage(request, request.response)[0])
+
+    def test_stream_command(self):
+        tokens = []
+        model = self.model()
+        self.assertEqual(model.stream_command(PROMPT, "list files", on_token=tokens.append), 'ls -la')
+        self.assertTrue(self.server.requests[0].body['stream'])
+        self.assertTrue(tokens)
+        # the stream is closed as soon as the command is complete, the usage is estimated.
+        self.assertTrue(self.recorded.call_args.kwargs['estimated'])
+
+    def test_stream_usage(self):
+        self.server.script("Commands: ls -la")
+        model = self.model()
+        self.assertEqual(model.stream_command(PROMPT, "list files"), 'ls -la')
+        # read to its end, the stream reports the usage.
+        self.assertFalse(self.recorded.call_args.kwargs['estimated'])
+        self.assertEqual(self.recorded.call_count, 1)
+
+    def test_generate_candidates(self):
+        model = self.model()
+        self.assertEqual(list(model.generate_candidates(PROMPT, "list files", 3)), ['ls -la'] * 3)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0].body['n'], 3)
+
+    def test_rate_limit(self):
+        self.server.script(MockResponse(error=429, retry_after=0.01), MockResponse())
+        model = self.model()
+        self.assertEqual(model.to_command(PROMPT, "list files"), 'ls -la')
+        self.assertEqual([request.status for request in self.server.requests], [429, 200])
+        self.assertGreater(model.last_queued, 0)
+
+    def test_stream_options_rejected(self):
+        # an endpoint without `stream_options`, the stream is requested again without it.
+        self.server.responder = lambda request: MockResponse(error=400) if 'stream_options' in request.body \
+            else MockResponse()
+        model = self.model()
+        self.assertEqual(model.stream_command(PROMPT, "list files"), 'ls -la')
+        self.assertEqual([request.status for request in self.server.requests], [400, 200])
+        self.assertFalse(model.stream_usage)
+
+        self.server.reset()
+        self.assertEqual(model.stream_command(PROMPT, "list files"), 'ls -la')
+        self.assertEqual([request.status for request in self.server.requests], [200])
+
+
+@unittest.skipUnless(importlib.util.find_spec('openai'), "openai is not installed")
+class TestAsyncOpenAIModel(MockServerTestCase):
+    def run_model(self, method, *args):
+        from termax.agent import AsyncOpenAIModel
+
+        async def run():
+            model = AsyncOpenAIModel(api_key='sk-mock', version='gpt-4o', temperature=0.0,
+                                     base_url=self.server.openai_url)
+            result = getattr(model, method)(*args)
+            if hasattr(result, '__aiter__'):
+                return [item async for item in result]
+            return await result
+
+        return asyncio.run(run())
+
+    def test_to_command(self):
+        self.assertEqual(self.run_model('to_command', PROMPT, "list files"), 'ls -la')
+        self.assertEqual(self.server.requests[0].body['messages'][0]['content'], PROMPT)
+
+    def test_stream_usage(self):
+        self.server.script("Commands: ls -la")
+        self.assertEqual(self.run_model('stream_command', PROMPT, "list files"), 'ls -la')
+        self.assertEqual(self.server.requests[0].body['stream_options'], {'include_usage': True})
+        self.assertFalse(self.recorded.call_args.kwargs['estimated'])
+
+    def test_generate_candidates(self):
+        self.assertEqual(self.run_model('generate_candidates', PROMPT, "list files", 2), ['ls -la'] * 2)
+        self.assertEqual(self.server.requests[0].body['n'], 2)
+
+
+class _DelayedModel(Model):
+    """
+    _DelayedModel: a blocking backend answering `echo <delay>` after each delay, in the order of the requests.
+    """
+
+    def __init__(self, *delays):
+        super().__init__()
+        self.delays = queue.Queue()
+        for delay in delays:
+            self.delays.put(delay)
+
+    def to_command(self, prompt, text):
+        delay = self.delays.get()
+        if delay is None:
+            raise SpendCapExceeded("The daily spend cap is reached.")
+        time.sleep(delay)
+        self.last_queued = delay
+        return f"echo {delay}"
+
+    def to_description(self, prompt, command):
+        return command
+
+
+class TestCandidates(unittest.TestCase):
+    def test_completion_order(self):
+        model = _DelayedModel(0.3, 0.05, 0.15)
+        self.assertEqual(list(model.generate_candidates(PROMPT, "list files", 3)),
+                         ['echo 0.05', 'echo 0.15', 'echo 0.3'])
+        # each candidate keeps its own state, the model reports the longest queue.
+        self.assertEqual(model.last_queued, 0.3)
+
+    def test_spend_cap(self):
+        model = _DelayedModel(None, None)
+        with self.assertRaises(SpendCapExceeded):
+            list(model.generate_candidates(PROMPT, "list files", 2))
+
+    def test_abandoned(self):
+        # the first candidate passes, the process exits without waiting for the slow one.
+        script = textwrap.dedent("""
+            from tests.test_models import _DelayedModel
+            print(_DelayedModel(0.05, 30).best_command("prompt", "say hi", 2, score=lambda command: {
+                'command': command, 'passed': True, 'score': 1
+            })[0])
+        """)
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=20,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.stdout.strip(), 'echo 0.05', output.stderr)
+        self.assertLess(time.perf_counter() - start, 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from termax.utils import path_index
+from termax.utils.path_index import PathIndex, get_path_index
+
+
+class TestPathIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-path-')
+        self.index_path = os.path.join(self.directory, 'path_index.json')
+        self.bin = self.make_directory('bin', 'ls', 'git')
+        self.local = self.make_directory('local', 'git', 'rg')
+        self.path = os.pathsep.join([self.bin, self.local])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_directory(self, name, *executables):
+        directory = os.path.join(self.directory, name)
+        os.makedirs(directory)
+        for executable in executables:
+            self.add(directory, executable)
+        # not an executable.
+        with open(os.path.join(directory, 'README'), 'w') as f:
+            f.write('')
+        self.age(directory)
+        return directory
+
+    @staticmethod
+    def add(directory, name):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(os.path.join(directory, name), 0o755)
+
+    @staticmethod
+    def age(directory, seconds=100):
+        # out of the racy mtime window, the mtime of the directory is trusted.
+        past = time.time() - seconds
+        os.utime(directory, (past, past))
+
+    def index(self):
+        index = PathIndex(index_path=self.index_path, path=self.path)
+        index.refresh()
+        return index
+
+    def test_commands(self):
+        self.assertEqual(self.index().commands(), ['git', 'ls', 'rg'])
+
+    def test_resolve(self):
+        index = self.index()
+        # the first directory of the search path wins.
+        self.assertEqual(index.resolve('git'), os.path.join(self.bin, 'git'))
+        self.assertEqual(index.resolve('rg'), os.path.join(self.local, 'rg'))
+        self.assertIsNone(index.resolve('README'))
+        self.assertIsNone(index.resolve('missing'))
+        self.assertIn('ls', index)
+        self.assertNotIn('missing', index)
+
+    def test_mtime_invalidation(self):
+        index = self.index()
+        self.assertEqual(index.refresh(), [])
+
+        # the index outlives the process, nothing is rescanned.
+        reloaded = PathIndex(index_path=self.index_path, path=self.path)
+        self.assertEqual(reloaded.refresh(), [])
+        self.assertEqual(reloaded.resolve('ls'), os.path.join(self.bin, 'ls'))
+
+        self.add(self.local, 'fd')
+        self.age(self.local, 50)
+        self.assertEqual(reloaded.refresh(), [self.local])
+        self.assertEqual(reloaded.resolve('fd'), os.path.join(self.local, 'fd'))
+        self.assertIn('fd', reloaded.commands())
+
+    def test_racy_mtime(self):
+        self.add(self.bin, 'fd')
+        index = self.index()
+        # modified in the same mtime tick, the directory may still change: it is rescanned next time.
+        self.assertEqual(index.refresh(), [self.bin])
+        self.assertEqual(index.refresh(), [self.bin])
+
+    def test_get_path_index(self):
+        with mock.patch.dict(os.environ, {'PATH': self.path}), mock.patch.object(path_index, '_path_index', None), \
+                mock.patch.object(PathIndex, 'load'), mock.patch.object(PathIndex, 'save'):
+            self.assertIsNone(get_path_index().resolve('fd'))
+            # an executable installed after the index was built, e.g. by the daemon.
+            self.add(self.local, 'fd')
+            self.age(self.local, 50)
+            self.assertEqual(get_path_index().resolve('fd'), os.path.join(self.local, 'fd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import time
+import threading
+import unittest
+
+from termax.utils.profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def test_nested_depth(self):
+        profiler = Profiler('generate')
+        with profiler.stage('prompt'):
+            with profiler.stage('metadata'):
+                pass
+        with profiler.stage('llm'):
+            pass
+        self.assertEqual({name: stage['depth'] for name, stage in profiler.stages.items()},
+                         {'metadata': 1, 'prompt': 0, 'llm': 0})
+        self.assertEqual(profiler.depth, 0)
+
+    def test_threads_depth(self):
+        # the stages of concurrent threads are not nested in each other.
+        profiler = Profiler('generate')
+        entered = threading.Barrier(4)
+
+        def collect(name):
+            with profiler.stage(name):
+                entered.wait()
+                time.sleep(0.01)
+
+        threads = [threading.Thread(target=collect, args=(f"collector {i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({stage['depth'] for stage in profiler.stages.values()}, {0})
+        self.assertEqual(len(profiler.record()['stages']), 4)
+        self.assertEqual(profiler.depth, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import sys
+import shutil
+import tempfile
+import textwrap
+import unittest
+import subprocess
+from types import SimpleNamespace
+from unittest import mock
+
+from termax.utils.const import *
+from termax.utils.ratelimit import RateLimiter, retry_after, backoff_delay
+
+
+class Clock:
+    """
+    Clock: the time seen by the limiter, moved forward by the tests.
+    """
+
+    def __init__(self, now=1700000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='termax-ratelimit-')
+        self.clock = Clock()
+        mock.patch('termax.utils.ratelimit.time.time', self.clock.time).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def limiter(self, requests_per_minute=0, tokens_per_minute=0):
+        return RateLimiter('openai', requests_per_minute, tokens_per_minute, state_dir=self.directory)
+
+    def test_requests_bucket(self):
+        limiter = self.limiter(requests_per_minute=2)
+        self.assertEqual(limiter.try_acquire(), 0)
+        self.assertEqual(limiter.try_acquire(), 0)
+        # the bucket refills at 2 requests per minute, a request every 30 seconds.
+        self.assertAlmostEqual(limiter.try_acquire(), 30)
+        self.clock.now += 10
+        self.assertAlmostEqual(limiter.try_acquire(), 20)
+        self.clock.now += 20
+        self.assertEqual(limiter.try_acquire(), 0)
+
+    def test_tokens_bucket(self):
+        limiter = self.limiter(tokens_per_minute=600)
+        self.assertEqual(limiter.try_acquire(tokens=500), 0)
+        self.assertAlmostEqual(limiter.try_acquire(tokens=200), 10)
+        # a request larger than the bucket waits for a full one, instead of waiting forever.
+        self.clock.now += 10
+        self.assertAlmostEqual(limiter.try_acquire(tokens=1000), 40)
+        self.clock.now += 40
+        self.assertEqual(limiter.try_acquire(tokens=1000), 0)
+
+    def test_refused_request_takes_nothing(self):
+        limiter = self.limiter(requests_per_minute=2, tokens_per_minute=600)
+        self.assertEqual(limiter.try_acquire(tokens=1200), 0)
+        # refused on the tokens, the request bucket is not charged either.
+        self.assertGreater(limiter.try_acquire(tokens=100), 0)
+        self.clock.now += 10
+        self.assertEqual(limiter.try_acquire(tokens=100), 0)
+
+    def test_shared_state(self):
+        # another limiter on the same state, e.g. in another shell.
+        self.assertEqual(self.limiter(requests_per_minute=1).try_acquire(), 0)
+        self.assertAlmostEqual(self.limiter(requests_per_minute=1).try_acquire(), 60)
+
+    def test_block(self):
+        limiter = self.limiter(requests_per_minute=60)
+        limiter.block(5)
+        self.assertAlmostEqual(self.limiter(requests_per_minute=60).try_acquire(), 5)
+        # a shorter block does not shorten the current one.
+        limiter.block(1)
+        self.assertAlmostEqual(limiter.try_acquire(), 5)
+        self.clock.now += 5
+        self.assertEqual(limiter.try_acquire(), 0)
+
+    def test_acquire_waits(self):
+        limiter = self.limiter(requests_per_minute=1)
+        limiter.try_acquire()
+
+        def sleep(seconds):
+            self.clock.now += seconds
+
+        with mock.patch('termax.utils.ratelimit.time.sleep', side_effect=sleep) as slept:
+            limiter.acquire()
+        self.assertAlmostEqual(sum(call.args[0] for call in slept.call_args_list), 60)
+
+    @unittest.skipIf(sys.platform == 'win32', "flock is not available")
+    def test_processes(self):
+        # the processes started together share the bucket: 5 requests a minute, 5 of them get through.
+        script = textwrap.dedent(f"""
+            from termax.utils.ratelimit import RateLimiter
+            print(RateLimiter('openai', 5, state_dir={self.directory!r}).try_acquire())
+        """)
+        processes = [subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, text=True,
+                                      cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+                     for _ in range(8)]
+        waits = [float(process.communicate(timeout=60)[0]) for process in processes]
+        self.assertEqual(sum(wait == 0 for wait in waits), 5)
+
+
+class Error(Exception):
+    def __init__(self, status_code=None, headers=None, on_response=True):
+        super().__init__("error")
+        self.status_code = status_code
+        if on_response:
+            self.response = SimpleNamespace(headers=headers or {})
+        else:
+            self.headers = headers or {}
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class TestRetryAfter(unittest.TestCase):
+    def test_not_a_rate_limit(self):
+        self.assertIsNone(retry_after(Error(500, {'retry-after': '7'})))
+        self.assertIsNone(retry_after(ValueError("bad request")))
+
+    def test_header(self):
+        self.assertEqual(retry_after(Error(429, {'retry-after': '7'})), 7.0)
+        # the milliseconds are preferred, they are more precise.
+        self.assertEqual(retry_after(Error(429, {'retry-after-ms': '1500', 'retry-after': '2'})), 1.5)
+        # the headers of the error itself, when there is no response.
+        self.assertEqual(retry_after(Error(429, {'retry-after': '3'}, on_response=False)), 3.0)
+
+    def test_no_header(self):
+        self.assertEqual(retry_after(Error(429)), 0.0)
+        # an HTTP date is not parsed, the backoff is used instead.
+        self.assertEqual(retry_after(Error(429, {'retry-after': 'Wed, 21 Oct 2026 07:28:00 GMT'})), 0.0)
+
+    def test_status_attributes(self):
+        self.assertEqual(retry_after(SimpleNamespace(http_status=429)), 0.0)
+        # the gRPC errors have a code() method.
+        self.assertEqual(retry_after(SimpleNamespace(code=lambda: 429)), 0.0)
+        # the exceptions recognized by their name, without a status.
+        self.assertEqual(retry_after(RateLimitError()), 0.0)
+
+
+class TestBackoffDelay(unittest.TestCase):
+    def test_jitter_bounds(self):
+        for attempt in range(8):
+            ceiling = min(RATE_LIMIT_MAX_BACKOFF, RATE_LIMIT_BACKOFF * 2 ** attempt)
+            delays = [backoff_delay(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= ceiling for delay in delays), attempt)
+            # full jitter, the delays spread over the whole window.
+            self.assertGreater(max(delays) - min(delays), ceiling / 2)
+
+    def test_retry_after(self):
+        # at least the Retry-After of the provider, at most the maximum backoff.
+        for attempt in range(8):
+            for _ in range(50):
+                delay = backoff_delay(attempt, after=5.0)
+                self.assertGreaterEqual(delay, 5.0)
+                self.assertLessEqual(delay, RATE_LIMIT_MAX_BACKOFF)
+
+    def test_long_retry_after(self):
+        # a Retry-After longer than the maximum backoff is honored as is.
+        self.assertEqual(backoff_delay(0, after=RATE_LIMIT_MAX_BACKOFF + 60), RATE_LIMIT_MAX_BACKOFF + 60)
+
+    def test_extremes(self):
+        with mock.patch('termax.utils.ratelimit.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(backoff_delay(2), RATE_LIMIT_BACKOFF * 4)
+            self.assertEqual(backoff_delay(20), RATE_LIMIT_MAX_BACKOFF)
+            self.assertEqual(backoff_delay(20, after=10.0), RATE_LIMIT_MAX_BACKOFF)
+        with mock.patch('termax.utils.ratelimit.random.uniform', side_effect=lambda low, high: low):
+            self.assertEqual(backoff_delay(20), 0)
+            self.assertEqual(backoff_delay(20, after=10.0), 10.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
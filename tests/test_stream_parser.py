@@ -0,0 +1,99 @@
+import unittest
+
+from termax.prompt.utils import CommandStreamParser, extract_shell_commands
+
+
+class TestCommandStreamParser(unittest.TestCase):
+    """
+    TestCommandStreamParser: the responses fed in every possible pair of chunks, the command must be complete
+    at the same point whatever the chunk boundaries.
+    """
+
+    def feed(self, chunks):
+        parser = CommandStreamParser()
+        for index, chunk in enumerate(chunks):
+            command = parser.feed(chunk)
+            if command is not None:
+                return command, "".join(chunks[:index + 1])
+        return None, "".join(chunks)
+
+    def assertComplete(self, response, command, complete_at):
+        """
+        assertComplete: the parser returns the command once `complete_at` is received, not before.
+        """
+        for split in range(len(response) + 1):
+            chunks = [response[:split], response[split:]]
+            parsed, received = self.feed(chunks)
+            self.assertEqual(parsed, command, f"split at {split}")
+            self.assertGreaterEqual(len(received), response.index(complete_at) + len(complete_at))
+        # a character at a time, complete exactly at the end of `complete_at`.
+        parsed, received = self.feed(list(response))
+        self.assertEqual(parsed, command)
+        self.assertEqual(received, response[:response.index(complete_at) + len(complete_at)])
+
+    def test_single_line(self):
+        response = "Command: ls -la\nThis lists all the files, hidden ones included."
+        self.assertComplete(response, "ls -la", "ls -la\n")
+
+    def test_commands_marker(self):
+        response = "Commands: mkdir build\nThen build."
+        self.assertComplete(response, "mkdir build", "build\n")
+
+    def test_incomplete_line(self):
+        # the last line may still be growing.
+        parser = CommandStreamParser()
+        self.assertIsNone(parser.feed("Command: git sta"))
+        self.assertIsNone(parser.feed("tus"))
+        self.assertEqual(parser.feed("\n"), "git status")
+
+    def test_backslash_continuation(self):
+        response = "Command: docker run \\\n  -it ubuntu \\\n  bash\nStarts a shell."
+        self.assertComplete(response, "docker run \\\n-it ubuntu \\\nbash", "  bash\n")
+
+    def test_pipe_continuation(self):
+        response = "Command: ps aux |\n  grep python\nFinds the python processes."
+        self.assertComplete(response, "ps aux |\ngrep python", "grep python\n")
+
+    def test_and_continuation(self):
+        response = "Command: cd build &&\nmake ||\necho failed\nBuilds the project."
+        self.assertComplete(response, "cd build &&\nmake ||\necho failed", "echo failed\n")
+
+    def test_leading_blank_lines(self):
+        response = "Command: \n\nls\n"
+        self.assertComplete(response, "ls", "ls\n")
+
+    def test_code_fence(self):
+        response = "Run this:\n```bash\nfind . -name '*.py'\n```\nIt finds the python files."
+        self.assertComplete(response, "find . -name '*.py'", "py'\n```")
+
+    def test_code_fence_after_marker(self):
+        # the fence is closed, a newline inside it does not end the command.
+        response = "Command: ```bash\ncd /tmp\nls\n```\nDone."
+        self.assertComplete(response, "cd /tmp\nls", "ls\n```")
+
+    def test_finish_fallback(self):
+        # the response ends before a newline or a closing fence, the full text is parsed.
+        parser = CommandStreamParser()
+        self.assertIsNone(parser.feed("Command: ls -la"))
+        self.assertEqual(parser.finish(), "ls -la")
+
+        # like extract_shell_commands, a fence never closed holds no command.
+        parser = CommandStreamParser()
+        self.assertIsNone(parser.feed("```bash\nls -la\n"))
+        self.assertEqual(parser.finish(), extract_shell_commands("```bash\nls -la\n"))
+        self.assertEqual(parser.finish(), "")
+
+        parser = CommandStreamParser()
+        self.assertIsNone(parser.feed("No command here."))
+        self.assertEqual(parser.finish(), "")
+
+    def test_after_complete(self):
+        parser = CommandStreamParser()
+        self.assertEqual(parser.feed("Command: ls\n"), "ls")
+        # the rest of the response does not change the command.
+        self.assertEqual(parser.feed("Command: rm -rf /\n"), "ls")
+        self.assertEqual(parser.finish(), "ls")
+
+
+if __name__ == '__main__':
+    unittest.main()